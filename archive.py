@@ -0,0 +1,53 @@
+import argparse
+import sys
+from datetime import date, timedelta
+import database
+import migrations
+
+ARCHIVE_AFTER_DAYS = 365
+BATCH_SIZE = 5000
+
+
+def archive_closed_transactions(conn, older_than_days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE, progress=None):
+    # Moves loans returned before the cutoff into transactions_archive in
+    # short batches, so desks are never locked out for long.
+    cutoff = (date.today() - timedelta(days=older_than_days)).strftime("%Y-%m-%d")
+    moved = 0
+    while True:
+        with database.transaction(conn):
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM transactions WHERE return_date IS NOT NULL AND return_date < ? LIMIT ?;",
+                (cutoff, batch_size))]
+            if not ids:
+                break
+            placeholders = ", ".join("?" for _ in ids)
+            conn.execute(f"""
+            INSERT OR REPLACE INTO transactions_archive (id, uid, book_id, borrower_id, borrow_date, return_date, due_date)
+            SELECT id, uid, book_id, borrower_id, borrow_date, return_date, due_date FROM transactions WHERE id IN ({placeholders});
+            """, ids)
+            conn.execute(f"DELETE FROM transactions WHERE id IN ({placeholders});", ids)
+        moved += len(ids)
+        if progress:
+            progress(moved)
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old returned loans into the archive table.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database", default=database.DATABASE_PATH)
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.database)
+    migrations.migrate(conn)
+    try:
+        moved = archive_closed_transactions(conn, args.older_than_days, args.batch_size)
+    finally:
+        conn.close()
+    print(f"archived {moved} transactions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
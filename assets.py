@@ -0,0 +1,64 @@
+import os
+import tkinter as tk
+import instrumentation
+
+BACKGROUND_PATH = "libsys1.gif"
+CACHE_DIR = ".cache"
+
+_photos = {}
+_source_image = None
+
+
+def derivative_path(width, height):
+    name = os.path.splitext(os.path.basename(BACKGROUND_PATH))[0]
+    return os.path.join(CACHE_DIR, f"{name}_{width}x{height}.png")
+
+
+def is_fresh(path):
+    try:
+        return os.path.getmtime(path) >= os.path.getmtime(BACKGROUND_PATH)
+    except OSError:
+        return False
+
+
+def source_image():
+    global _source_image
+    if _source_image is None:
+        from PIL import Image
+        with Image.open(BACKGROUND_PATH) as image:
+            _source_image = image.convert("RGB")
+    return _source_image
+
+
+def build_derivative(width, height):
+    from PIL import ImageOps
+    image = ImageOps.fit(source_image(), (width, height))
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        image.quantize(colors=256).save(derivative_path(width, height), optimize=True)
+    except OSError:
+        pass
+    return image
+
+
+@instrumentation.timed("assets.load_background")
+def load_background(width, height):
+    # A fresh pre-scaled PNG loads through Tk directly, without PIL or
+    # decoding the full-size GIF.
+    path = derivative_path(width, height)
+    if is_fresh(path):
+        return tk.PhotoImage(file=path)
+
+    try:
+        from PIL import ImageTk
+    except ImportError:
+        return tk.PhotoImage(file=BACKGROUND_PATH)
+    return ImageTk.PhotoImage(build_derivative(width, height))
+
+
+def background(width, height):
+    photo = _photos.get((width, height))
+    if photo is None:
+        photo = load_background(width, height)
+        _photos[(width, height)] = photo
+    return photo
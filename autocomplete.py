@@ -0,0 +1,310 @@
+import atexit
+import bisect
+import threading
+import tkinter as tk
+from tkinter import ttk
+import database
+import instrumentation
+from changelog import latest_change
+
+SUGGESTIONS = 8
+REFRESH_SECONDS = 2
+# Each insert into a 1M-title index moves about 0.6 ms of list; past this
+# many changed rows one rebuild is cheaper.
+REBUILD_AFTER = 1000
+
+# The text each table is completed on. Borrowers show their surname too,
+# so two borrowers called Ali can be told apart.
+SOURCES = {
+    "books": ("title", "title, id"),
+    "borrowers": ("trim(ifnull(name, '') || ' ' || ifnull(surname, ''))", "name, surname, id"),
+}
+
+CHANGES = """
+SELECT change_log.row_id, {text}
+FROM change_log LEFT JOIN {table} ON {table}.id = change_log.row_id
+WHERE change_log.seq > ? AND change_log.seq <= ? AND +change_log.table_name = ? AND change_log.row_id IS NOT NULL
+LIMIT ?;
+"""
+
+IGNORED_KEYS = {"Up", "Down", "Return", "KP_Enter", "Escape", "Tab", "Shift_L", "Shift_R", "Control_L", "Control_R",
+                "Alt_L", "Alt_R", "Left", "Right", "Home", "End"}
+
+
+class PrefixIndex:
+    # Texts sorted by their casefolded form, with the row id of each in a
+    # parallel list; a prefix is a bisect and a short walk. seq is the last
+    # change_log entry the index reflects.
+    def __init__(self, rows=(), seq=0):
+        self.texts = []
+        self.ids = []
+        self.by_id = {}
+        self.seq = seq
+        self.lock = threading.Lock()
+        for row_id, text in rows:
+            if text:
+                self.texts.append(text)
+                self.ids.append(row_id)
+                self.by_id[row_id] = text
+        # Rows arrive in binary order, which is already nearly casefold
+        # order, so this sort mostly merges runs.
+        order = sorted(range(len(self.texts)), key=lambda position: self.texts[position].casefold())
+        self.texts = [self.texts[position] for position in order]
+        self.ids = [self.ids[position] for position in order]
+
+    def __len__(self):
+        return len(self.texts)
+
+    @instrumentation.timed("autocomplete.suggest")
+    def suggest(self, prefix, limit=SUGGESTIONS):
+        # Returns up to limit (text, ids) pairs; copies of a title share one.
+        prefix = prefix.casefold()
+        if not prefix:
+            return []
+        found = {}
+        with self.lock:
+            position = bisect.bisect_left(self.texts, prefix, key=str.casefold)
+            previous = None
+            while position < len(self.texts):
+                text = self.texts[position]
+                folded = text.casefold()
+                if not folded.startswith(prefix):
+                    break
+                # Texts that differ only in case may interleave, so a run of
+                # equal folded texts is always finished.
+                if len(found) >= limit and folded != previous:
+                    break
+                found.setdefault(text, []).append(self.ids[position])
+                previous = folded
+                position += 1
+        return list(found.items())
+
+    def add(self, row_id, text):
+        if self.by_id.get(row_id) == text:
+            return
+        self.remove(row_id)
+        if not text:
+            return
+        position = bisect.bisect_right(self.texts, text.casefold(), key=str.casefold)
+        self.texts.insert(position, text)
+        self.ids.insert(position, row_id)
+        self.by_id[row_id] = text
+
+    def remove(self, row_id):
+        text = self.by_id.pop(row_id, None)
+        if text is None:
+            return
+        position = bisect.bisect_left(self.texts, text.casefold(), key=str.casefold)
+        while self.ids[position] != row_id:
+            position += 1
+        del self.texts[position]
+        del self.ids[position]
+
+    def apply(self, changes, seq):
+        # changes are (row_id, text) with text None for deleted rows. The
+        # lock is taken per row, so typing never waits behind a whole batch.
+        for row_id, text in changes:
+            with self.lock:
+                self.add(row_id, text)
+        self.seq = seq
+
+
+def load_index(conn, table):
+    # The log position is read first: a row changed while the rows are
+    # being read is logged after it and applied again on the next refresh.
+    text, order = SOURCES[table]
+    seq = latest_change(conn)
+    return PrefixIndex(conn.execute(f"SELECT id, {text} FROM {table} ORDER BY {order};"), seq)
+
+
+def refresh_index(conn, table, index):
+    if index is None:
+        return load_index(conn, table)
+    seq = latest_change(conn)
+    if seq == index.seq:
+        return index
+    if seq < index.seq:
+        # A restored backup took the log back; the index may hold rows
+        # it no longer has.
+        return load_index(conn, table)
+    query = CHANGES.format(text=SOURCES[table][0], table=table)
+    changes = conn.execute(query, (index.seq, seq, table, REBUILD_AFTER + 1)).fetchall()
+    if len(changes) > REBUILD_AFTER:
+        return load_index(conn, table)
+    index.apply(changes, seq)
+    return index
+
+
+class CompletionIndexes:
+    # Builds the indexes once in the background, then follows change_log,
+    # which every writer fills: this desk, other desks and replication.
+    def __init__(self, database_path=database.DATABASE_PATH, interval=REFRESH_SECONDS):
+        self.database_path = database_path
+        self.interval = interval
+        self.indexes = dict.fromkeys(SOURCES)
+        self.last_error = None
+        self.stopped = threading.Event()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def get(self, table):
+        # None until the first build has finished.
+        return self.indexes[table]
+
+    def refresh(self):
+        self.wake.set()
+
+    def update(self, conn):
+        for table in SOURCES:
+            self.indexes[table] = refresh_index(conn, table, self.indexes[table])
+
+    def run(self):
+        conn = database.connect(self.database_path)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.update(conn)
+                except Exception as e:
+                    # Keep the indexes as they are; the next refresh retries.
+                    self.last_error = e
+                self.wake.wait(self.interval)
+                self.wake.clear()
+        finally:
+            conn.close()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="autocomplete", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+
+_indexes = None
+
+
+def get_indexes():
+    global _indexes
+    if _indexes is None:
+        _indexes = CompletionIndexes().start()
+    return _indexes
+
+
+def stop_indexes():
+    if _indexes is not None:
+        _indexes.stop()
+
+
+atexit.register(stop_indexes)
+
+
+class AutocompleteEntry(ttk.Entry):
+    # An entry that lists matching titles or borrowers as you type. Picking
+    # one binds its row ids, which chosen_ids() returns for as long as the
+    # text is left unchanged.
+    def __init__(self, master, table, distinct=False, limit=SUGGESTIONS, **kwargs):
+        super().__init__(master, **kwargs)
+        self.table = table
+        # distinct lists each row on its own line (borrowers); otherwise rows
+        # sharing a text are one suggestion (copies of a title).
+        self.distinct = distinct
+        self.limit = limit
+        self.choices = []
+        self.chosen = None
+        self.hide_timer = None
+        self.listbox = tk.Listbox(self.winfo_toplevel(), height=limit, exportselection=False, activestyle="dotbox")
+        self.listbox.bind("<ButtonRelease-1>", self.pick)
+        self.listbox.bind("<FocusIn>", self.cancel_hide)
+        self.listbox.bind("<FocusOut>", self.hide_later)
+        self.bind("<KeyRelease>", self.on_key)
+        self.bind("<Down>", lambda event: self.move(1))
+        self.bind("<Up>", lambda event: self.move(-1))
+        self.bind("<Return>", self.pick)
+        self.bind("<KP_Enter>", self.pick)
+        self.bind("<Escape>", self.hide)
+        self.bind("<FocusIn>", lambda event: get_indexes().refresh())
+        self.bind("<FocusOut>", self.hide_later)
+        self.bind("<Destroy>", self.cancel_hide)
+
+    def chosen_ids(self):
+        if self.chosen is not None and self.chosen[0] == self.get():
+            return self.chosen[1]
+        return None
+
+    def chosen_id(self):
+        ids = self.chosen_ids()
+        return ids[0] if ids else None
+
+    def on_key(self, event):
+        if event.keysym in IGNORED_KEYS:
+            return
+        index = get_indexes().get(self.table)
+        text = self.get()
+        if index is None or not text.strip():
+            self.hide()
+            return
+
+        self.choices = []
+        for suggestion, ids in index.suggest(text, self.limit):
+            if self.distinct and len(ids) > 1:
+                self.choices.extend((f"{suggestion} #{row_id}", suggestion, [row_id]) for row_id in ids)
+            else:
+                self.choices.append((suggestion, suggestion, ids))
+        del self.choices[self.limit:]
+        self.show()
+
+    def show(self):
+        if not self.choices:
+            self.hide()
+            return
+        self.listbox.delete(0, "end")
+        self.listbox.insert("end", *(label for label, text, ids in self.choices))
+        self.listbox.configure(height=len(self.choices))
+        self.listbox.place(in_=self, x=0, rely=1.0, relwidth=1.0, bordermode="outside")
+        self.listbox.lift()
+
+    def hide(self, event=None):
+        self.hide_timer = None
+        self.listbox.place_forget()
+
+    def hide_later(self, event=None):
+        # Clicking a suggestion moves the focus to the list first, so hiding
+        # waits to see whether it went there.
+        self.cancel_hide()
+        self.hide_timer = self.after(150, self.hide)
+
+    def cancel_hide(self, event=None):
+        if self.hide_timer is not None:
+            self.after_cancel(self.hide_timer)
+            self.hide_timer = None
+
+    def shown(self):
+        return bool(self.listbox.winfo_ismapped())
+
+    def move(self, step):
+        if not self.shown():
+            return None
+        selection = self.listbox.curselection()
+        position = selection[0] + step if selection else 0
+        position = max(0, min(position, len(self.choices) - 1))
+        self.listbox.selection_clear(0, "end")
+        self.listbox.selection_set(position)
+        self.listbox.see(position)
+        return "break"
+
+    def pick(self, event=None):
+        if not self.shown():
+            return None
+        selection = self.listbox.curselection()
+        if selection:
+            label, text, ids = self.choices[selection[0]]
+            self.delete(0, "end")
+            self.insert(0, text)
+            self.chosen = (text, ids)
+            self.icursor("end")
+        self.hide()
+        self.focus_set()
+        return "break"
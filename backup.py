@@ -0,0 +1,236 @@
+import argparse
+import atexit
+import glob
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+import database
+import migrations
+
+BACKUP_DIR = "backups"
+BACKUP_INTERVAL_SECONDS = 6 * 60 * 60
+KEEP_BACKUPS = 10
+# 256 pages is 1 MB at the default page size; the pause between steps
+# leaves the disk to the desks.
+PAGES_PER_STEP = 256
+STEP_PAUSE_SECONDS = 0.01
+NAME_FORMAT = "library-%Y%m%d-%H%M%S.db"
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+def list_backups(directory=BACKUP_DIR):
+    # Newest first; the timestamp in the name sorts chronologically.
+    return sorted(glob.glob(os.path.join(directory, "library-*.db")), reverse=True)
+
+
+def rotate_backups(directory=BACKUP_DIR, keep=KEEP_BACKUPS):
+    removed = list_backups(directory)[keep:]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def check_integrity(path, quick=False):
+    if not os.path.isfile(path):
+        raise BackupError(f"{path} does not exist")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        pragma = "quick_check" if quick else "integrity_check"
+        problems = [row[0] for row in conn.execute(f"PRAGMA {pragma};")]
+        if problems != ["ok"]:
+            raise BackupError(f"{path} failed {pragma}: {'; '.join(problems[:5])}")
+        version = migrations.schema_version(conn)
+        if version > len(migrations.MIGRATIONS):
+            raise BackupError(f"{path} has schema version {version}, newer than this program")
+        return version
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{path} is not a usable database: {e}")
+    finally:
+        conn.close()
+
+
+def copy_database(source, target_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE_SECONDS, stopped=None, progress=None):
+    # The source holds one read transaction for the whole copy. Under WAL
+    # the desks keep writing to the log meanwhile, and the backup neither
+    # blocks them nor restarts every time they commit.
+    def step(status, remaining, total):
+        if stopped is not None and stopped.is_set():
+            raise BackupCancelled()
+        if progress:
+            progress(total - remaining, total)
+        if remaining:
+            time.sleep(pause)
+
+    target = sqlite3.connect(target_path)
+    source.execute("BEGIN;")
+    try:
+        source.execute("SELECT count(*) FROM sqlite_master;").fetchone()
+        source.backup(target, pages=pages, progress=step)
+        # The copy inherits WAL mode; switch it back so a backup is one
+        # self-contained file.
+        target.execute("PRAGMA journal_mode = DELETE;")
+    finally:
+        source.rollback()
+        target.close()
+
+
+def create_backup(conn, directory=BACKUP_DIR, keep=KEEP_BACKUPS, pages=PAGES_PER_STEP, pause=STEP_PAUSE_SECONDS,
+                  stopped=None, progress=None, name=None):
+    # The copy is checked before it replaces the name rotation looks for,
+    # so a crash mid-backup never costs an older good backup.
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name or datetime.now().strftime(NAME_FORMAT))
+    partial_path = path + ".part"
+    try:
+        copy_database(conn, partial_path, pages, pause, stopped, progress)
+        check_integrity(partial_path, quick=True)
+        os.replace(partial_path, path)
+    except BaseException:
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(partial_path + suffix):
+                os.remove(partial_path + suffix)
+        raise
+    rotate_backups(directory, keep)
+    return path
+
+
+def restore_backup(backup_path, database_path=database.DATABASE_PATH, directory=BACKUP_DIR):
+    # Restores through the backup API rather than renaming files: the copy
+    # takes the write lock, so a desk that still has the database open
+    # simply sees the restored data on its next query. The current data is
+    # saved first in case the wrong backup was picked.
+    check_integrity(backup_path)
+    conn = database.connect(database_path)
+    try:
+        saved = create_backup(conn, directory, keep=len(list_backups(directory)) + 1,
+                              name=datetime.now().strftime("library-%Y%m%d-%H%M%S-before-restore.db"))
+        source = sqlite3.connect(f"file:{backup_path}?mode=ro", uri=True)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+        migrations.migrate(conn)
+    finally:
+        conn.close()
+    return saved
+
+
+class BackupScheduler:
+    def __init__(self, database_path=database.DATABASE_PATH, directory=BACKUP_DIR, interval=BACKUP_INTERVAL_SECONDS,
+                 keep=KEEP_BACKUPS):
+        self.database_path = database_path
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.last_backup = None
+        self.last_error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def due_in(self):
+        backups = list_backups(self.directory)
+        if not backups:
+            return 0
+        return max(0, os.path.getmtime(backups[0]) + self.interval - time.time())
+
+    def backup(self):
+        # A connection of its own, so the copy never waits in line with
+        # the desks' queries on the shared executor.
+        conn = database.connect(self.database_path)
+        try:
+            self.last_backup = create_backup(conn, self.directory, self.keep, stopped=self.stopped)
+        finally:
+            conn.close()
+        return self.last_backup
+
+    def run(self):
+        # Backups left by earlier sessions count, so restarting the program
+        # does not take a fresh snapshot every time.
+        while not self.stopped.wait(self.due_in()):
+            try:
+                self.backup()
+            except BackupCancelled:
+                break
+            except Exception as e:
+                # The next interval retries.
+                self.last_error = e
+                self.stopped.wait(self.interval)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="backup-scheduler", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = BackupScheduler().start()
+    return _scheduler
+
+
+def stop_scheduler():
+    if _scheduler is not None:
+        _scheduler.stop()
+
+
+atexit.register(stop_scheduler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up the library database while it is in use, or restore a backup.")
+    parser.add_argument("--database", default=database.DATABASE_PATH)
+    parser.add_argument("--directory", default=BACKUP_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="take a backup now")
+    create.add_argument("--keep", type=int, default=KEEP_BACKUPS, help="backups to keep after rotation")
+    create.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="pages copied per step")
+    commands.add_parser("list", help="list backups, newest first")
+    verify = commands.add_parser("verify", help="run an integrity check on a backup")
+    verify.add_argument("backup")
+    restore = commands.add_parser("restore", help="check a backup and copy it over the database")
+    restore.add_argument("backup")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "create":
+            conn = database.connect(args.database)
+            try:
+                path = create_backup(conn, args.directory, args.keep, args.pages)
+            finally:
+                conn.close()
+            print(f"backed up {args.database} to {path}")
+        elif args.command == "list":
+            for path in list_backups(args.directory):
+                print(f"{path}\t{os.path.getsize(path)} bytes")
+        elif args.command == "verify":
+            version = check_integrity(args.backup)
+            print(f"{args.backup} is ok (schema version {version})")
+        else:
+            saved = restore_backup(args.backup, args.database, args.directory)
+            print(f"restored {args.backup} into {args.database}; the previous data is in {saved}")
+    except BackupError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
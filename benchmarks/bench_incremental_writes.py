@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pagedtreeview import KeysetQuery, PagedTreeview
+
+TABLE_SIZES = (1000, 10000, 100000)
+WRITES = 200
+
+
+def create_library(size):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, author TEXT, publication_year INTEGER, is_borrowed INTEGER DEFAULT 0);")
+    conn.executemany(
+        "INSERT INTO books (title, author, publication_year) VALUES (?, ?, ?);",
+        ((f"Title {i}", f"Author {i % 500}", 1900 + i % 120) for i in range(size)))
+    conn.commit()
+    return conn
+
+
+def full_reload(tree, conn):
+    tree.delete(*tree.get_children())
+    for book in conn.execute("SELECT * FROM books;").fetchall():
+        tree.insert("", "end", values=book)
+
+
+def bench_incremental(root, size):
+    conn = create_library(size)
+    fetch = lambda query, parameters, callback, error: callback(conn.execute(query, parameters).fetchall())
+    query = KeysetQuery(("id", "title", "author", "publication_year", "is_borrowed"), "books")
+    tree = PagedTreeview(root, fetch, query, columns=("ID", "Title", "Author", "Publication Year", "Borrowed"), show="headings")
+    tree.reload()
+
+    start = time.perf_counter()
+    for i in range(WRITES):
+        cur = conn.execute("INSERT INTO books (title, author, publication_year) VALUES (?, ?, ?);", (f"New {i}", "Bench", 2024))
+        conn.commit()
+        tree.insert_ids([cur.lastrowid])
+        conn.execute("DELETE FROM books WHERE id = ?;", (cur.lastrowid,))
+        conn.commit()
+        tree.delete_ids([cur.lastrowid])
+    elapsed = time.perf_counter() - start
+
+    tree.destroy()
+    conn.close()
+    return elapsed / (WRITES * 2)
+
+
+def bench_full_reload(root, size):
+    conn = create_library(size)
+    tree = ttk.Treeview(root, columns=("ID", "Title", "Author", "Publication Year", "Borrowed"), show="headings")
+    writes = max(WRITES // 20, 2)
+
+    start = time.perf_counter()
+    for i in range(writes):
+        conn.execute("INSERT INTO books (title, author, publication_year) VALUES (?, ?, ?);", (f"New {i}", "Bench", 2024))
+        conn.commit()
+        full_reload(tree, conn)
+    elapsed = time.perf_counter() - start
+
+    tree.destroy()
+    conn.close()
+    return elapsed / writes
+
+
+def main():
+    root = tk.Tk()
+    root.withdraw()
+
+    print(f"{'rows':>8} {'incremental ms/write':>22} {'full reload ms/write':>22}")
+    for size in TABLE_SIZES:
+        incremental = bench_incremental(root, size)
+        reload = bench_full_reload(root, size)
+        print(f"{size:>8} {incremental * 1000:>22.3f} {reload * 1000:>22.3f}")
+
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
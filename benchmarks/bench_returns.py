@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import circulation
+import database
+import migrations
+
+
+def create_library(path, books):
+    conn = database.connect(path)
+    migrations.migrate(conn)
+    with conn:
+        conn.execute("INSERT INTO borrowers (name, surname, contact_number) VALUES ('Bench', 'Borrower', '0');")
+        conn.executemany("INSERT INTO books (title, author, publication_year, is_borrowed) VALUES (?, 'Bench', 2000, 1);",
+                         ((f"Title {i}",) for i in range(books)))
+        conn.execute("INSERT INTO transactions (book_id, borrower_id, borrow_date) SELECT id, 1, '2024-01-01' FROM books;")
+    return conn
+
+
+def bench_single(conn, book_ids):
+    start = time.perf_counter()
+    for book_id in book_ids:
+        status, ids = circulation.return_books(conn, [f"#{book_id}"])[0][1:]
+        assert status == "book_returned", status
+    return len(book_ids) / (time.perf_counter() - start)
+
+
+def bench_batched(conn, book_ids, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(book_ids), batch_size):
+        results = circulation.return_books(conn, [f"#{book_id}" for book_id in book_ids[i:i + batch_size]])
+        assert all(status == "book_returned" for item, status, ids in results)
+    return len(book_ids) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure scan-mode return throughput.")
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--returns", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = create_library(os.path.join(directory, "library.db"), args.books)
+        single_ids = list(range(1, args.returns + 1))
+        batched_ids = list(range(args.returns + 1, 2 * args.returns + 1))
+
+        single = bench_single(conn, single_ids)
+        batched = bench_batched(conn, batched_ids, args.batch_size)
+        conn.close()
+
+    print(f"one transaction per return:    {single:10.0f} returns/s")
+    print(f"batches of {args.batch_size:<4}               {batched:10.0f} returns/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only load once a management window is opened.
+LAZY_MODULES = ("PIL", "mainwindow", "bookmanagement", "borrowermanagement", "transaction", "bookimport", "search")
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import login
+imported = time.perf_counter()
+app = login.LoginWindow()
+app.win.update()
+first_frame = time.perf_counter()
+loaded = [name for name in {lazy!r} if name in sys.modules]
+app.win.destroy()
+print(json.dumps({{"import": imported - start, "first_frame": first_frame - start, "eager_modules": loaded}}))
+"""
+
+
+def run_once():
+    output = subprocess.run([sys.executable, "-c", CHILD.format(lazy=LAZY_MODULES)], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure login import time and time to first frame.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    run_once()  # warm the OS file cache and the scaled background derivative
+    runs = [run_once() for _ in range(args.runs)]
+
+    results = {
+        "runs": args.runs,
+        "import_ms": statistics.median(run["import"] for run in runs) * 1000,
+        "first_frame_ms": statistics.median(run["first_frame"] for run in runs) * 1000,
+        "eager_modules": sorted({name for run in runs for name in run["eager_modules"]}),
+    }
+    print(f"import login:       {results['import_ms']:8.1f} ms (median of {args.runs})")
+    print(f"time to first frame: {results['first_frame_ms']:8.1f} ms")
+    if results["eager_modules"]:
+        print(f"loaded before first frame: {', '.join(results['eager_modules'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if results["eager_modules"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import circulation
+import database
+import migrations
+
+CHUNK_SIZE = 100000
+
+ADJECTIVES = ("Silent", "Hidden", "Golden", "Broken", "Distant", "Crimson", "Forgotten", "Endless", "Quiet", "Burning",
+              "Northern", "Hollow", "Ancient", "Bright", "Lonely", "Wild", "Secret", "Frozen", "Gentle", "Restless")
+NOUNS = ("River", "Garden", "Empire", "Harbor", "Mountain", "Letter", "Kingdom", "Voyage", "Orchard", "Machine",
+         "Shadow", "Library", "Winter", "Island", "Lantern", "Forest", "Mirror", "Station", "Bridge", "Storm")
+FIRST_NAMES = ("Ada", "Ahmet", "Elif", "John", "Maria", "Mehmet", "Olivia", "Can", "Zeynep", "Liam",
+               "Emma", "Ali", "Ayse", "Noah", "Sofia", "Deniz", "Lucas", "Selin", "Omar", "Mia")
+SURNAMES = ("Yilmaz", "Smith", "Kaya", "Garcia", "Demir", "Brown", "Sahin", "Lopez", "Celik", "Miller",
+            "Aydin", "Wilson", "Ozturk", "Moore", "Arslan", "Taylor", "Dogan", "Clark", "Kilic", "Lewis")
+
+
+def book_title(n):
+    # About three copies per title, so title lookups see duplicates.
+    title_number = n // 3
+    return f"The {ADJECTIVES[title_number % 20]} {NOUNS[title_number // 20 % 20]} {title_number // 400 + 1}"
+
+
+def book_author(n):
+    return f"{FIRST_NAMES[n % 20]} {SURNAMES[n // 20 % 20]}"
+
+
+def borrower_name(n):
+    return f"{FIRST_NAMES[n % 20]}{n}"
+
+
+def insert_chunks(conn, query, rows, label, total):
+    done = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        with conn:
+            conn.executemany(query, chunk)
+        done += len(chunk)
+        print(f"{label}: {done}/{total}")
+
+
+def generate(path, books, borrowers, transactions, open_ratio=0.05, years=5, seed=0):
+    rng = random.Random(seed)
+    conn = database.connect(path)
+    migrations.migrate(conn)
+
+    open_loans = min(int(books * open_ratio), transactions)
+    closed_loans = transactions - open_loans
+    borrowed = set(rng.sample(range(1, books + 1), open_loans)) if open_loans else set()
+
+    insert_chunks(conn, "INSERT INTO books (title, author, publication_year, is_borrowed) VALUES (?, ?, ?, ?);",
+                  ((book_title(n), book_author(n), 1900 + rng.randrange(125), int(n + 1 in borrowed)) for n in range(books)),
+                  "books", books)
+    insert_chunks(conn, "INSERT INTO borrowers (name, surname, contact_number) VALUES (?, ?, ?);",
+                  ((borrower_name(n), SURNAMES[rng.randrange(20)], f"555{n:07d}") for n in range(borrowers)),
+                  "borrowers", borrowers)
+
+    # Closed loans are spread evenly over the period in id order, like a
+    # real history; open loans were all made in the last few weeks.
+    today = date.today()
+    start = today - timedelta(days=365 * years)
+    span = (today - start).days
+
+    def closed_rows():
+        for n in range(closed_loans):
+            borrow_day = start + timedelta(days=n * span // max(closed_loans, 1))
+            return_day = min(borrow_day + timedelta(days=rng.randint(1, 30)), today)
+            yield (rng.randint(1, books), rng.randint(1, borrowers), borrow_day.isoformat(), return_day.isoformat(),
+                   circulation.due_date_for(borrow_day))
+
+    def open_rows():
+        for book_id in sorted(borrowed):
+            borrow_day = today - timedelta(days=rng.randint(0, 40))
+            yield book_id, rng.randint(1, borrowers), borrow_day.isoformat(), None, circulation.due_date_for(borrow_day)
+
+    query = "INSERT INTO transactions (book_id, borrower_id, borrow_date, return_date, due_date) VALUES (?, ?, ?, ?, ?);"
+    insert_chunks(conn, query, closed_rows(), "returned loans", closed_loans)
+    insert_chunks(conn, query, open_rows(), "open loans", open_loans)
+
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill a library database with synthetic books, borrowers and loans.")
+    parser.add_argument("output", nargs="?", default=database.DATABASE_PATH)
+    parser.add_argument("--books", type=int, default=1000000)
+    parser.add_argument("--borrowers", type=int, default=200000)
+    parser.add_argument("--transactions", type=int, default=10000000)
+    parser.add_argument("--open-ratio", type=float, default=0.05, help="share of books currently on loan")
+    parser.add_argument("--years", type=int, default=5, help="how far back the loan history goes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="replace the output database if it exists")
+    args = parser.parse_args(argv)
+
+    if args.books < 1 or args.borrowers < 1:
+        parser.error("--books and --borrowers must be at least 1")
+    if os.path.exists(args.output):
+        if not args.force:
+            parser.error(f"{args.output} exists; use --force to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+
+    start = time.perf_counter()
+    generate(args.output, args.books, args.borrowers, args.transactions, args.open_ratio, args.years, args.seed)
+    print(f"generated {args.output} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import autocomplete
+import catalog
+import changelog
+import circulation
+import database
+import lookupcache
+import migrations
+import search
+import windows
+from bookmanagement import BOOK_CHANGES, BOOK_COLUMNS, BOOK_SORTS
+from borrowermanagement import BORROWER_COLUMNS
+from pagedtreeview import KeysetQuery
+from transaction import LOAN_CHANGES, history_query, open_loans_query, overdue_query
+
+PAGE_SIZE = 50
+WARMUP = 10
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, total, errors):
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "total_s": round(total, 4),
+        "throughput_ops": round(len(latencies) / total, 1) if total else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 4),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4),
+    }
+
+
+def measure(operation, inputs, ok=None, warmup=0):
+    # ok(result) decides whether a call counts as an error; reads are
+    # warmed up first so the first iterations do not measure a cold cache.
+    for item in inputs[:warmup]:
+        operation(item)
+
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for item in inputs:
+        began = time.perf_counter()
+        result = operation(item)
+        latencies.append(time.perf_counter() - began)
+        if ok and not ok(result):
+            errors += 1
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def fetch_page(conn, query_and_parameters):
+    query, parameters = query_and_parameters
+    return database.fetch_all(conn, query, parameters)
+
+
+def sample_column(conn, query, count, rng):
+    values = [row[0] for row in conn.execute(query)]
+    return rng.sample(values, min(count, len(values)))
+
+
+def count_rows(conn):
+    return {table: conn.execute(f"SELECT count(*) FROM {table};").fetchone()[0]
+            for table in ("books", "borrowers", "transactions", "transactions_archive")}
+
+
+def run(conn, iterations, seed=0):
+    # A distinct seed space, so the ids drawn here are not the ones
+    # generate_library.py lent out with the same --seed.
+    rng = random.Random(f"benchmark-{seed}")
+    counts = count_rows(conn)
+    max_book_id = conn.execute("SELECT max(id) FROM books;").fetchone()[0] or 1
+    max_borrower_id = conn.execute("SELECT max(id) FROM borrowers;").fetchone()[0] or 1
+    reads = [None] * iterations
+    results = {}
+
+    def page_reader(query):
+        return lambda item: fetch_page(conn, query.first_page(PAGE_SIZE))
+
+    def page_after_reader(query, max_id):
+        return lambda item: fetch_page(conn, query.page_after((rng.randint(1, max_id),), PAGE_SIZE))
+
+    books = KeysetQuery(BOOK_COLUMNS, "books")
+    borrowers = KeysetQuery(BORROWER_COLUMNS, "borrowers")
+    results["books_first_page"] = measure(page_reader(books), reads, warmup=WARMUP)
+    results["books_page_after"] = measure(page_after_reader(books, max_book_id), reads, warmup=WARMUP)
+    by_title = KeysetQuery(BOOK_COLUMNS, "books", order_by=BOOK_SORTS["Title"], descending=True)
+    results["books_by_title_desc"] = measure(page_reader(by_title), reads, warmup=WARMUP)
+    results["borrowers_first_page"] = measure(page_reader(borrowers), reads, warmup=WARMUP)
+    results["borrowers_page_after"] = measure(page_after_reader(borrowers, max_borrower_id), reads, warmup=WARMUP)
+    results["open_loans_first_page"] = measure(page_reader(open_loans_query()), reads, warmup=WARMUP)
+    results["overdue_first_page"] = measure(page_reader(overdue_query()), reads, warmup=WARMUP)
+    results["history_first_page"] = measure(page_reader(history_query()), reads, warmup=WARMUP)
+
+    # Lookups use values that exist, drawn from a random slice of ids.
+    book_ids = ", ".join(str(rng.randint(1, max_book_id)) for _ in range(iterations))
+    borrower_ids = ", ".join(str(rng.randint(1, max_borrower_id)) for _ in range(iterations))
+    titles = sample_column(conn, f"SELECT DISTINCT title FROM books WHERE id IN ({book_ids});", iterations, rng)
+    # Borrowers are typed as they are suggested, "name surname".
+    names = sample_column(conn, f"SELECT trim(ifnull(name, '') || ' ' || ifnull(surname, '')) FROM borrowers "
+                                f"WHERE id IN ({borrower_ids});", iterations, rng)
+    if titles:
+        results["title_availability"] = measure(lambda title: circulation.title_availability(conn, title), titles,
+                                                ok=lambda counts: counts is not None, warmup=WARMUP)
+        results["search_books"] = measure(lambda title: search.search_books(conn, " ".join(title.split()[1:3])), titles,
+                                          ok=bool, warmup=WARMUP)
+        # What a desk types before picking a suggestion: the first few
+        # characters of a title or a borrower's name.
+        results["autocomplete_build_books"] = measure(lambda item: autocomplete.load_index(conn, "books"), [None])
+        title_index = autocomplete.load_index(conn, "books")
+        title_prefixes = [title[:rng.randint(1, 8)] for title in titles]
+        results["autocomplete_titles"] = measure(title_index.suggest, title_prefixes, ok=bool, warmup=WARMUP)
+    if names:
+        borrower_index = autocomplete.load_index(conn, "borrowers")
+        name_prefixes = [name[:rng.randint(1, 4)] for name in names]
+        results["autocomplete_borrowers"] = measure(borrower_index.suggest, name_prefixes, ok=bool, warmup=WARMUP)
+        results["get_borrower_id"] = measure(lambda name: circulation.get_borrower_id(conn, name), names,
+                                             ok=lambda borrower_id: borrower_id is not None, warmup=WARMUP)
+        # A desk's working set: the same few borrowers over and over, which
+        # the lookup cache answers until a borrower changes.
+        regulars = [rng.choice(names[:50]) for _ in range(iterations)]
+        results["get_borrower_id_hot"] = measure(lambda name: circulation.get_borrower_id(conn, name), regulars,
+                                                 ok=lambda borrower_id: borrower_id is not None, warmup=WARMUP)
+
+    # Writes: lend available titles, return them, then add and remove
+    # books that exist only for this run.
+    available = sample_column(conn, f"SELECT DISTINCT title FROM books WHERE is_borrowed = 0 AND id IN ({book_ids});",
+                              iterations, rng)
+    if available and names:
+        today = date.today().isoformat()
+        results["borrow_book"] = measure(lambda title: circulation.borrow_book(conn, title, rng.choice(names), today),
+                                         available, ok=lambda result: result[0] == "book_borrowed")
+        results["return_book"] = measure(lambda title: circulation.return_book(conn, title),
+                                         available, ok=lambda result: result[0] == "book_returned")
+
+    run_id = f"{time.time_ns()}"
+    new_titles = [f"Benchmark {run_id} {n}" for n in range(iterations)]
+    results["add_book"] = measure(lambda title: catalog.add_book(conn, title, "Benchmark", 2000), new_titles)
+    results["remove_books"] = measure(lambda title: catalog.remove_books(conn, title), new_titles, ok=bool)
+
+    # Reopening a hidden window: what the last few dozen writes changed.
+    since = max(changelog.latest_change(conn) - 50, 0)
+    results["reopen_books_window"] = measure(lambda item: windows.changes_since(conn, since, BOOK_CHANGES), reads,
+                                             ok=lambda changes: changes[1] is not None, warmup=WARMUP)
+    results["reopen_loans_window"] = measure(lambda item: windows.changes_since(conn, since, LOAN_CHANGES, ("books", "borrowers")),
+                                             reads, ok=lambda changes: changes[1] is not None, warmup=WARMUP)
+    return counts, results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    for name, result in current["benchmarks"].items():
+        before = previous.get("benchmarks", {}).get(name)
+        if not before:
+            print(f"{name:24} (new)")
+            continue
+        change = (result["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+        print(f"{name:24} p50 {before['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms ({change:+6.1f}%)   "
+              f"p99 {before['p99_ms']:9.3f} -> {result['p99_ms']:9.3f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the database hot paths headlessly and record latency percentiles.")
+    parser.add_argument("database", nargs="?", default=database.DATABASE_PATH,
+                        help="library database, e.g. one made by generate_library.py")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="RESULTS", help="earlier results file to compare against")
+    parser.add_argument("--in-place", action="store_true", help="run against the database itself instead of a copy")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        parser.error(f"{args.database} does not exist; create one with generate_library.py")
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The write benchmarks change the data, so by default they run on a
+        # copy and repeated runs see the same library.
+        path = args.database
+        if not args.in_place:
+            path = os.path.join(directory, "library.db")
+            source = sqlite3.connect(args.database)
+            target = sqlite3.connect(path)
+            source.backup(target)
+            source.close()
+            target.close()
+
+        conn = database.connect(path)
+        migrations.migrate(conn)
+        try:
+            counts, results = run(conn, args.iterations, args.seed)
+            cache_stats = lookupcache.stats(conn)
+        finally:
+            conn.close()
+
+    report = {
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "iterations": args.iterations,
+        "database": counts,
+        "benchmarks": results,
+        "lookup_cache": cache_stats,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:24} p50 {result['p50_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+              f"{result['throughput_ops']:10.1f} ops/s  errors {result['errors']}")
+    print(f"wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print()
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import database
+import migrations
+
+BATCH_SIZE = 5000
+MAX_REJECTED_SAMPLES = 20
+INSERT_BOOK = "INSERT INTO books (title, author, publication_year) VALUES (?, ?, ?);"
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+def is_year(value):
+    # isdigit() alone also accepts digits such as "²" that int() rejects.
+    value = str(value)
+    return value.isascii() and value.isdigit()
+
+
+def validate_book(title, author, year):
+    return all((title, author, is_year(year)))
+
+
+def detect_format(path):
+    name = path.lower()
+    if name.endswith(".jsonl") or name.endswith(".ndjson"):
+        return "jsonl"
+    return "csv"
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line_number, record in enumerate(csv.DictReader(f), start=2):
+            yield line_number, record
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, str(e)
+                continue
+            yield line_number, record if isinstance(record, dict) else "expected a JSON object"
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def parse_record(record):
+    if isinstance(record, str):
+        return None, record
+
+    title = str(record.get("title") or "").strip()
+    author = str(record.get("author") or "").strip()
+    year = str(record.get("publication_year", record.get("year")) or "").strip()
+    if not validate_book(title, author, year):
+        return None, "title, author and a numeric publication_year are required"
+    return (title, author, int(year)), None
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.rejected_samples = []
+        self.cancelled = False
+
+    def reject(self, line_number, reason):
+        self.rejected += 1
+        if len(self.rejected_samples) < MAX_REJECTED_SAMPLES:
+            self.rejected_samples.append((line_number, reason))
+
+
+def import_books(conn, path, file_format=None, batch_size=BATCH_SIZE, progress=None, on_reject=None):
+    # Every batch is committed on its own. progress(result) runs after each
+    # one and may raise ImportCancelled, in which case the import stops
+    # there, keeps the batches already committed and returns with
+    # result.cancelled set.
+    reader = READERS[file_format or detect_format(path)]
+    result = ImportResult()
+    batch = []
+
+    def flush():
+        with conn:
+            conn.executemany(INSERT_BOOK, batch)
+        result.imported += len(batch)
+        batch.clear()
+        if progress:
+            progress(result)
+
+    try:
+        for line_number, record in reader(path):
+            book, reason = parse_record(record)
+            if book is None:
+                result.reject(line_number, reason)
+                if on_reject:
+                    on_reject(line_number, reason)
+                continue
+
+            batch.append(book)
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+        elif progress:
+            progress(result)
+    except ImportCancelled:
+        result.cancelled = True
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import books from CSV or JSON Lines.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(READERS), help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database", default=database.DATABASE_PATH)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error(f"no such file: {args.path}")
+
+    conn = database.connect(args.database)
+    migrations.migrate(conn)
+
+    def report(result):
+        print(f"imported {result.imported}, rejected {result.rejected}", file=sys.stderr, flush=True)
+
+    def reject(line_number, reason):
+        print(f"line {line_number}: {reason}", file=sys.stderr)
+
+    try:
+        result = import_books(conn, args.path, args.format, args.batch_size, report, reject)
+    finally:
+        conn.close()
+
+    print(f"imported {result.imported} books, rejected {result.rejected} rows")
+    return 1 if result.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,55 +1,62 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox as msg
-import sqlite3
-from PIL import Image, ImageTk
 from lang import I18N
-
-class BookManagement(tk.Toplevel):
+import assets
+import instrumentation
+import database
+import bookimport
+import exportwindow
+import importwindow
+import catalog
+from executor import BusyIndicator, WindowJobs
+import search
+from pagedtreeview import KeysetQuery, PagedTreeview, prefix_range
+from windows import ManagedWindow
+
+BOOK_COLUMNS = ("books.id", "books.title", "books.author", "books.publication_year", "books.is_borrowed")
+
+# The ORDER BY behind each sortable heading, each served by an index.
+BOOK_SORTS = {
+    "ID": ("books.id",),
+    "Title": ("ifnull(books.title, '')", "books.id"),
+    "Author": ("ifnull(books.author, '')", "books.id"),
+    "Publication Year": ("ifnull(books.publication_year, 0)", "books.id"),
+}
+
+# Books changed while the window was hidden. is_borrowed is not logged, so
+# lent and returned copies are found through their loans.
+BOOK_CHANGES = """
+SELECT row_id FROM change_log
+WHERE seq > :since AND seq <= :until AND +table_name = 'books' AND row_id IS NOT NULL
+UNION
+SELECT transactions.book_id FROM change_log JOIN transactions ON transactions.id = change_log.row_id
+WHERE change_log.seq > :since AND change_log.seq <= :until AND +change_log.table_name = 'transactions'
+LIMIT :limit;
+"""
+
+class BookManagement(ManagedWindow):
+    CHANGES = BOOK_CHANGES
+
+    @instrumentation.timed("window.BookManagement")
     def __init__(self, parent, language):
         super().__init__()
         self.i18n = I18N(language)
         self.title(self.i18n.book_management)
-        self.geometry("1000x500+210+180")
+        self.geometry("1000x550+210+160")
         self.parent = parent
-        self.protocol("WM_DELETE_WINDOW", self.close_window)
-
-        self.conn = None
-        self.cur = None
 
-        background_image = Image.open("libsys1.gif")
-        background_photo = ImageTk.PhotoImage(background_image)
+        self.jobs = WindowJobs(self, on_error=self.show_database_error, on_busy=BusyIndicator(self))
 
-        background_label = tk.Label(self, image=background_photo)
+        background_label = tk.Label(self, image=assets.background(1000, 550))
         background_label.place(relwidth=1, relheight=1)
-        background_label.image = background_photo
 
-        self.create_table()
         self.create_widgets()
         self.populate_treeview()
 
 
-    def create_table(self):
-        query = '''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            author TEXT,
-            publication_year INTEGER,
-            is_borrowed INTEGER DEFAULT 0
-        );
-        '''
-        self.execute_query(query)
-
-    def execute_query(self, query, parameters=()):
-        try:
-            if not self.conn:
-                self.open_connection()
-
-            self.cur.execute(query, parameters)
-            self.conn.commit()
-        except Exception as e:
-            msg.showerror(self.i18n.error, f"{self.i18n.database_error}: {str(e)}")
+    def show_database_error(self, e):
+        msg.showerror(self.i18n.error, f"{self.i18n.database_error}: {str(e)}")
 
     def create_widgets(self):
         text_color = "antique white"
@@ -60,17 +67,69 @@ class BookManagement(tk.Toplevel):
         add_button = ttk.Button(self, text=self.i18n.add_book, command=self.add_book_window, style="DarkGold.TButton")
         remove_button = ttk.Button(self, text=self.i18n.remove_book, command=self.remove_book_window, style="DarkGold.TButton")
 
+        import_button = ttk.Button(self, text=self.i18n.import_books, command=self.import_books_window, style="DarkGold.TButton")
+        export_button = ttk.Button(self, text=self.i18n.export, command=self.export_books_window, style="DarkGold.TButton")
+
         add_button.pack(pady=10)
         remove_button.pack(pady=10)
-
-        self.tree = ttk.Treeview(self, columns=("ID", "Title", "Author", "Publication Year", "Borrowed"), show="headings", height=10)
-        self.tree.heading("ID", text="ID")
-        self.tree.heading("Title", text=self.i18n.book_title)
-        self.tree.heading("Author", text=self.i18n.author)
-        self.tree.heading("Publication Year", text=self.i18n.publication_year)
+        import_button.pack(pady=10)
+        export_button.pack(pady=10)
+
+        search_frame = ttk.Frame(self)
+        self.search_entry = ttk.Entry(search_frame, width=40)
+        self.fuzzy_search = tk.BooleanVar(value=False)
+        fuzzy_check = ttk.Checkbutton(search_frame, text=self.i18n.fuzzy_search, variable=self.fuzzy_search, command=self.search_books)
+        search_button = ttk.Button(search_frame, text=self.i18n.search, command=self.search_books, style="DarkGold.TButton")
+        self.search_entry.bind("<Return>", self.search_books)
+
+        self.search_entry.grid(row=0, column=0, padx=5)
+        search_button.grid(row=0, column=1, padx=5)
+        fuzzy_check.grid(row=0, column=2, padx=5)
+        search_frame.pack(pady=10)
+        self.search_notice = ttk.Label(self, foreground=text_color)
+        self.search_notice.pack()
+
+        filter_frame = ttk.Frame(self)
+        author_label = ttk.Label(filter_frame, text=self.i18n.author + ":")
+        self.author_filter_entry = ttk.Entry(filter_frame, width=20)
+        year_label = ttk.Label(filter_frame, text=self.i18n.publication_year + ":")
+        self.year_from_entry = ttk.Entry(filter_frame, width=6)
+        year_to_label = ttk.Label(filter_frame, text="-")
+        self.year_to_entry = ttk.Entry(filter_frame, width=6)
+        self.borrowed_filter = ttk.Combobox(filter_frame, state="readonly", width=12,
+                                            values=(self.i18n.all_books, self.i18n.borrowed, self.i18n.available))
+        self.borrowed_filter.current(0)
+        apply_button = ttk.Button(filter_frame, text=self.i18n.apply_filter, command=self.apply_filters, style="DarkGold.TButton")
+        clear_button = ttk.Button(filter_frame, text=self.i18n.clear_filter, command=self.clear_filters, style="DarkGold.TButton")
+
+        author_label.grid(row=0, column=0, padx=5)
+        self.author_filter_entry.grid(row=0, column=1, padx=5)
+        year_label.grid(row=0, column=2, padx=5)
+        self.year_from_entry.grid(row=0, column=3)
+        year_to_label.grid(row=0, column=4)
+        self.year_to_entry.grid(row=0, column=5)
+        self.borrowed_filter.grid(row=0, column=6, padx=5)
+        apply_button.grid(row=0, column=7, padx=5)
+        clear_button.grid(row=0, column=8, padx=5)
+        filter_frame.pack(pady=5)
+        self.filters = ([], ())
+        self.results = None
+
+        query = KeysetQuery(BOOK_COLUMNS, "books")
+        tree_frame = ttk.Frame(self)
+        self.tree = PagedTreeview(tree_frame, self.fetch_rows, query, format_row=self.format_book, columns=("ID", "Title", "Author", "Publication Year", "Borrowed"), show="headings", height=10)
+        self.tree.make_sortable("ID", "ID", self.show_books)
+        self.tree.make_sortable("Title", self.i18n.book_title, self.show_books)
+        self.tree.make_sortable("Author", self.i18n.author, self.show_books)
+        self.tree.make_sortable("Publication Year", self.i18n.publication_year, self.show_books)
         self.tree.heading("Borrowed", text=self.i18n.borrowed)
+        self.tree.show_sort("ID")
 
-        self.tree.pack(pady=10)
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
+        self.tree.attach_scrollbar(scrollbar)
+        self.tree.pack(side="left")
+        scrollbar.pack(side="right", fill="y")
+        tree_frame.pack(pady=10)
 
 
     def add_book_window(self):
@@ -111,52 +170,119 @@ class BookManagement(tk.Toplevel):
         title_entry.grid(row=0, column=1, padx=10, pady=10)
         remove_button.grid(row=1, column=0, columnspan=2, pady=10)
 
+    def import_books_window(self):
+        importwindow.ImportWindow(self, self.populate_treeview)
+
+    def export_books_window(self):
+        exportwindow.ExportWindow(self, "books")
+
     def add_book(self, title, author, year, add_window):
-        if not all((title, author, year.isdigit())):
+        if not bookimport.validate_book(title, author, year):
             msg.showerror(self.i18n.error, self.i18n.fill_all_fields)
             return
 
-        query = "INSERT INTO books (title, author, publication_year) VALUES (?, ?, ?);"
-        self.execute_query(query, (title, author, year))
+        def added(book_id):
+            msg.showinfo(self.i18n.success, self.i18n.book_added)
+            self.tree.insert_ids([book_id])
+            add_window.destroy()
 
-        msg.showinfo(self.i18n.success, self.i18n.book_added)
-        self.populate_treeview()
-        add_window.destroy()
+        self.jobs.submit(catalog.add_book, title, author, year, callback=added)
 
     def remove_book(self, title, remove_window):
         if not title:
             msg.showerror(self.i18n.error, self.i18n.enter_title_to_remove)
             return
 
-        query = "DELETE FROM books WHERE title = ?;"
-        self.execute_query(query, (title,))
+        def removed(book_ids):
+            msg.showinfo(self.i18n.success, self.i18n.book_removed)
+            self.tree.delete_ids(book_ids)
+            remove_window.destroy()
 
-        msg.showinfo(self.i18n.success, self.i18n.book_removed)
-        self.populate_treeview()
-        remove_window.destroy()
-
-    def populate_treeview(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        query = "SELECT * FROM books;"
-        self.execute_query(query)
-        books_data = self.cur.fetchall()
+        self.jobs.submit(catalog.remove_books, title, callback=removed)
 
-        for book in books_data:
-            book_with_is_borrowed = book + (self.i18n.borrowed if book[4] else "",)
-            self.tree.insert("", "end", values=book_with_is_borrowed)
+    def search_books(self, event=None):
+        # A new search starts out in relevance order.
+        self.tree.show_sort(None)
+        self.results = None
+        self.show_books()
 
-    def open_connection(self):
-        self.conn = sqlite3.connect("library.db")
-        self.cur = self.conn.cursor()
-
-    def close_connection(self):
-        if self.conn:
-            self.conn.close()
-            self.cur = None
-            self.conn = None
-
-    def close_window(self):
-        self.close_connection()
-        self.destroy()
+    def apply_filters(self):
+        filters = self.read_filters()
+        if filters is None:
+            msg.showerror(self.i18n.error, self.i18n.invalid_year)
+            return
+        self.filters = filters
+        self.show_books()
+
+    def clear_filters(self):
+        for entry in (self.author_filter_entry, self.year_from_entry, self.year_to_entry):
+            entry.delete(0, tk.END)
+        self.borrowed_filter.current(0)
+        self.filters = ([], ())
+        self.show_books()
+
+    def read_filters(self):
+        conditions = []
+        parameters = []
+        author = self.author_filter_entry.get().strip()
+        if author:
+            condition, values = prefix_range("ifnull(books.author, '')", author)
+            conditions.append(condition)
+            parameters.extend(values)
+        for entry, operator in ((self.year_from_entry, ">="), (self.year_to_entry, "<=")):
+            year = entry.get().strip()
+            if not year:
+                continue
+            if not bookimport.is_year(year):
+                return None
+            conditions.append(f"ifnull(books.publication_year, 0) {operator} ?")
+            parameters.append(int(year))
+        state = self.borrowed_filter.current()
+        if state:
+            conditions.append("books.is_borrowed = ?")
+            parameters.append(1 if state == 1 else 0)
+        return conditions, tuple(parameters)
+
+    def show_books(self):
+        # A search is ranked once; sorting and filtering its results reuse
+        # the stored ranking.
+        text = self.search_entry.get()
+        fuzzy = self.fuzzy_search.get()
+        if not search.match_tiers(text, fuzzy):
+            self.results = None
+            self.search_notice.config(text="")
+            self.show_results(None)
+        elif self.results is not None and self.results[:2] == (text, fuzzy):
+            self.show_results(self.results[2])
+        else:
+            self.jobs.submit(search.store_results, text, fuzzy,
+                             callback=lambda stored: self.searched(text, fuzzy, *stored))
+
+    def searched(self, text, fuzzy, search_id, truncated):
+        self.results = (text, fuzzy, search_id)
+        # Filters and sorting apply to the stored matches only.
+        self.search_notice.config(text=self.i18n.search_capped.format(count=search.MAX_RESULTS) if truncated else "")
+        self.show_results(search_id)
+
+    def show_results(self, search_id):
+        conditions, parameters = self.filters
+        source = "books"
+        order_by = BOOK_SORTS["ID"]
+        if search_id is not None:
+            source = search.RESULTS_SOURCE
+            conditions = ["search_results.search_id = ?"] + conditions
+            parameters = (search_id,) + parameters
+            order_by = ("search_results.position",)
+
+        if self.tree.sort_column in BOOK_SORTS:
+            order_by = BOOK_SORTS[self.tree.sort_column]
+        elif search_id is None:
+            self.tree.show_sort("ID")
+        self.tree.set_query(KeysetQuery(BOOK_COLUMNS, source, order_by=order_by, where=" AND ".join(conditions),
+                                        parameters=parameters, descending=self.tree.sort_descending))
+
+    def fetch_rows(self, query, parameters, callback, error):
+        self.jobs.submit(database.fetch_all, query, parameters, callback=callback, error=error)
+
+    def format_book(self, book):
+        return book[:4] + (self.i18n.borrowed if book[4] else "",)
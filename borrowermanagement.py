@@ -1,53 +1,52 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox as msg
-import sqlite3
-from PIL import Image, ImageTk
 from lang import I18N
-
-class BorrowerManagement(tk.Toplevel):
+import assets
+import instrumentation
+import database
+import catalog
+import exportwindow
+from executor import BusyIndicator, WindowJobs
+from pagedtreeview import KeysetQuery, PagedTreeview, prefix_range
+from windows import ManagedWindow
+
+BORROWER_COLUMNS = ("id", "name", "surname", "contact_number")
+
+# The ORDER BY behind each sortable heading, each served by an index.
+BORROWER_SORTS = {
+    "id": ("id",),
+    "name": ("ifnull(name, '')", "id"),
+    "surname": ("ifnull(surname, '')", "id"),
+}
+
+BORROWER_CHANGES = """
+SELECT row_id FROM change_log
+WHERE seq > :since AND seq <= :until AND +table_name = 'borrowers' AND row_id IS NOT NULL
+LIMIT :limit;
+"""
+
+class BorrowerManagement(ManagedWindow):
+    CHANGES = BORROWER_CHANGES
+
+    @instrumentation.timed("window.BorrowerManagement")
     def __init__(self, parent, language):
         super().__init__()
         self.i18n = I18N(language)
         self.title(self.i18n.borrower_management)
-        self.geometry("1000x500+210+180")
+        self.geometry("1000x550+210+160")
         self.parent = parent
-        self.protocol("WM_DELETE_WINDOW", self.close_window)
-
-        self.conn = None
-        self.cur = None
 
-        background_image = Image.open("libsys1.gif")
-        background_photo = ImageTk.PhotoImage(background_image)
+        self.jobs = WindowJobs(self, on_error=self.show_database_error, on_busy=BusyIndicator(self))
 
-        background_label = tk.Label(self, image=background_photo)
+        background_label = tk.Label(self, image=assets.background(1000, 550))
         background_label.place(relwidth=1, relheight=1)
-        background_label.image = background_photo
 
-        self.create_table()
         self.create_widgets()
         self.populate_treeview()
 
-    def create_table(self):
-        query = '''
-        CREATE TABLE IF NOT EXISTS borrowers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            surname TEXT,
-            contact_number TEXT
-        );
-        '''
-        self.execute_query(query)
-
-    def execute_query(self, query, parameters=()):
-        try:
-            if not self.conn:
-                self.open_connection()
-
-            self.cur.execute(query, parameters)
-            self.conn.commit()
-        except Exception as e:
-            msg.showerror(self.i18n.error, f"{self.i18n.db_error}: {str(e)}")
+    def show_database_error(self, e):
+        msg.showerror(self.i18n.error, f"{self.i18n.db_error}: {str(e)}")
 
     def create_widgets(self):
         text_color = "antique white"
@@ -58,18 +57,45 @@ class BorrowerManagement(tk.Toplevel):
         add_button = ttk.Button(self, text=self.i18n.add_borrower, command=self.add_borrower_window, style="DarkGold.TButton")
         remove_button = ttk.Button(self, text=self.i18n.remove_borrower, command=self.remove_borrower_window,
                                    style="DarkGold.TButton")
+        export_button = ttk.Button(self, text=self.i18n.export, command=self.export_borrowers_window, style="DarkGold.TButton")
 
         add_button.pack(pady=10)
         remove_button.pack(pady=10)
-
-
-        self.tree = ttk.Treeview(self, columns=("ID", self.i18n.name, self.i18n.surname, self.i18n.contact_number), show="headings", height=10)
-        self.tree.heading("ID", text="ID")
-        self.tree.heading(self.i18n.name, text=self.i18n.name)
-        self.tree.heading(self.i18n.surname, text=self.i18n.surname)
+        export_button.pack(pady=10)
+
+        filter_frame = ttk.Frame(self)
+        name_label = ttk.Label(filter_frame, text=self.i18n.name + ":")
+        self.name_filter_entry = ttk.Entry(filter_frame, width=20)
+        surname_label = ttk.Label(filter_frame, text=self.i18n.surname + ":")
+        self.surname_filter_entry = ttk.Entry(filter_frame, width=20)
+        apply_button = ttk.Button(filter_frame, text=self.i18n.apply_filter, command=self.apply_filters, style="DarkGold.TButton")
+        clear_button = ttk.Button(filter_frame, text=self.i18n.clear_filter, command=self.clear_filters, style="DarkGold.TButton")
+        self.name_filter_entry.bind("<Return>", self.apply_filters)
+        self.surname_filter_entry.bind("<Return>", self.apply_filters)
+
+        name_label.grid(row=0, column=0, padx=5)
+        self.name_filter_entry.grid(row=0, column=1, padx=5)
+        surname_label.grid(row=0, column=2, padx=5)
+        self.surname_filter_entry.grid(row=0, column=3, padx=5)
+        apply_button.grid(row=0, column=4, padx=5)
+        clear_button.grid(row=0, column=5, padx=5)
+        filter_frame.pack(pady=5)
+
+        query = KeysetQuery(BORROWER_COLUMNS, "borrowers")
+        tree_frame = ttk.Frame(self)
+        self.tree = PagedTreeview(tree_frame, self.fetch_rows, query, columns=("ID", self.i18n.name, self.i18n.surname, self.i18n.contact_number), show="headings", height=10)
+        self.sort_keys = {"ID": "id", self.i18n.name: "name", self.i18n.surname: "surname"}
+        self.tree.make_sortable("ID", "ID", self.show_borrowers)
+        self.tree.make_sortable(self.i18n.name, self.i18n.name, self.show_borrowers)
+        self.tree.make_sortable(self.i18n.surname, self.i18n.surname, self.show_borrowers)
         self.tree.heading(self.i18n.contact_number, text=self.i18n.contact_number)
+        self.tree.show_sort("ID")
 
-        self.tree.pack(pady=10)
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
+        self.tree.attach_scrollbar(scrollbar)
+        self.tree.pack(side="left")
+        scrollbar.pack(side="right", fill="y")
+        tree_frame.pack(pady=10)
 
     def add_borrower_window(self):
         add_window = tk.Toplevel(self)
@@ -95,6 +121,9 @@ class BorrowerManagement(tk.Toplevel):
         contact_entry.grid(row=2, column=1, padx=10, pady=10)
         add_button.grid(row=3, column=0, columnspan=2, pady=10)
 
+    def export_borrowers_window(self):
+        exportwindow.ExportWindow(self, "borrowers")
+
     def remove_borrower_window(self):
         remove_window = tk.Toplevel(self)
         remove_window.title(self.i18n.remove_borrower)
@@ -119,46 +148,46 @@ class BorrowerManagement(tk.Toplevel):
             msg.showerror(self.i18n.error, self.i18n.fill_all_fields)
             return
 
-        query = "INSERT INTO borrowers (name, surname, contact_number) VALUES (?, ?, ?);"
-        self.execute_query(query, (name, surname, contact))
+        def added(borrower_id):
+            msg.showinfo(self.i18n.success, self.i18n.borrower_added)
+            add_window.destroy()
+            self.tree.insert_ids([borrower_id])
 
-        msg.showinfo(self.i18n.success, self.i18n.borrower_added)
-        add_window.destroy()
-        self.populate_treeview()
+        self.jobs.submit(catalog.add_borrower, name, surname, contact, callback=added)
 
     def remove_borrower(self, name, surname, remove_window):
         if not name or not surname:
             msg.showerror(self.i18n.error, self.i18n.enter_name_surname)
             return
 
-        query = "DELETE FROM borrowers WHERE name = ? AND surname = ?;"
-        self.execute_query(query, (name, surname))
-
-        msg.showinfo(self.i18n.success, self.i18n.borrower_removed)
-        remove_window.destroy()
-        self.populate_treeview()
-
-    def populate_treeview(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        query = "SELECT * FROM borrowers;"
-        self.execute_query(query)
-        borrowers_data = self.cur.fetchall()
-
-        for borrower in borrowers_data:
-            self.tree.insert("", "end", values=borrower)
-
-    def open_connection(self):
-        self.conn = sqlite3.connect("library.db")
-        self.cur = self.conn.cursor()
-
-    def close_connection(self):
-        if self.conn:
-            self.conn.close()
-            self.cur = None
-            self.conn = None
-
-    def close_window(self):
-        self.close_connection()
-        self.destroy()
+        def removed(borrower_ids):
+            msg.showinfo(self.i18n.success, self.i18n.borrower_removed)
+            remove_window.destroy()
+            self.tree.delete_ids(borrower_ids)
+
+        self.jobs.submit(catalog.remove_borrowers, name, surname, callback=removed)
+
+    def apply_filters(self, event=None):
+        self.show_borrowers()
+
+    def clear_filters(self):
+        self.name_filter_entry.delete(0, tk.END)
+        self.surname_filter_entry.delete(0, tk.END)
+        self.show_borrowers()
+
+    def show_borrowers(self):
+        conditions = []
+        parameters = []
+        for entry, column in ((self.name_filter_entry, "name"), (self.surname_filter_entry, "surname")):
+            prefix = entry.get().strip()
+            if prefix:
+                condition, values = prefix_range(f"ifnull({column}, '')", prefix)
+                conditions.append(condition)
+                parameters.extend(values)
+
+        sort = self.sort_keys.get(self.tree.sort_column, "id")
+        self.tree.set_query(KeysetQuery(BORROWER_COLUMNS, "borrowers", order_by=BORROWER_SORTS[sort], where=" AND ".join(conditions),
+                                        parameters=parameters, descending=self.tree.sort_descending))
+
+    def fetch_rows(self, query, parameters, callback, error):
+        self.jobs.submit(database.fetch_all, query, parameters, callback=callback, error=error)
@@ -0,0 +1,29 @@
+import database
+
+
+def delete_ids(conn, table, ids):
+    if ids:
+        placeholders = ", ".join("?" for _ in ids)
+        database.execute(conn, f"DELETE FROM {table} WHERE id IN ({placeholders});", ids)
+    return ids
+
+
+def add_book(conn, title, author, year):
+    query = "INSERT INTO books (title, author, publication_year) VALUES (?, ?, ?);"
+    return database.execute(conn, query, (title, author, year)).lastrowid
+
+
+def remove_books(conn, title):
+    book_ids = [row[0] for row in database.fetch_all(conn, "SELECT id FROM books WHERE title = ?;", (title,))]
+    return delete_ids(conn, "books", book_ids)
+
+
+def add_borrower(conn, name, surname, contact):
+    query = "INSERT INTO borrowers (name, surname, contact_number) VALUES (?, ?, ?);"
+    return database.execute(conn, query, (name, surname, contact)).lastrowid
+
+
+def remove_borrowers(conn, name, surname):
+    query = "SELECT id FROM borrowers WHERE name = ? AND surname = ?;"
+    borrower_ids = [row[0] for row in database.fetch_all(conn, query, (name, surname))]
+    return delete_ids(conn, "borrowers", borrower_ids)
@@ -0,0 +1,15 @@
+# Readers that follow change_log: windows, the completion indexes and the
+# lookup cache remember the last seq they saw and read what came after it.
+#
+# Queries over a seq range put a unary + on table_name, which keeps SQLite
+# on the seq range; the (table_name, row_id) index would walk every row the
+# table ever logged.
+TABLE_CHANGED = "SELECT 1 FROM change_log WHERE seq > ? AND seq <= ? AND +table_name = ? LIMIT 1;"
+
+
+def latest_change(conn):
+    return conn.execute("SELECT ifnull(max(seq), 0) FROM change_log;").fetchone()[0]
+
+
+def table_changed(conn, since, until, table):
+    return conn.execute(TABLE_CHANGED, (since, until, table)).fetchone() is not None
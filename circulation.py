@@ -0,0 +1,327 @@
+import os
+from datetime import date, datetime, timedelta
+import database
+import lookupcache
+
+LOAN_PERIOD_DAYS = int(os.environ.get("LIBRARY_LOAN_DAYS", "14"))
+
+# Due dates are stored as proleptic Gregorian ordinals (date.toordinal()):
+# compact, sortable integers. Adding this offset gives SQLite's julianday.
+ORDINAL_TO_JULIAN = 1721424.5
+
+
+# Borrowers are suggested as "name surname"; typed text is matched on the
+# same expression, so a picked suggestion typed back in still resolves.
+BORROWER_BY_FULL_NAME = "SELECT id FROM borrowers WHERE trim(ifnull(name, '') || ' ' || ifnull(surname, '')) = ? LIMIT 1;"
+
+
+# Stands in for the id of a bare first name that several borrowers share.
+AMBIGUOUS = "ambiguous"
+
+
+def load_borrower_id(conn, name):
+    # A bare first name is taken only while no other borrower shares it.
+    name = name.strip()
+    result = database.fetch_one(conn, BORROWER_BY_FULL_NAME, (name,))
+    if result:
+        return result[0]
+    matches = database.fetch_all(conn, "SELECT id FROM borrowers WHERE name = ? LIMIT 2;", (name,))
+    if not matches:
+        return None
+    return matches[0][0] if len(matches) == 1 else AMBIGUOUS
+
+
+# Desks look the same borrowers up over and over, and lending or returning
+# a book does not change them; this goes through the connection's lookup
+# cache.
+
+def get_borrower_id(conn, name):
+    cache = lookupcache.cache_for(conn)
+    return cache.lookup(cache.borrower_ids, name, load_borrower_id)
+
+
+def convert_to_date(date_str):
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def due_date_for(borrow_day, loan_period_days=None):
+    return (borrow_day + timedelta(days=LOAN_PERIOD_DAYS if loan_period_days is None else loan_period_days)).toordinal()
+
+
+def today_ordinal():
+    return date.today().toordinal()
+
+
+def find_copy(conn, title, borrowed, book_ids=None):
+    # Prefer a copy in the wanted state when several books share a title.
+    # book_ids, when a copy was picked from the suggestions, replaces the
+    # title lookup.
+    if book_ids:
+        placeholders = ", ".join("?" for _ in book_ids)
+        query = f"SELECT id, is_borrowed FROM books WHERE id IN ({placeholders}) ORDER BY is_borrowed = ? DESC, id LIMIT 1;"
+        return database.fetch_one(conn, query, (*book_ids, borrowed))
+    query = "SELECT id, is_borrowed FROM books WHERE title = ? ORDER BY is_borrowed = ? DESC, id LIMIT 1;"
+    return database.fetch_one(conn, query, (title, borrowed))
+
+
+# Copies are lent in this order: the one on the hold shelf for this
+# borrower, then any copy on the shelf that no hold has set aside.
+LENDING_STATE = """
+SELECT copies, available,
+       (SELECT book_id FROM holds WHERE title_id = titles.id AND borrower_id = ? AND book_id IS NOT NULL LIMIT 1)
+FROM titles WHERE title = ?;
+"""
+SHELF_COPY = """
+SELECT id FROM books WHERE title = ? AND is_borrowed = 0
+  AND id NOT IN (SELECT book_id FROM holds WHERE book_id IS NOT NULL) LIMIT 1;
+"""
+# Lending a copy fills the borrower's holds on its title.
+FILL_HOLDS = """
+DELETE FROM holds WHERE borrower_id = ? AND title_id = (SELECT titles.id FROM titles JOIN books ON books.title = titles.title WHERE books.id = ?);
+"""
+
+
+def title_availability(conn, title):
+    # (copies, available) from the titles counters, or None for an unknown
+    # title; available leaves out copies that are lent or on the hold shelf.
+    return database.fetch_one(conn, "SELECT copies, available FROM titles WHERE title = ?;", (title,))
+
+
+# Copies picked from the suggestions, with whom the hold shelf keeps each for.
+PICKED_COPIES = """
+SELECT books.id, books.is_borrowed, holds.borrower_id
+FROM books LEFT JOIN holds ON holds.book_id = books.id
+WHERE books.id IN ({placeholders}) ORDER BY books.id;
+"""
+
+
+def find_picked_copy(conn, book_ids, borrower_id):
+    # Same order as find_copy_to_lend, among the picked copies only.
+    placeholders = ", ".join("?" for _ in book_ids)
+    copies = database.fetch_all(conn, PICKED_COPIES.format(placeholders=placeholders), book_ids)
+    if not copies:
+        return "book_not_found", None
+    for book_id, is_borrowed, held_for in copies:
+        if held_for == borrower_id:
+            return "book_borrowed", book_id
+    for book_id, is_borrowed, held_for in copies:
+        if not is_borrowed and held_for is None:
+            return "book_borrowed", book_id
+    return "book_already_borrowed", None
+
+
+def find_copy_to_lend(conn, title, borrower_id, book_ids=None):
+    # Returns (status, book_id). The counters answer whether any copy is
+    # free without reading the copies; only then is one picked, from the
+    # partial index of copies on the shelf. Picked copies are read by id.
+    if book_ids:
+        return find_picked_copy(conn, book_ids, borrower_id)
+    state = database.fetch_one(conn, LENDING_STATE, (borrower_id, title))
+    if not state:
+        return "book_not_found", None
+    copies, available, held = state
+    if held is not None:
+        return "book_borrowed", held
+    if not copies:
+        return "book_not_found", None
+    if not available:
+        return "book_already_borrowed", None
+    copy = database.fetch_one(conn, SHELF_COPY, (title,))
+    if not copy:
+        return "book_already_borrowed", None
+    return "book_borrowed", copy[0]
+
+
+def find_borrower(conn, name, borrower_id=None):
+    # Returns (status, borrower_id); borrower_id is None when status names
+    # why no borrower was found. A borrower picked from the suggestions is
+    # taken by id, so a namesake is never lent to by mistake; the id is
+    # still checked, since the borrower may have been removed meanwhile.
+    if borrower_id is None:
+        borrower_id = get_borrower_id(conn, name)
+        if borrower_id == AMBIGUOUS:
+            return "borrower_ambiguous", None
+    else:
+        result = database.fetch_one(conn, "SELECT id FROM borrowers WHERE id = ?;", (borrower_id,))
+        borrower_id = result[0] if result else None
+    if borrower_id is None:
+        return "borrower_not_found", None
+    return "borrower_found", borrower_id
+
+
+def checkout(conn, book_id, borrower_id, borrow_day):
+    # Must run inside a transaction. The conditional UPDATE is what claims
+    # the copy, so two desks can never lend the same one. A copy on the
+    # hold shelf only goes to the borrower it is held for.
+    hold = conn.execute("SELECT borrower_id FROM holds WHERE book_id = ?;", (book_id,)).fetchone()
+    if hold and hold[0] != borrower_id:
+        return None
+    cur = conn.execute("UPDATE books SET is_borrowed = 1 WHERE id = ? AND is_borrowed = 0;", (book_id,))
+    if cur.rowcount == 0:
+        return None
+    conn.execute(FILL_HOLDS, (borrower_id, book_id))
+    query = "INSERT INTO transactions (book_id, borrower_id, borrow_date, due_date) VALUES (?, ?, ?, ?);"
+    return conn.execute(query, (book_id, borrower_id, borrow_day.isoformat(), due_date_for(borrow_day))).lastrowid
+
+
+def checkout_title(conn, title, borrower_id, borrow_day):
+    status, book_id = find_copy_to_lend(conn, title, borrower_id)
+    if book_id is None:
+        return status, None
+    transaction_id = checkout(conn, book_id, borrower_id, borrow_day)
+    if transaction_id is None:
+        return "book_already_borrowed", None
+    return "book_borrowed", transaction_id
+
+
+def find_scanned_copy(conn, item):
+    # Scanners send book ids. "#1984" is always book 1984; a bare number is
+    # tried as a title first, so a title such as "1984" is not taken for
+    # the book with that id.
+    if item.startswith("#") and item[1:].isascii() and item[1:].isdigit():
+        return database.fetch_one(conn, "SELECT id, is_borrowed FROM books WHERE id = ?;", (int(item[1:]),))
+    copy = find_copy(conn, item, 1)
+    if copy or not (item.isascii() and item.isdigit()):
+        return copy
+    return database.fetch_one(conn, "SELECT id, is_borrowed FROM books WHERE id = ?;", (int(item),))
+
+
+def checkin(conn, book_id, return_date):
+    # Must run inside a transaction; returns the closed transaction ids.
+    cur = conn.execute("UPDATE books SET is_borrowed = 0 WHERE id = ? AND is_borrowed = 1;", (book_id,))
+    if cur.rowcount == 0:
+        return None
+    query_open_transactions = "SELECT id FROM transactions WHERE book_id = ? AND return_date IS NULL;"
+    transaction_ids = [row[0] for row in conn.execute(query_open_transactions, (book_id,))]
+    conn.executemany("UPDATE transactions SET return_date = ? WHERE id = ?;",
+                     [(return_date, transaction_id) for transaction_id in transaction_ids])
+    return transaction_ids
+
+
+def return_status(conn, book_id):
+    # A returned copy that a hold was waiting for is set aside by the
+    # titles triggers; the desk is told to put it on the hold shelf.
+    held = conn.execute("SELECT 1 FROM holds WHERE book_id = ?;", (book_id,)).fetchone()
+    return "book_held" if held else "book_returned"
+
+
+# The operations below return (status, ids) where status names the I18N
+# message to show, so they can run on the query executor without touching Tk.
+
+def borrow_book(conn, title, borrower, borrow_date, book_ids=None, borrower_id=None):
+    borrow_day = convert_to_date(borrow_date)
+    if not borrow_day:
+        return "invalid_date_format", []
+
+    with database.transaction(conn):
+        status, borrower_id = find_borrower(conn, borrower, borrower_id)
+        if borrower_id is None:
+            return status, []
+
+        status, book_id = find_copy_to_lend(conn, title, borrower_id, book_ids)
+        if book_id is None:
+            return status, []
+
+        transaction_id = checkout(conn, book_id, borrower_id, borrow_day)
+    if transaction_id is None:
+        return "book_already_borrowed", []
+    return "book_borrowed", [transaction_id]
+
+
+def borrow_books(conn, titles, borrower, borrow_date, borrower_id=None):
+    # Checks out a stack of books for one borrower in a single commit.
+    # Returns (status, results) with one (title, status, transaction_id)
+    # per title; titles that cannot be lent do not stop the others.
+    borrow_day = convert_to_date(borrow_date)
+    if not borrow_day:
+        return "invalid_date_format", []
+
+    results = []
+    with database.transaction(conn):
+        status, borrower_id = find_borrower(conn, borrower, borrower_id)
+        if borrower_id is None:
+            return status, []
+        for title in titles:
+            status, transaction_id = checkout_title(conn, title, borrower_id, borrow_day)
+            results.append((title, status, transaction_id))
+    return "book_borrowed", results
+
+
+def return_book(conn, title, book_ids=None):
+    with database.transaction(conn):
+        copy = find_copy(conn, title, 1, book_ids)
+        if not copy:
+            return "book_not_found", []
+        transaction_ids = checkin(conn, copy[0], datetime.now().strftime("%Y-%m-%d")) if copy[1] else None
+        if transaction_ids is None:
+            return "book_not_borrowed", []
+        return return_status(conn, copy[0]), transaction_ids
+
+
+def return_books(conn, items, return_date=None):
+    # Processes a batch of scanned ids or titles in one transaction and
+    # returns one (item, status, transaction_ids) per item.
+    return_date = return_date or datetime.now().strftime("%Y-%m-%d")
+    results = []
+    with database.transaction(conn):
+        for item in items:
+            copy = find_scanned_copy(conn, item)
+            if not copy:
+                results.append((item, "book_not_found", []))
+                continue
+            transaction_ids = checkin(conn, copy[0], return_date) if copy[1] else None
+            if transaction_ids is None:
+                results.append((item, "book_not_borrowed", []))
+            else:
+                results.append((item, return_status(conn, copy[0]), transaction_ids))
+    return results
+
+
+HOLDS = """
+SELECT holds.id, titles.title, trim(ifnull(borrowers.name, '') || ' ' || ifnull(borrowers.surname, '')),
+       holds.placed_at, holds.book_id
+FROM holds
+JOIN titles ON titles.id = holds.title_id
+LEFT JOIN borrowers ON borrowers.id = holds.borrower_id
+ORDER BY holds.book_id IS NULL, titles.title, holds.id;
+"""
+
+
+def place_hold(conn, title, borrower, book_ids=None, borrower_id=None):
+    # Queues the borrower for the next copy of the title. A title with a
+    # copy on the shelf is simply lent instead.
+    with database.transaction(conn):
+        status, borrower_id = find_borrower(conn, borrower, borrower_id)
+        if borrower_id is None:
+            return status, []
+        if book_ids:
+            placeholders = ", ".join("?" for _ in book_ids)
+            query = f"SELECT titles.id, titles.available FROM books JOIN titles ON titles.title = books.title WHERE books.id IN ({placeholders}) LIMIT 1;"
+            counts = database.fetch_one(conn, query, book_ids)
+        else:
+            counts = database.fetch_one(conn, "SELECT id, available FROM titles WHERE title = ?;", (title,))
+        if not counts:
+            return "book_not_found", []
+        if counts[1] > 0:
+            return "book_available", []
+        if database.fetch_one(conn, "SELECT 1 FROM holds WHERE title_id = ? AND borrower_id = ?;", (counts[0], borrower_id)):
+            return "hold_exists", []
+        query = "INSERT INTO holds (title_id, borrower_id, placed_at) VALUES (?, ?, datetime('now', 'localtime'));"
+        hold_id = conn.execute(query, (counts[0], borrower_id)).lastrowid
+    return "hold_placed", [hold_id]
+
+
+def cancel_holds(conn, hold_ids):
+    # A cancelled hold that was ready passes its copy on to the next one.
+    with database.transaction(conn):
+        placeholders = ", ".join("?" for _ in hold_ids)
+        conn.execute(f"DELETE FROM holds WHERE id IN ({placeholders});", hold_ids)
+    return hold_ids
+
+
+def list_holds(conn):
+    # Ready holds first, then the queues, each in the order they are served.
+    return conn.execute(HOLDS).fetchall()
@@ -0,0 +1,90 @@
+import atexit
+import contextlib
+import sqlite3
+import instrumentation
+import lookupcache
+import migrations
+
+DATABASE_PATH = "library.db"
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",
+    "PRAGMA mmap_size = 134217728;",
+    "PRAGMA temp_store = MEMORY;",
+)
+
+_connection = None
+
+
+def connect(path=DATABASE_PATH):
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE, factory=instrumentation.connection_factory())
+    instrumentation.attach(conn)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    global _connection
+    if _connection is None:
+        _connection = connect()
+        migrations.migrate(_connection)
+    return _connection
+
+
+def execute(conn, query, parameters=()):
+    try:
+        cur = conn.execute(query, parameters)
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+            lookupcache.invalidate(conn)
+        raise
+
+    # sqlite3 only opens an implicit transaction for INSERT/UPDATE/DELETE,
+    # so plain SELECTs never pay for a commit.
+    if conn.in_transaction:
+        conn.commit()
+    return cur
+
+
+@contextlib.contextmanager
+def transaction(conn):
+    # BEGIN IMMEDIATE takes the write lock up front, so reads made inside
+    # the block cannot be invalidated by another writer before the commit.
+    conn.execute("BEGIN IMMEDIATE;")
+    lookupcache.begin_write(conn)
+    try:
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+    except BaseException:
+        lookupcache.end_write(conn, rolled_back=True)
+        raise
+    lookupcache.end_write(conn)
+
+
+def fetch_all(conn, query, parameters=()):
+    return conn.execute(query, parameters).fetchall()
+
+
+def fetch_one(conn, query, parameters=()):
+    return conn.execute(query, parameters).fetchone()
+
+
+def close_connection():
+    global _connection
+    if _connection is not None:
+        lookupcache.release(_connection)
+        _connection.close()
+        _connection = None
+
+
+atexit.register(close_connection)
@@ -0,0 +1,232 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from tkinter import ttk
+import database
+import instrumentation
+
+POLL_INTERVAL_MS = 15
+BUSY_DELAY_MS = 150
+
+
+class QueryExecutor:
+    def __init__(self, connect=database.get_connection, close=database.close_connection):
+        self.connect = connect
+        self.close = close
+        self.jobs = queue.SimpleQueue()
+        self.conn = None
+        self.current = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="query-executor", daemon=True)
+        self.thread.start()
+
+    def submit(self, job, *args):
+        future = Future()
+        self.jobs.put((future, job, args, time.perf_counter()))
+        return future
+
+    def cancel(self, future):
+        if future.cancel():
+            return True
+        with self.lock:
+            if self.current is future and self.conn is not None:
+                self.conn.interrupt()
+                return True
+        return False
+
+    def shutdown(self, wait=True):
+        self.jobs.put(None)
+        if wait:
+            self.thread.join()
+
+    def run(self):
+        # The connection is created here so it belongs to the worker thread;
+        # every query in the process goes through this one thread.
+        self.conn = self.connect()
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                break
+
+            future, job, args, submitted = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self.lock:
+                self.current = future
+            began = time.perf_counter()
+            try:
+                result = job(self.conn, *args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self.lock:
+                    self.current = None
+                if instrumentation.enabled():
+                    instrumentation.record_time("executor.queue_wait", began - submitted)
+                    instrumentation.record_time(f"job.{getattr(job, '__qualname__', job)}", time.perf_counter() - began)
+        self.close()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = QueryExecutor()
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+atexit.register(shutdown_executor)
+
+
+def run_in_thread(job, *args, connect=None):
+    # For long read-only jobs such as exports, which would otherwise hold
+    # the query thread for minutes. The job gets its own connection, so in
+    # WAL mode it reads one consistent snapshot while the app keeps working.
+    connect = connect or database.connect
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        conn = connect()
+        try:
+            future.set_result(job(conn, *args))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            conn.close()
+
+    threading.Thread(target=run, name=f"job-{getattr(job, '__name__', 'job')}", daemon=True).start()
+    return future
+
+
+class WindowJobs:
+    def __init__(self, widget, on_error=None, on_busy=None):
+        self.widget = widget
+        self.on_error = on_error
+        self.on_busy = on_busy
+        self.pending = []
+        self.posted = queue.SimpleQueue()
+        self.polling = None
+        self.busy = False
+        self.busy_timer = None
+        self.closed = False
+
+    def submit(self, job, *args, callback=None, error=None):
+        return self.track(get_executor().submit(job, *args), callback, error)
+
+    def submit_thread(self, job, *args, callback=None, error=None):
+        return self.track(run_in_thread(job, *args), callback, error)
+
+    def track(self, future, callback=None, error=None):
+        if self.closed:
+            future.cancel()
+            return future
+
+        self.pending.append((future, callback, error))
+        if self.busy_timer is None and not self.busy:
+            self.busy_timer = self.widget.after(BUSY_DELAY_MS, self.show_busy)
+        self.schedule_poll()
+        return future
+
+    def post(self, callback, *args):
+        # Safe to call from the worker thread; runs callback on the Tk thread.
+        self.posted.put((callback, args))
+
+    def schedule_poll(self):
+        if self.polling is None and not self.closed:
+            self.polling = self.widget.after(POLL_INTERVAL_MS, self.poll)
+
+    def poll(self):
+        self.polling = None
+        if self.closed:
+            return
+
+        # Snapshot finished jobs first so any progress they posted is
+        # delivered before their completion callbacks.
+        done = [entry for entry in self.pending if entry[0].done()]
+        self.pending = [entry for entry in self.pending if entry not in done]
+
+        while not self.posted.empty():
+            callback, args = self.posted.get()
+            callback(*args)
+            if self.closed:
+                return
+
+        for future, callback, error in done:
+            if self.closed:
+                return
+            if future.cancelled():
+                continue
+            exception = future.exception()
+            if exception is not None:
+                # An error handler that returns True has told the user
+                # itself; the window's generic message is left out.
+                if error and error(exception):
+                    continue
+                if self.on_error:
+                    self.on_error(exception)
+            elif callback:
+                callback(future.result())
+
+        if self.pending:
+            self.schedule_poll()
+        else:
+            self.hide_busy()
+
+    def show_busy(self):
+        self.busy_timer = None
+        if self.pending and not self.closed:
+            self.busy = True
+            if self.on_busy:
+                self.on_busy(True)
+
+    def hide_busy(self):
+        if self.busy_timer is not None:
+            self.widget.after_cancel(self.busy_timer)
+            self.busy_timer = None
+        if self.busy:
+            self.busy = False
+            if self.on_busy:
+                self.on_busy(False)
+
+    def cancel_all(self):
+        self.closed = True
+        for future, callback, error in self.pending:
+            get_executor().cancel(future)
+        self.pending = []
+        if self.polling is not None:
+            self.widget.after_cancel(self.polling)
+            self.polling = None
+        if self.busy_timer is not None:
+            self.widget.after_cancel(self.busy_timer)
+            self.busy_timer = None
+
+
+class BusyIndicator:
+    def __init__(self, window):
+        self.window = window
+        self.bar = ttk.Progressbar(window, mode="indeterminate")
+
+    def __call__(self, busy):
+        if busy:
+            self.window.configure(cursor="watch")
+            self.bar.place(relx=0, rely=1.0, relwidth=1.0, anchor="sw")
+            self.bar.start(10)
+        else:
+            self.bar.stop()
+            self.bar.place_forget()
+            self.window.configure(cursor="")
@@ -0,0 +1,141 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import circulation
+import database
+import migrations
+
+BATCH_SIZE = 5000
+
+# name -> (columns, query). Every query walks a primary key in order, so
+# SQLite streams rows without sorting and memory stays flat.
+EXPORTS = {
+    "books": (
+        ("id", "title", "author", "publication_year", "is_borrowed"),
+        "SELECT id, title, author, publication_year, is_borrowed FROM books ORDER BY id;",
+    ),
+    "borrowers": (
+        ("id", "name", "surname", "contact_number"),
+        "SELECT id, name, surname, contact_number FROM borrowers ORDER BY id;",
+    ),
+    "transactions": (
+        ("id", "book_id", "title", "borrower_id", "borrower", "borrow_date", "return_date", "due_date"),
+        f"""
+        SELECT loans.id, loans.book_id, books.title, loans.borrower_id, borrowers.name,
+               loans.borrow_date, loans.return_date, date(loans.due_date + {circulation.ORDINAL_TO_JULIAN})
+        FROM (SELECT id, book_id, borrower_id, borrow_date, return_date, due_date FROM transactions
+              UNION ALL
+              SELECT id, book_id, borrower_id, borrow_date, return_date, due_date FROM transactions_archive) AS loans
+        LEFT JOIN books ON loans.book_id = books.id
+        LEFT JOIN borrowers ON loans.borrower_id = borrowers.id
+        ORDER BY loans.id;
+        """,
+    ),
+}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def detect_format(path):
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    if name.endswith(".jsonl") or name.endswith(".ndjson"):
+        return "jsonl", compressed
+    return "csv", compressed
+
+
+def open_output(path, compressed):
+    if compressed:
+        return gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def write_csv(f, columns, batches):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+
+
+def write_jsonl(f, columns, batches):
+    for rows in batches:
+        f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+def export_table(conn, name, path, file_format=None, compressed=None, batch_size=BATCH_SIZE, progress=None):
+    # Writes to a temporary file and renames it at the end, so a failed or
+    # cancelled export never leaves a truncated file behind. progress(rows)
+    # runs after every batch and may raise ExportCancelled, in which case
+    # the export stops and returns None.
+    columns, query = EXPORTS[name]
+    detected_format, detected_compressed = detect_format(path)
+    file_format = file_format or detected_format
+    compressed = detected_compressed if compressed is None else compressed
+    exported = 0
+
+    def batches():
+        nonlocal exported
+        cursor = conn.execute(query)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+                exported += len(rows)
+                if progress:
+                    progress(exported)
+        finally:
+            cursor.close()
+
+    partial_path = path + ".part"
+    try:
+        with open_output(partial_path, compressed) as f:
+            WRITERS[file_format](f, columns, batches())
+        os.replace(partial_path, path)
+    except BaseException as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        if isinstance(e, ExportCancelled):
+            return None
+        raise
+    return exported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export books, borrowers or transactions to CSV or JSON Lines.")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("path", help="output file; a .gz suffix compresses it")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="defaults to the file extension")
+    parser.add_argument("--gzip", action="store_true", help="compress even without a .gz suffix")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--database", default=database.DATABASE_PATH)
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.database)
+    migrations.migrate(conn)
+
+    def report(exported):
+        print(f"exported {exported}", file=sys.stderr, flush=True)
+
+    try:
+        exported = export_table(conn, args.table, args.path, args.format, True if args.gzip else None, args.batch_size, report)
+    finally:
+        conn.close()
+
+    print(f"exported {exported} {args.table} rows to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox as msg
+from tkinter import filedialog
+import export
+
+FILE_TYPES = [("CSV", "*.csv"), ("CSV (gzip)", "*.csv.gz"), ("JSON Lines", "*.jsonl"), ("JSON Lines (gzip)", "*.jsonl.gz")]
+
+
+class ExportWindow:
+    def __init__(self, owner, table):
+        self.owner = owner
+        self.i18n = owner.i18n
+        self.table = table
+        self.cancelled = False
+
+        self.path = filedialog.asksaveasfilename(parent=owner, title=self.i18n.export, initialfile=f"{table}.csv",
+                                                 defaultextension=".csv", filetypes=FILE_TYPES)
+        if not self.path:
+            self.top = None
+            return
+
+        self.top = tk.Toplevel(owner)
+        self.top.title(self.i18n.export)
+        self.top.geometry("360x110+520+250")
+        self.top.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.progress_label = ttk.Label(self.top, text=self.i18n.export_progress.format(count=0), foreground="black")
+        cancel_button = ttk.Button(self.top, text=self.i18n.cancel, command=self.cancel)
+        self.progress_label.pack(padx=10, pady=15)
+        cancel_button.pack()
+
+        # The export runs on its own thread and connection so the window's
+        # queries are not stuck behind it.
+        owner.jobs.submit_thread(export.export_table, table, self.path, None, None, export.BATCH_SIZE, self.progress,
+                                 callback=self.exported, error=self.failed)
+
+    def progress(self, exported):
+        # Called on the export thread.
+        if self.cancelled or self.owner.jobs.closed:
+            raise export.ExportCancelled()
+        self.owner.jobs.post(self.report, exported)
+
+    def report(self, exported):
+        if self.top.winfo_exists():
+            self.progress_label.config(text=self.i18n.export_progress.format(count=exported))
+
+    def exported(self, count):
+        if self.top.winfo_exists():
+            self.top.destroy()
+        if count is not None:
+            msg.showinfo(self.i18n.success, self.i18n.export_done.format(count=count, path=self.path))
+
+    def failed(self, exception):
+        if self.top.winfo_exists():
+            self.top.destroy()
+
+    def cancel(self):
+        self.cancelled = True
+        self.top.destroy()
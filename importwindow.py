@@ -0,0 +1,66 @@
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox as msg
+from tkinter import filedialog
+import bookimport
+
+FILE_TYPES = [("CSV", "*.csv"), ("JSON Lines", "*.jsonl *.ndjson")]
+
+
+class ImportWindow:
+    def __init__(self, owner, on_done):
+        self.owner = owner
+        self.i18n = owner.i18n
+        self.on_done = on_done
+        self.cancelled = False
+
+        self.path = filedialog.askopenfilename(parent=owner, title=self.i18n.import_books, filetypes=FILE_TYPES)
+        if not self.path:
+            self.top = None
+            return
+
+        self.top = tk.Toplevel(owner)
+        self.top.title(self.i18n.import_books)
+        self.top.geometry("360x110+520+250")
+        self.top.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.progress_label = ttk.Label(self.top, foreground="black")
+        cancel_button = ttk.Button(self.top, text=self.i18n.cancel, command=self.cancel)
+        self.progress_label.pack(padx=10, pady=15)
+        cancel_button.pack()
+
+        # Like an export, the import runs on its own thread and connection,
+        # so paging, search and the other windows are not stuck behind it.
+        owner.jobs.submit_thread(bookimport.import_books, self.path, None, bookimport.BATCH_SIZE, self.progress,
+                                 callback=self.imported, error=self.failed)
+
+    def progress(self, result):
+        # Called on the import thread, after each committed batch.
+        if self.cancelled or self.owner.jobs.closed:
+            raise bookimport.ImportCancelled()
+        self.owner.jobs.post(self.report, result.imported, result.rejected)
+
+    def report(self, imported, rejected):
+        if self.top.winfo_exists():
+            self.progress_label.config(text=self.i18n.import_progress.format(imported=imported, rejected=rejected))
+
+    def imported(self, result):
+        if self.top.winfo_exists():
+            self.top.destroy()
+        message = self.i18n.import_cancelled if result.cancelled else self.i18n.import_progress
+        summary = message.format(imported=result.imported, rejected=result.rejected)
+        rejected_lines = "\n".join(f"{line_number}: {reason}" for line_number, reason in result.rejected_samples)
+        msg.showinfo(self.i18n.import_books if result.cancelled else self.i18n.success, f"{summary}\n{rejected_lines}".strip())
+        self.on_done()
+
+    def failed(self, exception):
+        # An unreadable file or a locked database: batches committed before
+        # the failure stay, so the list is reloaded as well.
+        if self.top.winfo_exists():
+            self.top.destroy()
+        msg.showerror(self.i18n.error, f"{self.i18n.import_failed}: {exception}")
+        self.on_done()
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+        self.top.destroy()
@@ -0,0 +1,211 @@
+import atexit
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Off unless LIBRARY_PROFILE is set or the app runs with --profile.
+ENV_FLAG = "LIBRARY_PROFILE"
+SLOW_QUERY_MS = float(os.environ.get("LIBRARY_SLOW_QUERY_MS", "100"))
+METRICS_PATH = os.environ.get("LIBRARY_METRICS_FILE", "metrics.json")
+SLOW_LOG_PATH = os.environ.get("LIBRARY_SLOW_QUERY_LOG", "slow_queries.log")
+
+WHITESPACE = re.compile(r"\s+")
+PLACEHOLDER_LIST = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_metrics = None
+
+
+class Metrics:
+    def __init__(self, slow_query_ms, metrics_path, slow_log_path):
+        self.slow_query_ms = slow_query_ms
+        self.metrics_path = metrics_path
+        self.slow_log_path = slow_log_path
+        self.started = time.time()
+        self.lock = threading.Lock()
+        # name -> [calls, total seconds, max seconds]
+        self.timers = {}
+        self.queries = {}
+        self.traced = {}
+
+    def add(self, table, name, seconds, calls=1):
+        with self.lock:
+            entry = table.get(name)
+            if entry is None:
+                entry = table[name] = [0, 0.0, 0.0]
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def count(self, table, name):
+        with self.lock:
+            table[name] = table.get(name, 0) + 1
+
+    def log_slow(self, sql, seconds, phase, parameters):
+        line = f"{datetime.now().isoformat(timespec='milliseconds')}\t{seconds * 1000:.1f} ms\t{phase}\t{normalize(sql)}"
+        if parameters:
+            line += f"\t{parameters!r:.200}"
+        with self.lock:
+            with open(self.slow_log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def snapshot(self):
+        def summary(entry):
+            calls, total, longest = entry
+            return {"count": calls, "total_ms": round(total * 1000, 3),
+                    "mean_ms": round(total * 1000 / calls, 3) if calls else None, "max_ms": round(longest * 1000, 3)}
+
+        with self.lock:
+            queries = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "duration_s": round(time.time() - self.started, 3),
+                "slow_query_ms": self.slow_query_ms,
+                "timers": {name: summary(entry) for name, entry in sorted(self.timers.items())},
+                "queries": [dict(sql=sql, **summary(entry)) for sql, entry in queries],
+                # Statements seen by SQLite's trace hook, trigger programs
+                # included; useful next to "queries" for spotting work that
+                # bypasses the timed cursor.
+                "traced_statements": dict(sorted(self.traced.items(), key=lambda item: item[1], reverse=True)),
+            }
+
+    def dump(self):
+        try:
+            with open(self.metrics_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2)
+        except OSError:
+            pass
+
+
+def normalize(sql):
+    return PLACEHOLDER_LIST.sub("(?, ...)", WHITESPACE.sub(" ", sql).strip())
+
+
+def enabled():
+    return _metrics is not None
+
+
+def enable(slow_query_ms=None, metrics_path=None, slow_log_path=None):
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms,
+                           metrics_path or METRICS_PATH, slow_log_path or SLOW_LOG_PATH)
+        atexit.register(_metrics.dump)
+    return _metrics
+
+
+def record_query(sql, seconds, phase="execute", parameters=None, calls=1):
+    _metrics.add(_metrics.queries, normalize(sql), seconds, calls)
+    if seconds * 1000 >= _metrics.slow_query_ms:
+        _metrics.log_slow(sql, seconds, phase, parameters)
+
+
+def trace_statement(statement):
+    _metrics.count(_metrics.traced, normalize(LITERAL.sub("?", statement)))
+
+
+def timed(name):
+    # Wrapped calls cost one global lookup while instrumentation is off.
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _metrics is None:
+                return func(*args, **kwargs)
+            began = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _metrics.add(_metrics.timers, name, time.perf_counter() - began)
+        return wrapper
+    return decorate
+
+
+def record_time(name, seconds):
+    _metrics.add(_metrics.timers, name, seconds)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    sql = ""
+
+    def execute(self, sql, parameters=()):
+        self.sql = sql
+        began = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - began, "execute", parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.sql = sql
+        began = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - began, "executemany")
+
+    # Fetch time is added to the statement's total without counting
+    # another call.
+    def fetchone(self):
+        began = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_query(self.sql, time.perf_counter() - began, "fetchone", calls=0)
+
+    def fetchmany(self, size=None):
+        began = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            record_query(self.sql, time.perf_counter() - began, "fetchmany", calls=0)
+
+    def fetchall(self):
+        began = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_query(self.sql, time.perf_counter() - began, "fetchall", calls=0)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        began = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            record_query("COMMIT", time.perf_counter() - began, "commit")
+
+    def rollback(self):
+        began = time.perf_counter()
+        try:
+            super().rollback()
+        finally:
+            record_query("ROLLBACK", time.perf_counter() - began, "rollback")
+
+
+def connection_factory():
+    return sqlite3.Connection if _metrics is None else ProfiledConnection
+
+
+def attach(conn):
+    if _metrics is not None:
+        conn.set_trace_callback(trace_statement)
+    return conn
+
+
+if os.environ.get(ENV_FLAG, "") not in ("", "0"):
+    enable()
@@ -1,27 +1,92 @@
 import glob
+import marshal
+import os
+
+# language -> (mtime_ns, size, catalog)
+_catalogs = {}
+
 
 class I18N:
-    def __init__(self, language, load_from_file=True):
-        self.language = language
-        self.load_from_file = load_from_file
-        self.load_translation()
-
-    def load_translation(self):
-            self.load_data_from_file()
-
-    def load_data_from_file(self):
-        lang_data = {}
-        lang_file = f"data_{self.language.lower()}.lang"
-        with open(file=lang_file, encoding="utf-8") as f:
-            for line in f:
-                key, val = line.strip().split("=")
-                lang_data[key] = val
+    __slots__ = ("language",)
+
+    # Catalogs are shared per language: I18N("en") returns the same
+    # fixed-attribute instance until data_en.lang changes on disk.
+    def __new__(cls, language, load_from_file=True):
+        return load_catalog(language)
 
-        for key, val in lang_data.items():
-            setattr(self, key, val)
+    def __init__(self, language, load_from_file=True):
+        pass
 
     @staticmethod
     def get_available_languages():
         language_files = glob.glob("data_*.lang")
         language_codes = [f.replace("data_", "").replace(".lang", "") for f in language_files]
         return language_codes
+
+
+def lang_file(language):
+    return f"data_{language.lower()}.lang"
+
+
+def parse_lang_file(path):
+    lang_data = {}
+    with open(file=path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, val = line.split("=", 1)
+            key = key.strip()
+            if key.isidentifier() and key != "language":
+                lang_data[key] = val
+    return lang_data
+
+
+def read_compiled(path, stat):
+    try:
+        with open(path, "rb") as f:
+            compiled = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if compiled.get("mtime_ns") != stat.st_mtime_ns or compiled.get("size") != stat.st_size:
+        return None
+    return compiled["data"]
+
+
+def write_compiled(path, stat, lang_data):
+    try:
+        with open(path, "wb") as f:
+            marshal.dump({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "data": lang_data}, f)
+    except OSError:
+        pass
+
+
+def build_catalog(language, lang_data):
+    catalog_class = type(f"I18N_{language}", (I18N,), {"__slots__": tuple(lang_data)})
+    catalog = object.__new__(catalog_class)
+    catalog.language = language
+    for key, val in lang_data.items():
+        setattr(catalog, key, val)
+    return catalog
+
+
+def load_catalog(language):
+    path = lang_file(language)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise NotImplementedError(f"Language '{language}' is not available.")
+
+    cached = _catalogs.get(language)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    compiled_path = path + "c"
+    lang_data = read_compiled(compiled_path, stat)
+    if lang_data is None:
+        lang_data = parse_lang_file(path)
+        write_compiled(compiled_path, stat, lang_data)
+
+    catalog = build_catalog(language, lang_data)
+    _catalogs[language] = (stat.st_mtime_ns, stat.st_size, catalog)
+    return catalog
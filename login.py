@@ -1,10 +1,28 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from mainwindow import MainWindow
 from lang import I18N
-import sqlite3
+import assets
+import instrumentation
+import database
+from executor import WindowJobs, get_executor
+
+
+def is_registered(conn, username, password):
+    query = "SELECT 1 FROM users WHERE username=? AND password=?"
+    return database.fetch_one(conn, query, (username, password)) is not None
+
+
+def register_user(conn, fullname, username, password, contact_number):
+    if database.fetch_one(conn, "SELECT 1 FROM users WHERE username=?", (username,)) is not None:
+        return False
+
+    query = "INSERT INTO users (fullname, username, password, contact) VALUES (?, ?, ?, ?)"
+    database.execute(conn, query, (fullname, username, password, contact_number))
+    return True
+
 
 class LoginWindow:
+    @instrumentation.timed("window.LoginWindow")
     def __init__(self, language="en"):
         self.i18n = I18N(language)
         self.win = tk.Tk()
@@ -12,33 +30,21 @@ class LoginWindow:
         self.win.geometry("800x800+310+0")
         self.win.title(self.window_title)
 
-        self.background_image = tk.PhotoImage(file="libsys1.gif")
+        self.background_image = assets.background(800, 800)
         background_label = tk.Label(self.win, image=self.background_image)
         background_label.place(relwidth=1, relheight=1)
 
         login_frame = ttk.Frame(self.win, borderwidth=3, relief="ridge")
         login_frame.place(relx=0.5, rely=0.5, anchor="center")
 
-        self.open_connection()
-        self.create_table()
+        self.jobs = WindowJobs(self.win, on_error=self.show_database_error)
         self.create_widgets(login_frame)
 
-    def open_connection(self):
-        self.conn = sqlite3.connect("library.db")
-        self.cur = self.conn.cursor()
-
-    def create_table(self):
-        query = """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fullname TEXT NOT NULL,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            contact TEXT
-        )
-        """
-        self.cur.execute(query)
-        self.conn.commit()
+        # Open the database and run migrations once the login screen has painted.
+        self.win.after_idle(get_executor)
+
+    def show_database_error(self, e):
+        messagebox.showerror(self.i18n.error, f"{self.i18n.database_error}: {str(e)}")
 
     def create_widgets(self, frame):
         text_color = "antique white"
@@ -76,27 +82,25 @@ class LoginWindow:
         username = self.username_entry.get()
         password = self.password_entry.get()
 
-        if self.is_registered(username, password):
-            self.open_main_window()
-            messagebox.showinfo(self.i18n.login_successful, f"{self.i18n.welcome}, {username}!")
-            self.win.destroy()
-        else:
-            messagebox.showerror(self.i18n.login_failed, self.i18n.invalid_credentials)
+        def checked(registered):
+            if registered:
+                self.open_main_window()
+                messagebox.showinfo(self.i18n.login_successful, f"{self.i18n.welcome}, {username}!", parent=self.main_window)
+            else:
+                messagebox.showerror(self.i18n.login_failed, self.i18n.invalid_credentials)
 
-    def is_registered(self, username, password):
-        query = "SELECT * FROM users WHERE username=? AND password=?"
-        result = self.conn.execute(query, (username, password)).fetchone()
-        return result is not None
+        self.jobs.submit(is_registered, username, password, callback=checked)
 
     def show_register_window(self):
-        register_window = RegisterWindow(self.win, self.conn, self.i18n)
+        register_window = RegisterWindow(self.win, self.jobs, self.i18n)
         self.win.wait_window(register_window.top)
 
     def open_main_window(self):
+        # The root stays, withdrawn, so the main window and the management
+        # windows run under the one mainloop started below.
+        from mainwindow import MainWindow
         self.win.withdraw()
         self.main_window = MainWindow(parent=self, language=self.i18n.language)
-        self.main_window.grab_set()
-        self.main_window.mainloop()
 
     def change_language(self, selected_language):
         try:
@@ -118,12 +122,12 @@ class LoginWindow:
 
 
 class RegisterWindow:
-    def __init__(self, parent, conn, i18n):
+    def __init__(self, parent, jobs, i18n):
         self.top = tk.Toplevel(parent)
         self.top.title(i18n.register)
         self.top.geometry("360x305+550+250")
 
-        self.conn = conn
+        self.jobs = jobs
         self.i18n = i18n
         self.create_widgets()
 
@@ -167,19 +171,25 @@ class RegisterWindow:
         contact_number = self.contact_entry.get()
 
 
-        if self.is_username_taken(new_username):
-            messagebox.showerror(self.i18n.registration_failed, self.i18n.username_taken)
-        else:
-            query = "INSERT INTO users (fullname, username, password, contact) VALUES (?, ?, ?, ?)"
-            self.conn.execute(query, (fullname, new_username, new_password, contact_number))
-            self.conn.commit()
+        def registered(success):
+            if not success:
+                messagebox.showerror(self.i18n.registration_failed, self.i18n.username_taken)
+                return
+
             messagebox.showinfo(self.i18n.registration_successful, self.i18n.user_registered)
             self.top.destroy()
 
-    def is_username_taken(self, username):
-        query = "SELECT * FROM users WHERE username=?"
-        result = self.conn.execute(query, (username,)).fetchone()
-        return result is not None
+        self.jobs.submit(register_user, fullname, new_username, new_password, contact_number, callback=registered)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Library management system")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"time queries and windows; also enabled by {instrumentation.ENV_FLAG}=1")
+    parser.add_argument("--slow-query-ms", type=float, help="slow-query log threshold (implies --profile)")
+    args = parser.parse_args()
+    if args.profile or args.slow_query_ms is not None:
+        instrumentation.enable(slow_query_ms=args.slow_query_ms)
 
-app = LoginWindow()
-app.win.mainloop()
+    app = LoginWindow()
+    app.win.mainloop()
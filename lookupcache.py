@@ -0,0 +1,208 @@
+from changelog import latest_change, table_changed
+
+CAPACITY = 4096
+
+MISSING = object()
+NO_SLOT = -1
+
+# id(conn) -> LookupCache. The cache holds its connection, so the id
+# cannot be reused by another one while it exists; release() drops both.
+_caches = {}
+
+
+class LRUCache:
+    # Entries live in fixed slots of parallel lists, chained newest to
+    # oldest by slot number, so an entry costs a dict item and a few list
+    # cells rather than a node object.
+    __slots__ = ("capacity", "index", "keys", "values", "newer", "older", "newest", "oldest", "used",
+                 "hits", "misses", "evictions")
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.keys = [None] * capacity
+        self.values = [None] * capacity
+        self.newer = [NO_SLOT] * capacity
+        self.older = [NO_SLOT] * capacity
+        self.clear()
+
+    def clear(self):
+        # Slots below `used` have been handed out; clearing only forgets
+        # them, which keeps invalidation cheap on every write.
+        self.index = {}
+        self.newest = NO_SLOT
+        self.oldest = NO_SLOT
+        self.used = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def unlink(self, slot):
+        newer, older = self.newer[slot], self.older[slot]
+        if newer == NO_SLOT:
+            self.newest = older
+        else:
+            self.older[newer] = older
+        if older == NO_SLOT:
+            self.oldest = newer
+        else:
+            self.newer[older] = newer
+
+    def push(self, slot):
+        self.newer[slot] = NO_SLOT
+        self.older[slot] = self.newest
+        if self.newest == NO_SLOT:
+            self.oldest = slot
+        else:
+            self.newer[self.newest] = slot
+        self.newest = slot
+
+    def get(self, key, default=MISSING):
+        slot = self.index.get(key, NO_SLOT)
+        if slot == NO_SLOT:
+            self.misses += 1
+            return default
+        self.hits += 1
+        if slot != self.newest:
+            self.unlink(slot)
+            self.push(slot)
+        return self.values[slot]
+
+    def put(self, key, value):
+        slot = self.index.get(key, NO_SLOT)
+        if slot != NO_SLOT:
+            self.unlink(slot)
+        elif self.used < self.capacity:
+            slot = self.used
+            self.used += 1
+        else:
+            slot = self.oldest
+            self.unlink(slot)
+            del self.index[self.keys[slot]]
+            self.evictions += 1
+        self.index[key] = slot
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.push(slot)
+
+    def stats(self):
+        return {"size": len(self.index), "capacity": self.capacity, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+# Past this many log entries since the last check every table is emptied
+# rather than searched for changes to the table it caches.
+RESCAN_LIMIT = 500
+
+
+class LookupCache:
+    # Read-through cache of borrower name -> borrower id for one
+    # connection. PRAGMA data_version moves when another connection commits
+    # and total_changes when this one writes; only then is change_log read,
+    # and a table is emptied only if the table it caches was logged since,
+    # so lending and returning books leave the borrowers cached.
+    #
+    # Reading data_version opens a read transaction, which costs about as
+    # much as the lookup itself. Inside a write transaction nobody else can
+    # commit, so there it is read once and only total_changes is compared
+    # after that.
+    def __init__(self, conn, capacity=CAPACITY):
+        self.conn = conn
+        # A cursor of its own saves allocating one for every check.
+        self.version_cursor = conn.cursor()
+        self.borrower_ids = LRUCache(capacity)
+        # Cache table -> the table its values are read from.
+        self.sources = {"borrower_ids": "borrowers"}
+        self.version = None
+        self.seq = None
+        self.writing = False
+        self.checked = False
+        self.invalidations = 0
+
+    def tables(self):
+        return {"borrower_ids": self.borrower_ids}
+
+    def invalidate(self):
+        if self.version is not None:
+            self.invalidations += 1
+        self.version = None
+        self.seq = None
+        for table in self.tables().values():
+            if len(table):
+                table.clear()
+
+    def catch_up(self):
+        # Empties the tables whose source changed since the last check. A
+        # log that went back was restored from a backup, which can change
+        # any row without a newer entry, so everything goes.
+        seq = latest_change(self.version_cursor)
+        if self.seq is None or seq < self.seq or seq - self.seq > RESCAN_LIMIT:
+            self.invalidate()
+        elif seq != self.seq:
+            for name, table in self.tables().items():
+                if len(table) and table_changed(self.version_cursor, self.seq, seq, self.sources[name]):
+                    self.invalidations += 1
+                    table.clear()
+        self.seq = seq
+
+    def lookup(self, table, key, load):
+        if self.writing and self.checked:
+            data_version = self.version[0] if self.version else None
+        else:
+            data_version = self.version_cursor.execute("PRAGMA data_version;").fetchone()[0]
+            self.checked = self.writing
+        version = (data_version, self.conn.total_changes)
+        if version != self.version:
+            self.catch_up()
+            self.version = version
+        value = table.get(key)
+        if value is MISSING:
+            value = load(self.conn, key)
+            table.put(key, value)
+        return value
+
+    def stats(self):
+        stats = {name: table.stats() for name, table in self.tables().items()}
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+def cache_for(conn):
+    cache = _caches.get(id(conn))
+    if cache is None:
+        cache = _caches[id(conn)] = LookupCache(conn)
+    return cache
+
+
+def begin_write(conn):
+    cache = _caches.get(id(conn))
+    if cache is not None:
+        cache.writing = True
+        cache.checked = False
+
+
+def end_write(conn, rolled_back=False):
+    cache = _caches.get(id(conn))
+    if cache is not None:
+        cache.writing = False
+        if rolled_back:
+            cache.invalidate()
+
+
+def invalidate(conn):
+    # For rollbacks, which move neither counter: values read after a write
+    # that was then rolled back would otherwise stay cached.
+    cache = _caches.get(id(conn))
+    if cache is not None:
+        cache.invalidate()
+
+
+def release(conn):
+    _caches.pop(id(conn), None)
+
+
+def stats(conn):
+    cache = _caches.get(id(conn))
+    return cache.stats() if cache is not None else None
@@ -1,25 +1,29 @@
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
-from bookmanagement import BookManagement
-from borrowermanagement import BorrowerManagement
-from transaction import Transaction
 from lang import I18N
+import assets
+import instrumentation
+import stats
+import overdue
+import backup
+import autocomplete
+from executor import WindowJobs
+from windows import WindowManager
+
+STATS_REFRESH_MS = 5000
 
 class MainWindow(tk.Toplevel):
+    @instrumentation.timed("window.MainWindow")
     def __init__(self, parent, language):
         super().__init__()
         self.win = parent
         self.i18n = I18N(language)
         self.title(self.i18n.main_window_title)
         self.geometry("800x800+310+0")
+        self.protocol("WM_DELETE_WINDOW", self.close_window)
 
-        background_image = Image.open("libsys1.gif")
-        background_photo = ImageTk.PhotoImage(background_image)
-
-        background_label = tk.Label(self, image=background_photo)
+        background_label = tk.Label(self, image=assets.background(800, 800))
         background_label.place(relwidth=1, relheight=1)
-        background_label.image = background_photo
 
         button_frame = ttk.Frame(self, style="Menu.TFrame")
         button_frame.place(relx=0.5, rely=0.5, anchor="center")
@@ -45,16 +49,59 @@ class MainWindow(tk.Toplevel):
         self.transaction_button.grid(row=3, column=0, pady=10, padx=20, sticky="ew")
         self.exit_button.grid(row=4, column=0, pady=10, padx=20, sticky="ew")
 
-        self.mainloop()
+        self.jobs = WindowJobs(self)
+        self.windows = WindowManager(self, self.i18n.language)
+        overdue.get_scanner()
+        backup.get_scheduler()
+        autocomplete.get_indexes()
+        self.create_stats_panel()
+        self.refresh_stats()
+
+    def create_stats_panel(self):
+        stats_frame = ttk.Frame(self, style="Menu.TFrame")
+        stats_frame.place(relx=0.5, rely=0.88, anchor="center")
+
+        label_options = {"foreground": "#FAEBD7", "background": "#2E4053", "font": ("Helvetica", 11)}
+        tk.Label(stats_frame, text=self.i18n.statistics, font=("Helvetica", 14, "bold"), foreground="#FAEBD7", background="#2E4053").grid(row=0, column=0, columnspan=2, pady=5)
+
+        self.stats_labels = {}
+        for row, key in enumerate(("books_on_loan", "books_available", "active_borrowers"), start=1):
+            tk.Label(stats_frame, text=getattr(self.i18n, key) + ":", **label_options).grid(row=row, column=0, padx=10, sticky="w")
+            self.stats_labels[key] = tk.Label(stats_frame, text="-", **label_options)
+            self.stats_labels[key].grid(row=row, column=1, padx=10, sticky="e")
+
+        tk.Label(stats_frame, text=self.i18n.top_titles + ":", **label_options).grid(row=4, column=0, padx=10, sticky="nw")
+        self.top_titles_label = tk.Label(stats_frame, text="-", justify="left", **label_options)
+        self.top_titles_label.grid(row=4, column=1, padx=10, pady=(0, 5), sticky="w")
+
+    def refresh_stats(self):
+        self.jobs.submit(stats.read_stats, callback=self.show_stats)
+        self.stats_timer = self.after(STATS_REFRESH_MS, self.refresh_stats)
+
+    def show_stats(self, values):
+        for key, label in self.stats_labels.items():
+            label.config(text=str(values[key]))
+        self.top_titles_label.config(text="\n".join(f"{title} ({loans})" for title, loans in values["top_titles"]) or "-")
 
+    # The management windows pull in the import, search and circulation
+    # modules, so they are only imported when first opened. Each is built
+    # once; later clicks show the same window again.
     def open_book_management(self):
-        book_management_window = BookManagement(self.win, language=self.i18n.language)
+        from bookmanagement import BookManagement
+        self.windows.show(BookManagement)
 
     def open_borrower_management(self):
-        borrower_management_window = BorrowerManagement(self.win, language=self.i18n.language)
+        from borrowermanagement import BorrowerManagement
+        self.windows.show(BorrowerManagement)
 
     def open_transaction(self):
-        transaction = Transaction(self, language=self.i18n.language)
+        from transaction import Transaction
+        self.windows.show(Transaction)
 
     def close_window(self):
-        self.destroy()
+        self.after_cancel(self.stats_timer)
+        self.jobs.cancel_all()
+        self.windows.close_all()
+        # The login window's root is withdrawn behind this one; destroying
+        # it ends the application's mainloop.
+        self.master.destroy()
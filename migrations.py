@@ -0,0 +1,485 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+
+def create_base_tables(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fullname TEXT NOT NULL,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        contact TEXT
+    );
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS books (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        author TEXT,
+        publication_year INTEGER,
+        is_borrowed INTEGER DEFAULT 0
+    );
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS borrowers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        surname TEXT,
+        contact_number TEXT
+    );
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER,
+        borrower_id INTEGER,
+        borrow_date DATE,
+        return_date DATE,
+        FOREIGN KEY (book_id) REFERENCES books (id),
+        FOREIGN KEY (borrower_id) REFERENCES borrowers (id)
+    );
+    ''')
+
+
+def add_lookup_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_title ON books (title);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrowers_name_surname ON borrowers (name, surname);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_open_loans ON transactions (book_id) WHERE return_date IS NULL;")
+
+
+def add_book_search_index(conn):
+    tables = [("books_fts", "")]
+    if sqlite3.sqlite_version_info >= (3, 34, 0):
+        tables.append(("books_trigram", ", tokenize='trigram'"))
+
+    for table, options in tables:
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(title, author, content='books', content_rowid='id'{options});")
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON books BEGIN
+            INSERT INTO {table} (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END;
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON books BEGIN
+            INSERT INTO {table} ({table}, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        END;
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO {table} ({table}, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO {table} (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END;
+        """)
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild');")
+
+
+def add_loan_archive(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_open_by_id ON transactions (id) WHERE return_date IS NULL;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_closed ON transactions (return_date) WHERE return_date IS NOT NULL;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_borrow_date ON transactions (borrow_date);")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS transactions_archive (
+        id INTEGER PRIMARY KEY,
+        book_id INTEGER,
+        borrower_id INTEGER,
+        borrow_date DATE,
+        return_date DATE
+    );
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_archive_borrow_date ON transactions_archive (borrow_date);")
+    conn.execute('''
+    CREATE VIEW IF NOT EXISTS transaction_history AS
+    SELECT id, book_id, borrower_id, borrow_date, return_date FROM transactions WHERE return_date IS NOT NULL
+    UNION ALL
+    SELECT id, book_id, borrower_id, borrow_date, return_date FROM transactions_archive;
+    ''')
+
+
+def add_circulation_summaries(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_book ON transactions (book_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_archive_book ON transactions_archive (book_id);")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS circulation_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        books_total INTEGER NOT NULL,
+        books_on_loan INTEGER NOT NULL,
+        active_borrowers INTEGER NOT NULL
+    );
+    ''')
+    conn.execute("CREATE TABLE IF NOT EXISTS borrower_open_loans (borrower_id INTEGER PRIMARY KEY, open_loans INTEGER NOT NULL);")
+    conn.execute("CREATE TABLE IF NOT EXISTS title_loan_counts (title TEXT PRIMARY KEY, loans INTEGER NOT NULL);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_title_loan_counts_loans ON title_loan_counts (loans);")
+
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS stats_book_insert AFTER INSERT ON books BEGIN
+        UPDATE circulation_stats SET books_total = books_total + 1, books_on_loan = books_on_loan + coalesce(new.is_borrowed, 0);
+    END;
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS stats_book_delete AFTER DELETE ON books BEGIN
+        UPDATE circulation_stats SET books_total = books_total - 1, books_on_loan = books_on_loan - coalesce(old.is_borrowed, 0);
+        UPDATE title_loan_counts SET loans = loans
+            - (SELECT count(*) FROM transactions WHERE book_id = old.id)
+            - (SELECT count(*) FROM transactions_archive WHERE book_id = old.id)
+        WHERE title = old.title;
+    END;
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS stats_book_borrowed AFTER UPDATE OF is_borrowed ON books BEGIN
+        UPDATE circulation_stats SET books_on_loan = books_on_loan + coalesce(new.is_borrowed, 0) - coalesce(old.is_borrowed, 0);
+    END;
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS stats_book_renamed AFTER UPDATE OF title ON books WHEN old.title IS NOT new.title BEGIN
+        UPDATE title_loan_counts SET loans = loans
+            - (SELECT count(*) FROM transactions WHERE book_id = old.id)
+            - (SELECT count(*) FROM transactions_archive WHERE book_id = old.id)
+        WHERE title = old.title;
+        INSERT INTO title_loan_counts (title, loans)
+        SELECT new.title, (SELECT count(*) FROM transactions WHERE book_id = new.id)
+                        + (SELECT count(*) FROM transactions_archive WHERE book_id = new.id)
+        WHERE new.title IS NOT NULL
+        ON CONFLICT (title) DO UPDATE SET loans = loans + excluded.loans;
+    END;
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS stats_loan_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO title_loan_counts (title, loans)
+        SELECT title, 1 FROM books WHERE id = new.book_id AND title IS NOT NULL
+        ON CONFLICT (title) DO UPDATE SET loans = loans + 1;
+    END;
+    ''')
+
+    # Open-loan bookkeeping: a borrower becomes active on their first open
+    # loan and inactive when the last one is returned or removed.
+    for name, event, condition, delta, borrower in (
+            ("stats_loan_opened", "INSERT", "new.return_date IS NULL", 1, "new.borrower_id"),
+            ("stats_loan_reopened", "UPDATE OF return_date", "old.return_date IS NOT NULL AND new.return_date IS NULL", 1, "new.borrower_id"),
+            ("stats_loan_closed", "UPDATE OF return_date", "old.return_date IS NULL AND new.return_date IS NOT NULL", -1, "old.borrower_id"),
+            ("stats_loan_deleted", "DELETE", "old.return_date IS NULL", -1, "old.borrower_id")):
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON transactions WHEN {condition} BEGIN
+            INSERT INTO borrower_open_loans (borrower_id, open_loans) VALUES ({borrower}, {delta})
+            ON CONFLICT (borrower_id) DO UPDATE SET open_loans = open_loans + {delta};
+            UPDATE circulation_stats SET active_borrowers = active_borrowers + {delta}
+            WHERE (SELECT open_loans FROM borrower_open_loans WHERE borrower_id = {borrower}) = {1 if delta > 0 else 0};
+            DELETE FROM borrower_open_loans WHERE borrower_id = {borrower} AND open_loans = 0;
+        END;
+        ''')
+
+    # Backfill from the base tables as they stand. Migrations are frozen,
+    # so this is spelled out rather than borrowed from stats.
+    conn.execute('''
+    INSERT OR REPLACE INTO circulation_stats (id, books_total, books_on_loan, active_borrowers)
+    SELECT 1, (SELECT count(*) FROM books), (SELECT coalesce(sum(is_borrowed), 0) FROM books),
+           (SELECT count(DISTINCT borrower_id) FROM transactions WHERE return_date IS NULL);
+    ''')
+    conn.execute('''
+    INSERT INTO borrower_open_loans (borrower_id, open_loans)
+    SELECT borrower_id, count(*) FROM transactions WHERE return_date IS NULL GROUP BY borrower_id;
+    ''')
+    conn.execute('''
+    INSERT INTO title_loan_counts (title, loans)
+    SELECT books.title, count(*)
+    FROM (SELECT book_id FROM transactions UNION ALL SELECT book_id FROM transactions_archive) AS loans
+    JOIN books ON books.id = loans.book_id
+    WHERE books.title IS NOT NULL
+    GROUP BY books.title;
+    ''')
+
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d.%m.%Y", "%d/%m/%Y", "%Y%m%d")
+
+
+def parse_loose_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def add_due_dates(conn):
+    # Existing loans are given the loan period configured when this runs.
+    loan_period = timedelta(days=int(os.environ.get("LIBRARY_LOAN_DAYS", "14")))
+
+    conn.execute("ALTER TABLE transactions ADD COLUMN due_date INTEGER;")
+    conn.execute("ALTER TABLE transactions_archive ADD COLUMN due_date INTEGER;")
+    conn.execute("DROP VIEW IF EXISTS transaction_history;")
+    conn.execute('''
+    CREATE VIEW transaction_history AS
+    SELECT id, book_id, borrower_id, borrow_date, return_date, due_date FROM transactions WHERE return_date IS NOT NULL
+    UNION ALL
+    SELECT id, book_id, borrower_id, borrow_date, return_date, due_date FROM transactions_archive;
+    ''')
+
+    # Dates typed into the borrow dialog were stored as entered; rewrite
+    # them as zero-padded ISO dates so they sort and compare as text.
+    for table in ("transactions", "transactions_archive"):
+        rows = conn.execute(f"SELECT id, borrow_date, return_date FROM {table};")
+        updates = []
+        for transaction_id, borrow_date, return_date in rows:
+            borrow_day = parse_loose_date(borrow_date) if borrow_date is not None else None
+            return_day = parse_loose_date(return_date) if return_date is not None else None
+            updates.append((
+                borrow_day.isoformat() if borrow_day else borrow_date,
+                return_day.isoformat() if return_day else return_date,
+                (borrow_day + loan_period).toordinal() if borrow_day else None,
+                transaction_id))
+            if len(updates) >= 10000:
+                conn.executemany(f"UPDATE {table} SET borrow_date = ?, return_date = ?, due_date = ? WHERE id = ?;", updates)
+                updates = []
+        conn.executemany(f"UPDATE {table} SET borrow_date = ?, return_date = ?, due_date = ? WHERE id = ?;", updates)
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_due ON transactions (due_date, id) WHERE return_date IS NULL;")
+
+
+def add_sort_indexes(conn):
+    # Sortable columns are ordered by ifnull(column, default) so keyset
+    # paging never meets a NULL key; these expression indexes serve those
+    # ORDER BYs and the column filters. Each also ends in the rowid, which
+    # is the tiebreak.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_title_sort ON books (ifnull(title, ''));")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_author_sort ON books (ifnull(author, ''));")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_year_sort ON books (ifnull(publication_year, 0));")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrowers_name_sort ON borrowers (ifnull(name, ''));")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrowers_surname_sort ON borrowers (ifnull(surname, ''));")
+
+    # The plain borrow_date and due_date indexes are replaced by their
+    # expression forms, which also serve the history date filter and the
+    # overdue scan.
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_borrow_date;")
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_archive_borrow_date;")
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_due;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_borrow_date_sort ON transactions (ifnull(borrow_date, ''));")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_archive_borrow_date_sort ON transactions_archive (ifnull(borrow_date, ''));")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_open_due ON transactions (ifnull(due_date, 0)) WHERE return_date IS NULL;")
+    # Open loans are the newest few; walking the full borrow_date index
+    # to reach them would pass every returned loan first.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_open_borrow_date ON transactions (ifnull(borrow_date, '')) WHERE return_date IS NULL;")
+
+
+def add_change_log(conn):
+    # Rows made at another branch carry that branch's uid; a branch's own
+    # rows leave it NULL and are known elsewhere as "<node_id>:<id>".
+    for table in ("books", "borrowers", "transactions", "transactions_archive"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN uid TEXT;")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table} (uid) WHERE uid IS NOT NULL;")
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sync_node (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        node_id TEXT NOT NULL,
+        clock INTEGER NOT NULL,
+        applying INTEGER NOT NULL DEFAULT 0
+    );
+    ''')
+    conn.execute("INSERT OR IGNORE INTO sync_node (id, node_id, clock) VALUES (1, lower(hex(randomblob(4))), 0);")
+    # One entry per changed row, moved to a new seq on every change, so the
+    # log grows with the rows that changed rather than with each edit.
+    # (clock, node) is the row's version; row_id is NULL only for the
+    # tombstone of a row this branch never had.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER,
+        row_uid TEXT,
+        clock INTEGER NOT NULL,
+        node TEXT NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (table_name, row_id)
+    );
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_change_log_uid ON change_log (row_uid) WHERE row_uid IS NOT NULL;")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sync_peers (
+        node_id TEXT PRIMARY KEY,
+        received_seq INTEGER NOT NULL DEFAULT 0,
+        acked_seq INTEGER NOT NULL DEFAULT 0,
+        synced_at TEXT
+    );
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sync_conflicts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        book_id INTEGER,
+        kept_uid TEXT,
+        closed_uid TEXT,
+        detected_at TEXT
+    );
+    ''')
+
+    # Changes applied from another branch set sync_node.applying and write
+    # their own log entries with the remote version. is_borrowed is not
+    # logged: every branch derives it from the open loans.
+    for table, columns in (("books", "title, author, publication_year"),
+                           ("borrowers", "name, surname, contact_number"),
+                           ("transactions", "book_id, borrower_id, borrow_date, return_date, due_date")):
+        for event, row, deleted, condition in (
+                ("INSERT", "new", 0, ""),
+                (f"UPDATE OF {columns}", "new", 0, ""),
+                # Archiving moves a loan out of transactions; that is not a
+                # deletion to replicate.
+                ("DELETE", "old", 1, " AND NOT EXISTS (SELECT 1 FROM transactions_archive WHERE id = old.id)"
+                 if table == "transactions" else "")):
+            name = f"change_log_{table}_{event.split()[0].lower()}"
+            conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+            WHEN (SELECT applying FROM sync_node) = 0{condition} BEGIN
+                UPDATE sync_node SET clock = clock + 1;
+                INSERT OR REPLACE INTO change_log (table_name, row_id, row_uid, clock, node, deleted)
+                SELECT '{table}', {row}.id, {row}.uid, clock, node_id, {deleted} FROM sync_node;
+            END;
+            ''')
+
+
+def serve_hold(book, title, condition="1"):
+    # Reserves the copy for the longest-waiting hold on its title, if any.
+    return f"""
+        UPDATE holds SET book_id = {book}, ready_at = datetime('now', 'localtime')
+        WHERE {condition} AND id = (SELECT holds.id FROM holds JOIN titles ON titles.id = holds.title_id
+                                    WHERE titles.title = {title} AND holds.book_id IS NULL ORDER BY holds.id LIMIT 1);"""
+
+
+def add_titles_and_holds(conn):
+    # A books row stays one physical copy; titles groups the copies by
+    # title and keeps count of them. available leaves out copies that are
+    # lent and copies waiting on the hold shelf, so "is a copy free?" is
+    # one keyed read.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS titles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL UNIQUE,
+        copies INTEGER NOT NULL DEFAULT 0,
+        available INTEGER NOT NULL DEFAULT 0
+    );
+    ''')
+    # A hold waits while book_id is NULL and is ready once a copy has been
+    # set aside for it. Holds are served in id order, and are local to a
+    # branch: they are not replicated.
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS holds (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title_id INTEGER NOT NULL,
+        borrower_id INTEGER NOT NULL,
+        placed_at TEXT NOT NULL,
+        book_id INTEGER,
+        ready_at TEXT,
+        FOREIGN KEY (title_id) REFERENCES titles (id),
+        FOREIGN KEY (borrower_id) REFERENCES borrowers (id),
+        FOREIGN KEY (book_id) REFERENCES books (id)
+    );
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_holds_queue ON holds (title_id, id) WHERE book_id IS NULL;")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_book ON holds (book_id) WHERE book_id IS NOT NULL;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_holds_borrower ON holds (borrower_id);")
+    # Picking a free copy of a title reads only the copies on the shelf.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_books_shelf ON books (title) WHERE is_borrowed = 0;")
+
+    on_shelf = "(coalesce({row}.is_borrowed, 0) = 0)"
+    drop_empty_title = """
+        DELETE FROM titles WHERE title = old.title AND copies = 0
+          AND NOT EXISTS (SELECT 1 FROM holds WHERE holds.title_id = titles.id);"""
+    add_copy = f"""
+        INSERT INTO titles (title, copies, available) SELECT new.title, 1, {on_shelf.format(row="new")} WHERE new.title IS NOT NULL
+        ON CONFLICT (title) DO UPDATE SET copies = copies + 1, available = available + excluded.available;"""
+    # A copy that leaves its title (deleted, renamed or lent) gives up its
+    # place on the hold shelf; the hold goes back to the head of the queue.
+    release_copy = "UPDATE holds SET book_id = NULL, ready_at = NULL WHERE book_id = {row}.id;"
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS titles_book_insert AFTER INSERT ON books WHEN new.title IS NOT NULL BEGIN
+        {add_copy}
+        {serve_hold("new.id", "new.title", on_shelf.format(row="new"))}
+    END;
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS titles_book_delete AFTER DELETE ON books WHEN old.title IS NOT NULL BEGIN
+        {release_copy.format(row="old")}
+        UPDATE titles SET copies = copies - 1, available = available - {on_shelf.format(row="old")} WHERE title = old.title;
+        {drop_empty_title}
+    END;
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS titles_book_borrowed AFTER UPDATE OF is_borrowed ON books
+    WHEN new.title IS NOT NULL AND old.title IS new.title AND {on_shelf.format(row="old")} IS NOT {on_shelf.format(row="new")} BEGIN
+        {release_copy.format(row="new")}
+        UPDATE titles SET available = available + {on_shelf.format(row="new")} - {on_shelf.format(row="old")} WHERE title = new.title;
+        {serve_hold("new.id", "new.title", on_shelf.format(row="new"))}
+    END;
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS titles_book_renamed AFTER UPDATE OF title ON books WHEN old.title IS NOT new.title BEGIN
+        {release_copy.format(row="old")}
+        UPDATE titles SET copies = copies - 1, available = available - {on_shelf.format(row="old")} WHERE title = old.title;
+        {drop_empty_title}
+        {add_copy}
+        {serve_hold("new.id", "new.title", on_shelf.format(row="new"))}
+    END;
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS holds_ready AFTER UPDATE OF book_id ON holds WHEN old.book_id IS NOT new.book_id BEGIN
+        UPDATE titles SET available = available + (old.book_id IS NOT NULL) - (new.book_id IS NOT NULL) WHERE id = new.title_id;
+    END;
+    ''')
+    # A ready hold that is cancelled passes its copy to the next in line.
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS holds_removed AFTER DELETE ON holds WHEN old.book_id IS NOT NULL BEGIN
+        UPDATE titles SET available = available + 1 WHERE id = old.title_id;
+        {serve_hold("old.book_id", "(SELECT title FROM titles WHERE id = old.title_id)")}
+    END;
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS holds_borrower_delete AFTER DELETE ON borrowers BEGIN
+        DELETE FROM holds WHERE borrower_id = old.id;
+    END;
+    ''')
+
+    # Holds start out empty, so every copy on the shelf is available.
+    conn.execute('''
+    INSERT INTO titles (title, copies, available)
+    SELECT title, count(*), sum(coalesce(is_borrowed, 0) = 0) FROM books WHERE title IS NOT NULL GROUP BY title;
+    ''')
+
+
+def add_borrower_full_name_index(conn):
+    # Borrowers are suggested and typed as "name surname"; the desk looks
+    # that text up as it is, on the same expression.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_borrowers_full_name ON borrowers (trim(ifnull(name, '') || ' ' || ifnull(surname, '')));")
+
+
+# Applied in order; a database at user_version N has run the first N entries.
+MIGRATIONS = (
+    create_base_tables,
+    add_lookup_indexes,
+    add_book_search_index,
+    add_loan_archive,
+    add_circulation_summaries,
+    add_due_dates,
+    add_sort_indexes,
+    add_change_log,
+    add_titles_and_holds,
+    add_borrower_full_name_index,
+)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn):
+    version = schema_version(conn)
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN;")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
@@ -0,0 +1,97 @@
+import atexit
+import threading
+import time
+import circulation
+from executor import get_executor
+
+SCAN_INTERVAL_SECONDS = 15 * 60
+BATCH_SIZE = 1000
+
+OVERDUE_BATCH = f"""
+SELECT transactions.id, transactions.due_date, books.title, borrowers.name, date(transactions.due_date + {circulation.ORDINAL_TO_JULIAN})
+FROM transactions
+LEFT JOIN books ON transactions.book_id = books.id
+LEFT JOIN borrowers ON transactions.borrower_id = borrowers.id
+WHERE transactions.return_date IS NULL AND ifnull(transactions.due_date, 0) BETWEEN max(?, 1) AND ? - 1
+  AND (ifnull(transactions.due_date, 0), transactions.id) > (?, ?)
+ORDER BY ifnull(transactions.due_date, 0), transactions.id
+LIMIT ?;
+"""
+
+
+def overdue_batch(conn, today, after_key, batch_size=BATCH_SIZE):
+    return conn.execute(OVERDUE_BATCH, (after_key[0], today, *after_key, batch_size)).fetchall()
+
+
+class OverdueReport:
+    __slots__ = ("loans", "scanned_at", "today")
+
+    def __init__(self, loans, scanned_at, today):
+        self.loans = loans
+        self.scanned_at = scanned_at
+        self.today = today
+
+    @property
+    def count(self):
+        return len(self.loans)
+
+
+class OverdueScanner:
+    def __init__(self, interval=SCAN_INTERVAL_SECONDS, batch_size=BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.report = None
+        self.last_error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def scan(self):
+        # One executor job per batch, so desk queries interleave with a
+        # long scan instead of waiting behind it.
+        today = circulation.today_ordinal()
+        loans = []
+        after_key = (-1, -1)
+        while not self.stopped.is_set():
+            batch = get_executor().submit(overdue_batch, today, after_key, self.batch_size).result()
+            loans.extend((transaction_id, title, borrower, due) for transaction_id, due_date, title, borrower, due in batch)
+            if len(batch) < self.batch_size:
+                break
+            after_key = (batch[-1][1], batch[-1][0])
+        self.report = OverdueReport(loans, time.time(), today)
+        return self.report
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                # Keep the previous report; the next run retries.
+                self.last_error = e
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="overdue-scanner", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+
+_scanner = None
+
+
+def get_scanner():
+    global _scanner
+    if _scanner is None:
+        _scanner = OverdueScanner().start()
+    return _scanner
+
+
+def stop_scanner():
+    if _scanner is not None:
+        _scanner.stop()
+
+
+atexit.register(stop_scanner)
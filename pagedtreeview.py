@@ -0,0 +1,321 @@
+from tkinter import ttk
+import instrumentation
+
+SORT_ARROWS = {False: " \u25b2", True: " \u25bc"}
+
+
+def sqlite_order(value):
+    # Python-side twin of SQLite's cross-type ordering:
+    # NULL < numbers < text < blobs.
+    if value is None:
+        return 0, 0
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, str):
+        return 2, value
+    return 3, bytes(value)
+
+
+def prefix_range(expression, prefix):
+    # An index-friendly "starts with": a range instead of LIKE, which
+    # SQLite cannot run off a case-sensitive index.
+    return f"{expression} >= ? AND {expression} < ?", (prefix, prefix + "\U0010ffff")
+
+
+class KeysetQuery:
+    def __init__(self, columns, source, order_by=None, where="", parameters=(), descending=False):
+        self.columns = tuple(columns)
+        self.source = source
+        self.id_column = self.columns[0]
+        self.order_by = tuple(order_by or (self.id_column,))
+        self.where = where
+        self.parameters = tuple(parameters)
+        # Every ORDER BY column runs the same way, so one row-value
+        # comparison finds the next page in either direction. Sort
+        # expressions must not be NULL (wrap nullable columns in ifnull).
+        self.descending = descending
+
+    def build(self, conditions, order, limit=None):
+        if self.where:
+            conditions = [f"({self.where})"] + conditions
+        query = f"SELECT {', '.join(self.columns + self.order_by)} FROM {self.source}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY " + ", ".join(f"{column} {order}" for column in self.order_by)
+        if limit is not None:
+            query += " LIMIT ?"
+        return query
+
+    def key_condition(self, forward, key):
+        operator = "<" if forward == self.descending else ">"
+        if len(self.order_by) == 1:
+            return f"{self.order_by[0]} {operator} ?", tuple(key)
+        # SQLite will not seek an expression index on a row value alone;
+        # the redundant bound on the leading column lets it.
+        placeholders = ", ".join("?" for _ in self.order_by)
+        condition = f"{self.order_by[0]} {operator}= ? AND ({', '.join(self.order_by)}) {operator} ({placeholders})"
+        return condition, (key[0],) + tuple(key)
+
+    def direction(self, forward):
+        return "DESC" if forward == self.descending else "ASC"
+
+    def split_row(self, row):
+        width = len(self.columns)
+        return row[:width], tuple(row[width:])
+
+    def precedes(self, key, other):
+        key = tuple(map(sqlite_order, key))
+        other = tuple(map(sqlite_order, other))
+        return key > other if self.descending else key < other
+
+    def first_page(self, limit):
+        return self.build([], self.direction(True), limit), self.parameters + (limit,)
+
+    def page_after(self, key, limit):
+        condition, parameters = self.key_condition(True, key)
+        return self.build([condition], self.direction(True), limit), self.parameters + parameters + (limit,)
+
+    def page_before(self, key, limit):
+        condition, parameters = self.key_condition(False, key)
+        return self.build([condition], self.direction(False), limit), self.parameters + parameters + (limit,)
+
+    def by_ids(self, ids):
+        placeholders = ", ".join("?" for _ in ids)
+        return self.build([f"{self.id_column} IN ({placeholders})"], "ASC"), self.parameters + tuple(ids)
+
+
+class PagedTreeview(ttk.Treeview):
+    def __init__(self, master, fetch, query, format_row=tuple, page_size=50, max_pages=4, **kwargs):
+        super().__init__(master, **kwargs)
+        # fetch(query, parameters, callback, error) runs off the Tk thread and
+        # calls callback(rows) or error(exception) back on it.
+        self.fetch = fetch
+        self.query = query
+        self.format_row = format_row
+        self.page_size = page_size
+        self.max_rows = page_size * max_pages
+        self.keys = {}
+        self.generation = 0
+        self.has_before = False
+        self.has_after = False
+        self.loading = False
+        self.scrollbar = None
+        self.heading_texts = {}
+        self.sort_column = None
+        self.sort_descending = False
+        self.configure(yscrollcommand=self.on_scroll)
+
+    def attach_scrollbar(self, scrollbar):
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+
+    def set_query(self, query):
+        self.query = query
+        self.reload()
+
+    def make_sortable(self, column, text, on_sort):
+        # Clicking the heading sorts by it, clicking again reverses; the
+        # window turns sort_column into the ORDER BY of its next query.
+        self.heading_texts[column] = text
+        self.heading(column, text=text, command=lambda: self.toggle_sort(column, on_sort))
+
+    def toggle_sort(self, column, on_sort):
+        self.show_sort(column, self.sort_column == column and not self.sort_descending)
+        on_sort()
+
+    def show_sort(self, column, descending=False):
+        if self.sort_column in self.heading_texts:
+            self.heading(self.sort_column, text=self.heading_texts[self.sort_column])
+        self.sort_column = column
+        self.sort_descending = descending
+        if column in self.heading_texts:
+            self.heading(column, text=self.heading_texts[column] + SORT_ARROWS[descending])
+
+    def request(self, query_and_parameters, callback):
+        # Results that arrive after a reload belong to the old query.
+        generation = self.generation
+        query, parameters = query_and_parameters
+
+        def deliver(rows):
+            if generation == self.generation:
+                callback(rows)
+
+        self.fetch(query, parameters, deliver, self.fetch_failed)
+
+    def fetch_failed(self, exception):
+        self.loading = False
+
+    def reload(self):
+        self.generation += 1
+        self.loading = True
+        self.request(self.query.first_page(self.page_size), self.show_first_page)
+
+    @instrumentation.timed("treeview.first_page")
+    def show_first_page(self, rows):
+        self.delete(*self.get_children())
+        self.keys.clear()
+        self.has_before = False
+        self.append_rows(rows)
+        self.loading = False
+
+    def on_scroll(self, first, last):
+        if self.scrollbar:
+            self.scrollbar.set(first, last)
+        if self.loading:
+            return
+
+        count = len(self.get_children())
+        prefetch = self.page_size // 2
+        if self.has_after and (1.0 - float(last)) * count < prefetch:
+            self.load_after()
+        elif self.has_before and float(first) * count < prefetch:
+            self.load_before()
+
+    def load_after(self):
+        children = self.get_children()
+        if not children:
+            return
+        self.loading = True
+        self.request(self.query.page_after(self.keys[children[-1]], self.page_size), self.show_page_after)
+
+    @instrumentation.timed("treeview.page_after")
+    def show_page_after(self, rows):
+        first_visible = self.first_visible_index(len(self.get_children()))
+        self.append_rows(rows)
+        removed = self.trim(from_top=True)
+        self.restore_position(first_visible - removed)
+        self.loading = False
+
+    def load_before(self):
+        children = self.get_children()
+        if not children:
+            return
+        self.loading = True
+        self.request(self.query.page_before(self.keys[children[0]], self.page_size), self.show_page_before)
+
+    @instrumentation.timed("treeview.page_before")
+    def show_page_before(self, rows):
+        first_visible = self.first_visible_index(len(self.get_children()))
+        self.has_before = len(rows) == self.page_size
+        for row in rows:
+            if not self.exists(str(self.query.split_row(row)[0][0])):
+                self.insert_row(0, row)
+        self.trim(from_top=False)
+        self.restore_position(first_visible + len(rows))
+        self.loading = False
+
+    def insert_ids(self, ids):
+        if ids:
+            self.request(self.query.by_ids(ids), self.show_inserted)
+
+    @instrumentation.timed("treeview.inserted")
+    def show_inserted(self, rows):
+        loaded_keys = [self.keys[iid] for iid in self.get_children()]
+
+        for row in rows:
+            values, key = self.query.split_row(row)
+            iid = str(values[0])
+            if self.exists(iid):
+                self.item(iid, values=self.format_row(values))
+                continue
+            self.place_row(row, loaded_keys)
+
+        self.trim(from_top=False)
+
+    def place_row(self, row, loaded_keys):
+        # Rows outside the loaded window are left for paging to find.
+        key = self.query.split_row(row)[1]
+        if self.has_after and loaded_keys and self.query.precedes(loaded_keys[-1], key):
+            return
+        if self.has_before and loaded_keys and self.query.precedes(key, loaded_keys[0]):
+            return
+
+        low, high = 0, len(loaded_keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self.query.precedes(loaded_keys[middle], key):
+                low = middle + 1
+            else:
+                high = middle
+        loaded_keys.insert(low, key)
+        self.insert_row(low, row)
+
+    def update_ids(self, ids):
+        loaded = [row_id for row_id in ids if self.exists(str(row_id))]
+        if loaded:
+            self.request(self.query.by_ids(loaded), lambda rows: self.show_updated(loaded, rows))
+
+    @instrumentation.timed("treeview.updated")
+    def show_updated(self, ids, rows):
+        moved = []
+        for row in rows:
+            values, key = self.query.split_row(row)
+            iid = str(values[0])
+            if not self.exists(iid):
+                continue
+            if key == self.keys[iid]:
+                self.item(iid, values=self.format_row(values))
+            else:
+                # A changed sort key moves the row to its new place.
+                self.delete(iid)
+                del self.keys[iid]
+                moved.append(row)
+
+        if moved:
+            loaded_keys = [self.keys[iid] for iid in self.get_children()]
+            for row in moved:
+                self.place_row(row, loaded_keys)
+
+        # Rows that no longer match the query's filter drop out of the view.
+        matched = {self.query.split_row(row)[0][0] for row in rows}
+        self.delete_ids([row_id for row_id in ids if row_id not in matched])
+
+    def refresh_ids(self, ids):
+        # Rows changed elsewhere: loaded ones are updated or dropped, the
+        # rest may now belong in the loaded window.
+        self.update_ids(ids)
+        self.insert_ids([row_id for row_id in ids if not self.exists(str(row_id))])
+
+    def delete_ids(self, ids):
+        loaded = [str(row_id) for row_id in ids if self.exists(str(row_id))]
+        if loaded:
+            self.delete(*loaded)
+            for iid in loaded:
+                del self.keys[iid]
+
+    def insert_row(self, index, row):
+        values, key = self.query.split_row(row)
+        iid = str(values[0])
+        self.keys[iid] = key
+        self.insert("", index, iid=iid, values=self.format_row(values))
+
+    def append_rows(self, rows):
+        self.has_after = len(rows) == self.page_size
+        for row in rows:
+            if not self.exists(str(self.query.split_row(row)[0][0])):
+                self.insert_row("end", row)
+
+    def trim(self, from_top):
+        children = self.get_children()
+        excess = len(children) - self.max_rows
+        if excess <= 0:
+            return 0
+
+        if from_top:
+            removed = children[:excess]
+            self.has_before = True
+        else:
+            removed = children[-excess:]
+            self.has_after = True
+        self.delete(*removed)
+        for iid in removed:
+            del self.keys[iid]
+        return excess
+
+    def first_visible_index(self, count):
+        return int(float(self.yview()[0]) * count)
+
+    def restore_position(self, index):
+        count = len(self.get_children())
+        if count:
+            self.yview_moveto(max(index, 0) / count)
@@ -0,0 +1,483 @@
+import argparse
+import gzip
+import json
+import os
+import re
+import socket
+import socketserver
+import sys
+from datetime import datetime
+import database
+import migrations
+from changelog import latest_change
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 1000
+DEFAULT_PORT = 8765
+NODE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Replicated columns per table. is_borrowed is derived from the open loans
+# on every branch, and a loan's book and borrower travel as uids.
+TABLE_COLUMNS = {
+    "books": ("title", "author", "publication_year"),
+    "borrowers": ("name", "surname", "contact_number"),
+    "transactions": ("book_id", "borrower_id", "borrow_date", "return_date", "due_date"),
+}
+
+CHANGES_AFTER = """
+SELECT seq, table_name, row_id, coalesce(row_uid, ? || ':' || row_id), clock, node, deleted
+FROM change_log
+WHERE seq > ? AND node IS NOT ?
+ORDER BY seq
+LIMIT ?;
+"""
+
+# Rows a branch has never changed since replication was added have no
+# log entry; a peer that has received nothing yet gets them at version 0.
+UNLOGGED_ROWS = """
+SELECT id FROM {table}
+WHERE uid IS NULL AND NOT EXISTS (SELECT 1 FROM change_log WHERE table_name = '{log_table}' AND row_id = {table}.id)
+ORDER BY id;
+"""
+
+ROW_VALUES = {
+    "books": "SELECT id, title, author, publication_year FROM books WHERE id IN ({ids});",
+    "borrowers": "SELECT id, name, surname, contact_number FROM borrowers WHERE id IN ({ids});",
+    # A deleted book or borrower is still named by the uid its tombstone kept.
+    "transactions": """
+    SELECT loans.id,
+           coalesce(books.uid, book_log.row_uid, :node || ':' || loans.book_id),
+           coalesce(borrowers.uid, borrower_log.row_uid, :node || ':' || loans.borrower_id),
+           loans.borrow_date, loans.return_date, loans.due_date
+    FROM (SELECT id, book_id, borrower_id, borrow_date, return_date, due_date FROM transactions WHERE id IN ({ids})
+          UNION ALL
+          SELECT id, book_id, borrower_id, borrow_date, return_date, due_date FROM transactions_archive WHERE id IN ({ids})) AS loans
+    LEFT JOIN books ON books.id = loans.book_id
+    LEFT JOIN change_log AS book_log ON book_log.table_name = 'books' AND book_log.row_id = loans.book_id
+    LEFT JOIN borrowers ON borrowers.id = loans.borrower_id
+    LEFT JOIN change_log AS borrower_log ON borrower_log.table_name = 'borrowers' AND borrower_log.row_id = loans.borrower_id;
+    """,
+}
+
+
+class ReplicationError(Exception):
+    pass
+
+
+def node_id(conn):
+    return conn.execute("SELECT node_id FROM sync_node WHERE id = 1;").fetchone()[0]
+
+
+def own_row_id(uid, node):
+    prefix = node + ":"
+    if uid is not None and uid.startswith(prefix) and uid[len(prefix):].isdigit():
+        return int(uid[len(prefix):])
+    return None
+
+
+def loan_table(conn, row_id):
+    # Loans keep their id when archived, so a replicated loan may live in
+    # either table.
+    for table in ("transactions", "transactions_archive"):
+        if conn.execute(f"SELECT 1 FROM {table} WHERE id = ?;", (row_id,)).fetchone():
+            return table
+    return None
+
+
+def row_table(conn, table, row_id):
+    if row_id is None:
+        return None
+    if table == "transactions":
+        return loan_table(conn, row_id)
+    return table if conn.execute(f"SELECT 1 FROM {table} WHERE id = ?;", (row_id,)).fetchone() else None
+
+
+def find_row(conn, table, uid, node):
+    # Returns (row_id, version): the local row with this uid, if any, and
+    # the (clock, node) of the last change applied to it, if any.
+    own_id = own_row_id(uid, node)
+    if own_id is not None:
+        entry = conn.execute("SELECT clock, node FROM change_log WHERE table_name = ? AND row_id = ?;", (table, own_id)).fetchone()
+        return (own_id if row_table(conn, table, own_id) else None), entry
+
+    entry = conn.execute("SELECT row_id, clock, node FROM change_log WHERE row_uid = ? AND table_name = ?;", (uid, table)).fetchone()
+    if entry:
+        return (entry[0] if row_table(conn, table, entry[0]) else None), entry[1:]
+    tables = ("transactions", "transactions_archive") if table == "transactions" else (table,)
+    for name in tables:
+        row = conn.execute(f"SELECT id FROM {name} WHERE uid = ?;", (uid,)).fetchone()
+        if row:
+            return row[0], None
+    return None, None
+
+
+def resolve_reference(conn, table, uid, node):
+    # A loan can arrive before the book or borrower it names, when that row
+    # changed again later; an empty row holds its place until it does.
+    if uid is None:
+        return None
+    own_id = own_row_id(uid, node)
+    if own_id is not None:
+        return own_id
+    row = conn.execute(f"SELECT id FROM {table} WHERE uid = ?;", (uid,)).fetchone()
+    if row:
+        return row[0]
+    row = conn.execute("SELECT row_id FROM change_log WHERE row_uid = ? AND table_name = ?;", (uid, table)).fetchone()
+    if row and row[0] is not None:
+        return row[0]
+    return conn.execute(f"INSERT INTO {table} (uid) VALUES (?);", (uid,)).lastrowid
+
+
+def apply_change(conn, node, table, uid, clock, author, deleted, values, touched_books):
+    # Last writer wins: a change applies only over an older version, which
+    # also makes applying the same batch twice a no-op.
+    row_id, version = find_row(conn, table, uid, node)
+    if version is not None and tuple(version) >= (clock, author):
+        return False
+
+    own_id = own_row_id(uid, node)
+    target = row_table(conn, table, row_id)
+    if table == "transactions" and target:
+        touched_books.add(conn.execute(f"SELECT book_id FROM {target} WHERE id = ?;", (row_id,)).fetchone()[0])
+
+    if deleted:
+        if target:
+            conn.execute(f"DELETE FROM {target} WHERE id = ?;", (row_id,))
+    else:
+        columns = TABLE_COLUMNS[table]
+        if table == "transactions":
+            values = [resolve_reference(conn, "books", values[0], node),
+                      resolve_reference(conn, "borrowers", values[1], node)] + list(values[2:])
+            touched_books.add(values[0])
+        if target:
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            conn.execute(f"UPDATE {target} SET {assignments} WHERE id = ?;", (*values, row_id))
+        else:
+            placeholders = ", ".join("?" for _ in columns)
+            row_id = conn.execute(f"INSERT INTO {table} (id, uid, {', '.join(columns)}) VALUES (?, ?, {placeholders});",
+                                  (own_id, None if own_id is not None else uid, *values)).lastrowid
+
+    if own_id is None:
+        # Also drops a tombstone kept without a row id.
+        conn.execute("DELETE FROM change_log WHERE row_uid = ? AND table_name = ?;", (uid, table))
+    conn.execute("""
+    INSERT OR REPLACE INTO change_log (table_name, row_id, row_uid, clock, node, deleted) VALUES (?, ?, ?, ?, ?, ?);
+    """, (table, row_id if row_id is not None else own_id, None if own_id is not None else uid, clock, author, deleted))
+    return True
+
+
+def resolve_loan_conflicts(conn, node, book_ids):
+    # The same copy lent at two branches before they synced: every branch
+    # keeps the earliest loan (uid breaks ties) and closes the others, so
+    # all of them reach the same result. Closed loans are listed in
+    # sync_conflicts for the desk to follow up.
+    book_ids = [book_id for book_id in book_ids if book_id is not None]
+    for book_id in book_ids:
+        loans = conn.execute("""
+        SELECT id, coalesce(uid, ? || ':' || id), ifnull(borrow_date, '') FROM transactions
+        WHERE book_id = ? AND return_date IS NULL;
+        """, (node, book_id)).fetchall()
+        if len(loans) < 2:
+            continue
+        loans.sort(key=lambda loan: (loan[2], loan[1]))
+        for loan_id, loan_uid, borrow_date in loans[1:]:
+            conn.execute("UPDATE transactions SET return_date = coalesce(borrow_date, date('now')) WHERE id = ?;", (loan_id,))
+            conn.execute("INSERT INTO sync_conflicts (book_id, kept_uid, closed_uid, detected_at) VALUES (?, ?, ?, ?);",
+                         (book_id, loans[0][1], loan_uid, datetime.now().isoformat(timespec="seconds")))
+
+    for start in range(0, len(book_ids), BATCH_SIZE):
+        chunk = book_ids[start:start + BATCH_SIZE]
+        conn.execute(f"""
+        UPDATE books SET is_borrowed = EXISTS (SELECT 1 FROM transactions WHERE book_id = books.id AND return_date IS NULL)
+        WHERE id IN ({", ".join("?" for _ in chunk)})
+          AND is_borrowed IS NOT EXISTS (SELECT 1 FROM transactions WHERE book_id = books.id AND return_date IS NULL);
+        """, chunk)
+
+
+def apply_changes(conn, source, changes):
+    node = node_id(conn)
+    touched_books = set()
+    applied = 0
+    with database.transaction(conn):
+        conn.execute("UPDATE sync_node SET applying = 1;")
+        for seq, table, uid, clock, author, deleted, values in changes:
+            if table not in TABLE_COLUMNS:
+                raise ReplicationError(f"unknown table {table!r} in change {seq}")
+            if apply_change(conn, node, table, uid, clock, author, deleted, values, touched_books):
+                applied += 1
+        # Keeps the Lamport clock ahead of every version seen, so a later
+        # local edit wins over what it was based on.
+        conn.execute("UPDATE sync_node SET applying = 0, clock = max(clock, ?);", (max(change[3] for change in changes),))
+        resolve_loan_conflicts(conn, node, touched_books)
+        conn.execute("""
+        UPDATE sync_peers SET received_seq = max(received_seq, ?), synced_at = ? WHERE node_id = ?;
+        """, (max(change[0] for change in changes), datetime.now().isoformat(timespec="seconds"), source))
+    return applied
+
+
+def fetch_values(conn, node, table, row_ids):
+    ids = ", ".join(str(row_id) for row_id in row_ids)
+    return {row[0]: list(row[1:]) for row in conn.execute(ROW_VALUES[table].format(ids=ids), {"node": node})}
+
+
+def change_lines(conn, node, entries):
+    values = {}
+    for table in TABLE_COLUMNS:
+        row_ids = [entry[2] for entry in entries if entry[1] == table and not entry[6] and entry[2] is not None]
+        values[table] = fetch_values(conn, node, table, row_ids) if row_ids else {}
+    for seq, table, row_id, uid, clock, author, deleted in entries:
+        row = values[table].get(row_id)
+        if not deleted and row is None:
+            continue
+        yield [seq, table, uid, clock, author, deleted, None if deleted else row]
+
+
+def unlogged_changes(conn, node, batch_size):
+    for table, log_table in (("books", "books"), ("borrowers", "borrowers"),
+                             ("transactions", "transactions"), ("transactions_archive", "transactions")):
+        cursor = conn.execute(UNLOGGED_ROWS.format(table=table, log_table=log_table))
+        while True:
+            row_ids = [row[0] for row in cursor.fetchmany(batch_size)]
+            if not row_ids:
+                break
+            yield from change_lines(conn, node, [(0, log_table, row_id, f"{node}:{row_id}", 0, node, 0) for row_id in row_ids])
+
+
+def write_line(out, item):
+    out.write(json.dumps(item, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+
+def write_changes(conn, out, peer=None, since=None, batch_size=BATCH_SIZE):
+    # Streams every change after `since` (by default, what `peer` has
+    # acknowledged) as JSON Lines: a header, one line per changed row with
+    # its current values, and an end marker. Each row appears once however
+    # often it changed, and the whole stream reads one snapshot.
+    node = node_id(conn)
+    if since is None:
+        row = conn.execute("SELECT acked_seq FROM sync_peers WHERE node_id = ?;", (peer,)).fetchone() if peer else None
+        since = row[0] if row else 0
+    received = dict(conn.execute("SELECT node_id, received_seq FROM sync_peers;"))
+
+    sent = 0
+    last_seq = since
+    conn.execute("BEGIN;")
+    try:
+        write_line(out, {"format": FORMAT_VERSION, "node": node, "to": peer, "since": since, "received": received})
+        if since == 0:
+            for line in unlogged_changes(conn, node, batch_size):
+                write_line(out, line)
+                sent += 1
+        while True:
+            entries = conn.execute(CHANGES_AFTER, (node, last_seq, peer, batch_size)).fetchall()
+            if not entries:
+                break
+            for line in change_lines(conn, node, entries):
+                write_line(out, line)
+                sent += 1
+            last_seq = entries[-1][0]
+        write_line(out, {"end": last_seq, "changes": sent})
+    finally:
+        conn.rollback()
+    return sent
+
+
+def read_changes(conn, lines, batch_size=BATCH_SIZE):
+    # Applies a stream written by write_changes in batches, each in its own
+    # transaction. A stream cut short leaves the applied batches in place
+    # and the next sync resends the rest.
+    lines = iter(lines)
+    header = json.loads(next(lines, "null") or "null")
+    if not isinstance(header, dict) or header.get("format") != FORMAT_VERSION:
+        raise ReplicationError("not a change stream this program can read")
+    source = header["node"]
+    node = node_id(conn)
+    if source == node:
+        raise ReplicationError("these changes were made on this branch")
+
+    with database.transaction(conn):
+        conn.execute("INSERT OR IGNORE INTO sync_peers (node_id) VALUES (?);", (source,))
+        conn.execute("UPDATE sync_peers SET acked_seq = max(acked_seq, ?) WHERE node_id = ?;",
+                     (header["received"].get(node, 0), source))
+
+    applied = 0
+    batch = []
+    ended = False
+    for line in lines:
+        item = json.loads(line)
+        if isinstance(item, dict):
+            ended = "end" in item
+            break
+        batch.append(item)
+        if len(batch) >= batch_size:
+            applied += apply_changes(conn, source, batch)
+            batch = []
+    if batch:
+        applied += apply_changes(conn, source, batch)
+    if not ended:
+        raise ReplicationError(f"change stream from {source} ended early; {applied} changes were applied")
+    return source, applied
+
+
+def open_stream(path, mode, compressed):
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="\n")
+    return open(path, mode, encoding="utf-8", newline="\n")
+
+
+def export_changes(conn, path, peer=None, since=None):
+    partial_path = path + ".part"
+    try:
+        with open_stream(partial_path, "w", path.lower().endswith(".gz")) as out:
+            sent = write_changes(conn, out, peer, since)
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return sent
+
+
+def import_changes(conn, path):
+    with open_stream(path, "r", path.lower().endswith(".gz")) as lines:
+        return read_changes(conn, lines)
+
+
+def acked_seq(conn, peer):
+    row = conn.execute("SELECT acked_seq FROM sync_peers WHERE node_id = ?;", (peer,)).fetchone()
+    return row[0] if row else 0
+
+
+# Over a socket the client speaks first: the server names itself, the
+# client sends its changes, then the server sends its own, each stream
+# acknowledging what its sender already has from the other side.
+
+class SyncHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        conn = database.connect(self.server.database_path)
+        try:
+            stream = self.request.makefile("rw", encoding="utf-8", newline="\n")
+            write_line(stream, {"node": node_id(conn)})
+            stream.flush()
+            client, received = read_changes(conn, stream)
+            sent = write_changes(conn, stream, client)
+            stream.flush()
+            print(f"synced with {client}: received {received}, sent {sent}", flush=True)
+        except (ReplicationError, OSError, ValueError) as e:
+            print(f"sync failed: {e}", file=sys.stderr, flush=True)
+        finally:
+            conn.close()
+
+
+class SyncServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, address, database_path):
+        self.database_path = database_path
+        super().__init__(address, SyncHandler)
+
+
+def sync_with(conn, host, port=DEFAULT_PORT, timeout=60):
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        stream = sock.makefile("rw", encoding="utf-8", newline="\n")
+        hello = json.loads(stream.readline() or "null")
+        if not isinstance(hello, dict) or "node" not in hello:
+            raise ReplicationError(f"{host}:{port} is not a library sync server")
+        server = hello["node"]
+        sent = write_changes(conn, stream, server, acked_seq(conn, server))
+        stream.flush()
+        source, received = read_changes(conn, stream)
+    return server, sent, received
+
+
+def set_node_id(conn, new_node):
+    # For a branch started from a copy of another branch's database: the
+    # copy's rows keep the uids they have under the old node id and are
+    # logged at version 0, so this branch can pass them on. The old node
+    # becomes a peer that already has everything in the copy.
+    if not NODE_ID.match(new_node):
+        raise ReplicationError("node ids may only use letters, digits, '-' and '_'")
+    old_node = node_id(conn)
+    if new_node == old_node:
+        return old_node
+    with database.transaction(conn):
+        conn.execute("UPDATE sync_node SET applying = 1;")
+        for table, log_table in (("books", "books"), ("borrowers", "borrowers"),
+                                 ("transactions", "transactions"), ("transactions_archive", "transactions")):
+            conn.execute(f"UPDATE {table} SET uid = ? || ':' || id WHERE uid IS NULL;", (old_node,))
+            conn.execute(f"""
+            INSERT OR IGNORE INTO change_log (table_name, row_id, row_uid, clock, node, deleted)
+            SELECT '{log_table}', id, uid, 0, ?, 0 FROM {table} ORDER BY id;
+            """, (old_node,))
+        conn.execute("UPDATE change_log SET row_uid = ? || ':' || row_id WHERE row_uid IS NULL;", (old_node,))
+        last_seq = latest_change(conn)
+        conn.execute("UPDATE sync_peers SET acked_seq = 0;")
+        conn.execute("INSERT OR REPLACE INTO sync_peers (node_id, received_seq, acked_seq) VALUES (?, ?, ?);",
+                     (old_node, last_seq, last_seq))
+        conn.execute("UPDATE sync_node SET applying = 0, node_id = ?;", (new_node,))
+    return old_node
+
+
+def status(conn):
+    node, clock = conn.execute("SELECT node_id, clock FROM sync_node WHERE id = 1;").fetchone()
+    last_seq = latest_change(conn)
+    peers = conn.execute("SELECT node_id, received_seq, acked_seq, synced_at FROM sync_peers ORDER BY node_id;").fetchall()
+    conflicts = conn.execute("SELECT count(*) FROM sync_conflicts;").fetchone()[0]
+    return node, clock, last_seq, peers, conflicts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replicate books, borrowers and loans between branch databases.")
+    parser.add_argument("--database", default=database.DATABASE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="show this branch's node id, log position and peers")
+    init = commands.add_parser("init", help="give this branch its own node id, e.g. after copying another branch")
+    init.add_argument("node")
+    export = commands.add_parser("export", help="write the changes a peer has not acknowledged to a file")
+    export.add_argument("path", help="output file; a .gz suffix compresses it")
+    export.add_argument("--peer", help="node id of the branch the file is for")
+    export.add_argument("--since", type=int, help="log position to start after; 0 sends everything")
+    import_parser = commands.add_parser("import", help="apply a change file written by another branch")
+    import_parser.add_argument("path")
+    serve = commands.add_parser("serve", help="accept sync connections from other branches")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    sync = commands.add_parser("sync", help="exchange changes with a branch running serve")
+    sync.add_argument("address", help="host[:port]")
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.database)
+    migrations.migrate(conn)
+    try:
+        if args.command == "status":
+            node, clock, last_seq, peers, conflicts = status(conn)
+            print(f"node {node}, clock {clock}, log position {last_seq}, loan conflicts {conflicts}")
+            for peer, received, acked, synced_at in peers:
+                print(f"  peer {peer}: received up to {received}, acknowledged {acked}, last sync {synced_at or '-'}")
+        elif args.command == "init":
+            old_node = set_node_id(conn, args.node)
+            print(f"node id changed from {old_node} to {args.node}")
+        elif args.command == "export":
+            sent = export_changes(conn, args.path, args.peer, args.since)
+            print(f"wrote {sent} changes to {args.path}")
+        elif args.command == "import":
+            source, applied = import_changes(conn, args.path)
+            print(f"applied {applied} changes from {source}")
+        elif args.command == "serve":
+            conn.close()
+            with SyncServer((args.host, args.port), args.database) as server:
+                print(f"serving {args.database} on {args.host}:{args.port}", flush=True)
+                server.serve_forever()
+        else:
+            host, _, port = args.address.partition(":")
+            server, sent, received = sync_with(conn, host, int(port or DEFAULT_PORT))
+            print(f"synced with {server}: sent {sent}, received {received}")
+    except ReplicationError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import itertools
+import re
+import sqlite3
+
+FUZZY_SUPPORTED = sqlite3.sqlite_version_info >= (3, 34, 0)
+WORD = re.compile(r"\w+")
+
+# A search keeps the best this many books; the window says when there
+# were more.
+MAX_RESULTS = 1000
+
+RESULTS_SOURCE = "search_results JOIN books ON books.id = search_results.book_id"
+
+_search_ids = itertools.count(1)
+
+
+def prefix_match(text):
+    words = WORD.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def fuzzy_pieces(word):
+    # A typo spoils every trigram it touches but leaves one half of a word
+    # intact, and the trigram tokenizer matches a half as a substring,
+    # which is far more selective than any one of its trigrams.
+    if len(word) < 6:
+        return list(dict.fromkeys((word[:3], word[-3:])))
+    middle = len(word) // 2
+    return [word[:middle], word[middle:]]
+
+
+def fuzzy_match(text):
+    # Every word needs an intact half in the title; words too short to
+    # hold a trigram are left out.
+    groups = []
+    for word in WORD.findall(text.lower()):
+        if len(word) >= 3:
+            groups.append("(" + " OR ".join(f'"{piece}"' for piece in fuzzy_pieces(word)) + ")")
+    if not groups:
+        return None
+    return " AND ".join(groups)
+
+
+def match_tiers(text, fuzzy=False):
+    # Exact prefix matches come first; a fuzzy search then adds the titles
+    # that only match with a typo.
+    tiers = []
+    match = prefix_match(text)
+    if match:
+        tiers.append(("books_fts", match))
+    if fuzzy and FUZZY_SUPPORTED:
+        match = fuzzy_match(text)
+        if match:
+            tiers.append(("books_trigram", match))
+    return tiers
+
+
+def rank_books(conn, text, fuzzy=False, limit=MAX_RESULTS):
+    # Returns (ids, truncated): the best limit books, tier by tier in
+    # bm25 order, and whether more matched. limit + 1 rows from a tier are
+    # enough to fill the rest even if it repeats every id kept so far.
+    ids = []
+    seen = set()
+    for table, match in match_tiers(text, fuzzy):
+        query = f"SELECT rowid FROM {table} WHERE {table} MATCH ? ORDER BY rank, rowid LIMIT ?;"
+        for (book_id,) in conn.execute(query, (match, limit + 1)):
+            if book_id not in seen:
+                seen.add(book_id)
+                ids.append(book_id)
+        if len(ids) > limit:
+            break
+    return ids[:limit], len(ids) > limit
+
+
+def store_results(conn, text, fuzzy=False):
+    # Ranks once per search into a temporary table, whose positions the
+    # list view then pages through. Returns (search_id, truncated): the id
+    # the rows are stored under and whether the search was cut to
+    # MAX_RESULTS. A new search replaces the previous one.
+    ids, truncated = rank_books(conn, text, fuzzy)
+    search_id = next(_search_ids)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_results (search_id INTEGER, position INTEGER, book_id INTEGER, "
+                 "PRIMARY KEY (search_id, position)) WITHOUT ROWID;")
+    with conn:
+        conn.execute("DELETE FROM search_results;")
+        conn.executemany("INSERT INTO search_results (search_id, position, book_id) VALUES (?, ?, ?);",
+                         ((search_id, position, book_id) for position, book_id in enumerate(ids)))
+    return search_id, truncated
+
+
+def search_books(conn, text, fuzzy=False, limit=50):
+    ids = rank_books(conn, text, fuzzy, limit)[0]
+    if not ids:
+        return []
+    placeholders = ", ".join("?" for _ in ids)
+    query = f"SELECT id, title, author, publication_year, is_borrowed FROM books WHERE id IN ({placeholders});"
+    rows = {row[0]: row for row in conn.execute(query, ids)}
+    return [rows[book_id] for book_id in ids if book_id in rows]
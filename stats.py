@@ -0,0 +1,130 @@
+import argparse
+import sys
+import database
+import migrations
+
+TOP_TITLES = 5
+
+EXPECTED_COUNTERS = """
+SELECT
+    (SELECT count(*) FROM books),
+    (SELECT coalesce(sum(is_borrowed), 0) FROM books),
+    (SELECT count(DISTINCT borrower_id) FROM transactions WHERE return_date IS NULL);
+"""
+
+EXPECTED_BORROWER_LOANS = """
+SELECT borrower_id, count(*) FROM transactions WHERE return_date IS NULL GROUP BY borrower_id;
+"""
+
+EXPECTED_TITLE_LOANS = """
+SELECT books.title, count(*)
+FROM (SELECT book_id FROM transactions UNION ALL SELECT book_id FROM transactions_archive) AS loans
+JOIN books ON books.id = loans.book_id
+WHERE books.title IS NOT NULL
+GROUP BY books.title;
+"""
+
+# A copy is available when it is neither lent nor set aside for a hold.
+EXPECTED_AVAILABILITY = """
+SELECT title, count(*), total(coalesce(is_borrowed, 0) = 0 AND id NOT IN (SELECT book_id FROM holds WHERE book_id IS NOT NULL))
+FROM books WHERE title IS NOT NULL GROUP BY title;
+"""
+
+
+def read_stats(conn, top=TOP_TITLES):
+    books_total, books_on_loan, active_borrowers = conn.execute(
+        "SELECT books_total, books_on_loan, active_borrowers FROM circulation_stats WHERE id = 1;").fetchone()
+    top_titles = conn.execute("SELECT title, loans FROM title_loan_counts WHERE loans > 0 ORDER BY loans DESC LIMIT ?;", (top,)).fetchall()
+    return {
+        "books_total": books_total,
+        "books_on_loan": books_on_loan,
+        "books_available": books_total - books_on_loan,
+        "active_borrowers": active_borrowers,
+        "top_titles": top_titles,
+    }
+
+
+def rebuild_summaries(conn):
+    # Recomputes every summary table from the base tables; the caller
+    # owns the transaction.
+    books_total, books_on_loan, active_borrowers = conn.execute(EXPECTED_COUNTERS).fetchone()
+    conn.execute("INSERT OR REPLACE INTO circulation_stats (id, books_total, books_on_loan, active_borrowers) VALUES (1, ?, ?, ?);",
+                 (books_total, books_on_loan, active_borrowers))
+    conn.execute("DELETE FROM borrower_open_loans;")
+    conn.execute(f"INSERT INTO borrower_open_loans (borrower_id, open_loans) {EXPECTED_BORROWER_LOANS}")
+    conn.execute("DELETE FROM title_loan_counts;")
+    conn.execute(f"INSERT INTO title_loan_counts (title, loans) {EXPECTED_TITLE_LOANS}")
+
+
+def rebuild_availability(conn):
+    # titles counters, recounted from the copies; titles only kept alive by
+    # waiting holds stay at zero copies.
+    conn.execute("UPDATE titles SET copies = 0, available = 0;")
+    conn.execute(f"""
+    INSERT INTO titles (title, copies, available) {EXPECTED_AVAILABILITY.rstrip().rstrip(";")}
+    ON CONFLICT (title) DO UPDATE SET copies = excluded.copies, available = excluded.available;
+    """)
+    conn.execute("DELETE FROM titles WHERE copies = 0 AND NOT EXISTS (SELECT 1 FROM holds WHERE holds.title_id = titles.id);")
+
+
+def find_drift(conn):
+    drift = []
+    expected = conn.execute(EXPECTED_COUNTERS).fetchone()
+    stored = conn.execute("SELECT books_total, books_on_loan, active_borrowers FROM circulation_stats WHERE id = 1;").fetchone()
+    for name, want, have in zip(("books_total", "books_on_loan", "active_borrowers"), expected, stored or (None,) * 3):
+        if want != have:
+            drift.append((name, want, have))
+
+    for table, query, stored_query in (
+            ("borrower_open_loans", EXPECTED_BORROWER_LOANS, "SELECT borrower_id, open_loans FROM borrower_open_loans WHERE open_loans != 0;"),
+            ("title_loan_counts", EXPECTED_TITLE_LOANS, "SELECT title, loans FROM title_loan_counts WHERE loans != 0;")):
+        want = dict(conn.execute(query))
+        have = dict(conn.execute(stored_query))
+        for key in want.keys() | have.keys():
+            if want.get(key, 0) != have.get(key, 0):
+                drift.append((f"{table}[{key}]", want.get(key, 0), have.get(key, 0)))
+
+    want = {title: (copies, int(available)) for title, copies, available in conn.execute(EXPECTED_AVAILABILITY)}
+    have = {title: (copies, available) for title, copies, available in
+            conn.execute("SELECT title, copies, available FROM titles WHERE copies != 0 OR available != 0;")}
+    for title in want.keys() | have.keys():
+        if want.get(title, (0, 0)) != have.get(title, (0, 0)):
+            drift.append((f"titles[{title}]", want.get(title, (0, 0)), have.get(title, (0, 0))))
+    return drift
+
+
+def check_consistency(conn, repair=False):
+    with database.transaction(conn):
+        drift = find_drift(conn)
+        if drift and repair:
+            rebuild_summaries(conn)
+            rebuild_availability(conn)
+    return drift
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show circulation statistics or check the summary tables for drift.")
+    parser.add_argument("--check", action="store_true", help="compare the summary tables with a full recount")
+    parser.add_argument("--repair", action="store_true", help="rebuild the summary tables if they have drifted")
+    parser.add_argument("--database", default=database.DATABASE_PATH)
+    args = parser.parse_args(argv)
+
+    conn = database.connect(args.database)
+    migrations.migrate(conn)
+    try:
+        if args.check or args.repair:
+            drift = check_consistency(conn, repair=args.repair)
+            for name, want, have in drift:
+                print(f"{name}: expected {want}, stored {have}")
+            print(f"{len(drift)} drifted values" + (" (rebuilt)" if drift and args.repair else ""))
+            return 1 if drift and not args.repair else 0
+
+        for name, value in read_stats(conn).items():
+            print(f"{name}: {value}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bookimport
+import database
+import migrations
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.conn = database.connect(os.path.join(directory.name, "library.db"))
+        self.addCleanup(self.conn.close)
+        migrations.migrate(self.conn)
+        self.path = os.path.join(directory.name, "books.csv")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("title,author,publication_year\n")
+            for number in range(25):
+                f.write(f"Book {number},Author,2000\n")
+            f.write("No year,Author,²\n")
+
+    def count(self):
+        return self.conn.execute("SELECT count(*) FROM books;").fetchone()[0]
+
+    def test_import_commits_every_batch(self):
+        reports = []
+        result = bookimport.import_books(self.conn, self.path, batch_size=10,
+                                         progress=lambda result: reports.append(result.imported))
+        self.assertEqual((result.imported, result.rejected, result.cancelled), (25, 1, False))
+        self.assertEqual(reports, [10, 20, 25])
+        self.assertEqual(self.count(), 25)
+
+    def test_cancelled_import_keeps_committed_batches(self):
+        def progress(result):
+            if result.imported >= 20:
+                raise bookimport.ImportCancelled()
+
+        result = bookimport.import_books(self.conn, self.path, batch_size=10, progress=progress)
+        self.assertEqual((result.imported, result.cancelled), (20, True))
+        self.assertEqual(self.count(), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
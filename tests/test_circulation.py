@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import circulation
+import database
+import migrations
+
+
+class BorrowerLookupTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.conn = database.connect(os.path.join(directory.name, "library.db"))
+        self.addCleanup(self.conn.close)
+        migrations.migrate(self.conn)
+        self.ann_lee = catalog.add_borrower(self.conn, "Ann", "Lee", "1")
+        self.ann_kaya = catalog.add_borrower(self.conn, "Ann", "Kaya", "2")
+        self.bob = catalog.add_borrower(self.conn, "Bob", "Ak", "3")
+
+    def find(self, name, borrower_id=None):
+        return circulation.find_borrower(self.conn, name, borrower_id)
+
+    def test_borrowers_are_found_as_suggested(self):
+        self.assertEqual(self.find("Ann Kaya"), ("borrower_found", self.ann_kaya))
+        self.assertEqual(self.find(" Bob "), ("borrower_found", self.bob))
+        self.assertEqual(self.find("Ann", self.ann_lee), ("borrower_found", self.ann_lee))
+
+    def test_shared_first_name_is_ambiguous(self):
+        self.assertEqual(self.find("Ann"), ("borrower_ambiguous", None))
+        catalog.add_book(self.conn, "Dune", "Herbert", 1965)
+        self.assertEqual(circulation.borrow_book(self.conn, "Dune", "Ann", "2026-10-01"), ("borrower_ambiguous", []))
+
+    def test_unknown_borrower_is_not_found(self):
+        self.assertEqual(self.find("Cem"), ("borrower_not_found", None))
+        catalog.delete_ids(self.conn, "borrowers", [self.bob])
+        self.assertEqual(self.find("Bob", self.bob), ("borrower_not_found", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
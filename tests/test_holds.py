@@ -0,0 +1,135 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import circulation
+import database
+import migrations
+import stats
+
+
+class HoldsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.conn = database.connect(os.path.join(directory.name, "library.db"))
+        self.addCleanup(self.conn.close)
+        migrations.migrate(self.conn)
+        self.copies = [catalog.add_book(self.conn, "Dune", "Herbert", 1965) for _ in range(2)]
+        self.borrowers = {name: catalog.add_borrower(self.conn, name, "Lee", name) for name in ("Ann", "Bob", "Cem", "Dan")}
+
+    def borrow(self, name):
+        return circulation.borrow_book(self.conn, "Dune", name, "2026-10-01")[0]
+
+    def give_back(self, book_id):
+        return circulation.return_books(self.conn, [f"#{book_id}"])[0][1]
+
+    def hold(self, name):
+        return circulation.place_hold(self.conn, "Dune", name)[0]
+
+    def holds(self):
+        # (borrower, book_id) in the order the queue is served.
+        return self.conn.execute("""
+        SELECT borrowers.name, holds.book_id FROM holds JOIN borrowers ON borrowers.id = holds.borrower_id
+        ORDER BY holds.book_id IS NULL, holds.id;
+        """).fetchall()
+
+    def assertTitle(self, copies, available):
+        self.assertEqual(circulation.title_availability(self.conn, "Dune"), (copies, available))
+        self.assertEqual(stats.find_drift(self.conn), [])
+
+    def test_holds_are_served_in_order(self):
+        self.assertTitle(2, 2)
+        self.assertEqual(self.hold("Cem"), "book_available")
+        self.assertEqual(self.borrow("Ann"), "book_borrowed")
+        self.assertEqual(self.borrow("Bob"), "book_borrowed")
+        self.assertTitle(2, 0)
+        self.assertEqual(self.borrow("Cem"), "book_already_borrowed")
+        self.assertEqual(self.hold("Cem"), "hold_placed")
+        self.assertEqual(self.hold("Dan"), "hold_placed")
+        self.assertEqual(self.hold("Dan"), "hold_exists")
+
+        # The returned copy goes on the shelf for the first in line only.
+        first, second = self.copies
+        self.assertEqual(self.give_back(first), "book_held")
+        self.assertEqual(self.holds(), [("Cem", first), ("Dan", None)])
+        self.assertTitle(2, 0)
+        self.assertEqual(self.borrow("Dan"), "book_already_borrowed")
+        self.assertEqual(self.borrow("Cem"), "book_borrowed")
+        self.assertEqual(self.holds(), [("Dan", None)])
+
+        self.assertEqual(self.give_back(second), "book_held")
+        self.assertEqual(self.holds(), [("Dan", second)])
+        self.assertEqual(self.give_back(first), "book_returned")
+        self.assertTitle(2, 1)
+
+    def test_cancelled_hold_passes_its_copy_on(self):
+        self.borrow("Ann")
+        self.borrow("Bob")
+        self.hold("Cem")
+        self.hold("Dan")
+        first = self.copies[0]
+        self.give_back(first)
+        cem = self.conn.execute("SELECT id FROM holds WHERE borrower_id = ?;", (self.borrowers["Cem"],)).fetchone()[0]
+
+        circulation.cancel_holds(self.conn, [cem])
+        self.assertEqual(self.holds(), [("Dan", first)])
+        self.assertTitle(2, 0)
+        dan = self.conn.execute("SELECT id FROM holds;").fetchone()[0]
+        circulation.cancel_holds(self.conn, [dan])
+        self.assertEqual(self.holds(), [])
+        self.assertTitle(2, 1)
+
+    def test_deletes_release_held_copies(self):
+        self.borrow("Ann")
+        self.borrow("Bob")
+        self.hold("Cem")
+        self.hold("Dan")
+        first, second = self.copies
+        self.give_back(first)
+
+        # A held copy that is removed sends its hold back to the queue.
+        catalog.delete_ids(self.conn, "books", [first])
+        self.assertEqual(self.holds(), [("Cem", None), ("Dan", None)])
+        self.assertTitle(1, 0)
+
+        # A deleted borrower's holds go with them; the copy moves on.
+        self.give_back(second)
+        self.assertEqual(self.holds(), [("Cem", second), ("Dan", None)])
+        catalog.delete_ids(self.conn, "borrowers", [self.borrowers["Cem"]])
+        self.assertEqual(self.holds(), [("Dan", second)])
+        self.assertTitle(1, 0)
+
+        catalog.delete_ids(self.conn, "books", [second])
+        self.assertEqual(self.holds(), [("Dan", None)])
+        self.assertEqual(circulation.title_availability(self.conn, "Dune"), (0, 0))
+        self.assertEqual(stats.find_drift(self.conn), [])
+
+
+class TitlesMigrationTest(unittest.TestCase):
+    def test_counters_start_from_the_copies(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        conn = database.connect(os.path.join(directory.name, "library.db"))
+        self.addCleanup(conn.close)
+        version = migrations.MIGRATIONS.index(migrations.add_titles_and_holds)
+        for migration in migrations.MIGRATIONS[:version]:
+            migration(conn)
+        conn.execute(f"PRAGMA user_version = {version};")
+        conn.commit()
+        conn.executemany("INSERT INTO books (title, author, publication_year, is_borrowed) VALUES (?, 'A', 2000, ?);",
+                         [("Dune", 1), ("Dune", 0), ("Dune", None), ("Emma", 1), (None, 0)])
+        conn.commit()
+
+        migrations.migrate(conn)
+        self.assertEqual(conn.execute("SELECT title, copies, available FROM titles ORDER BY title;").fetchall(),
+                         [("Dune", 3, 2), ("Emma", 1, 0)])
+        self.assertEqual(stats.find_drift(conn), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
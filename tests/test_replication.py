@@ -0,0 +1,158 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import circulation
+import database
+import migrations
+import replication
+import stats
+
+
+def branch_state(conn):
+    # Everything replicated, keyed by uid so branches can be compared.
+    node = replication.node_id(conn)
+
+    def uid(table):
+        return f"coalesce({table}.uid, '{node}:' || {table}.id)"
+
+    books = sorted(conn.execute(f"SELECT {uid('books')}, title, author, publication_year, is_borrowed FROM books;"))
+    borrowers = sorted(conn.execute(f"SELECT {uid('borrowers')}, name, surname, contact_number FROM borrowers;"))
+    loans = sorted(conn.execute(f"""
+    SELECT {uid('loans')}, {uid('books')}, {uid('borrowers')}, loans.borrow_date, loans.return_date, loans.due_date
+    FROM (SELECT * FROM transactions UNION ALL SELECT * FROM transactions_archive) AS loans
+    LEFT JOIN books ON books.id = loans.book_id
+    LEFT JOIN borrowers ON borrowers.id = loans.borrower_id;
+    """), key=repr)
+    return books, borrowers, loans
+
+
+class ReplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.branches = {}
+
+    def branch(self, name):
+        path = self.path(f"{name}.db")
+        conn = database.connect(path)
+        migrations.migrate(conn)
+        self.addCleanup(conn.close)
+        self.branches[conn] = path
+        return conn
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def serve(self, conn):
+        server = replication.SyncServer(("127.0.0.1", 0), self.branches[conn])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_address[1]
+
+    def exchange_files(self, first, second):
+        for source, target in ((first, second), (second, first)):
+            path = self.path(f"{replication.node_id(source)}_to_{replication.node_id(target)}.jsonl.gz")
+            replication.export_changes(source, path, replication.node_id(target))
+            replication.import_changes(target, path)
+
+    def assertConverged(self, *conns):
+        states = [branch_state(conn) for conn in conns]
+        for state in states[1:]:
+            self.assertEqual(state, states[0])
+        for conn in conns:
+            self.assertEqual(stats.find_drift(conn), [])
+
+    def test_file_sync_converges(self):
+        a, b = self.branch("a"), self.branch("b")
+        catalog.add_book(a, "Dune", "Herbert", 1965)
+        catalog.add_book(b, "Emma", "Austen", 1815)
+        catalog.add_borrower(a, "Ann", "Lee", "1")
+        self.assertEqual(circulation.borrow_book(a, "Dune", "Ann", "2026-10-01")[0], "book_borrowed")
+
+        self.exchange_files(a, b)
+        self.assertConverged(a, b)
+        self.assertEqual(len(branch_state(b)[2]), 1)
+
+    def test_reapplying_a_change_file_changes_nothing(self):
+        a, b = self.branch("a"), self.branch("b")
+        catalog.add_book(a, "Dune", "Herbert", 1965)
+        catalog.add_borrower(a, "Ann", "Lee", "1")
+        circulation.borrow_book(a, "Dune", "Ann", "2026-10-01")
+        path = self.path("a_to_b.jsonl")
+        replication.export_changes(a, path, replication.node_id(b))
+
+        source, applied = replication.import_changes(b, path)
+        self.assertEqual((source, applied), (replication.node_id(a), 3))
+        before = branch_state(b)
+        self.assertEqual(replication.import_changes(b, path), (source, 0))
+        self.assertEqual(branch_state(b), before)
+
+    def test_socket_sync_converges(self):
+        a, b = self.branch("a"), self.branch("b")
+        port = self.serve(b)
+        catalog.add_book(a, "Dune", "Herbert", 1965)
+        catalog.add_book(b, "Emma", "Austen", 1815)
+
+        server, sent, received = replication.sync_with(a, "127.0.0.1", port)
+        self.assertEqual((server, sent, received), (replication.node_id(b), 1, 1))
+        self.assertEqual(replication.sync_with(a, "127.0.0.1", port)[1:], (0, 0))
+        self.assertConverged(a, b)
+
+    def test_double_loan_of_one_copy_converges(self):
+        a, b, c = self.branch("a"), self.branch("b"), self.branch("c")
+        catalog.add_book(a, "Dune", "Herbert", 1965)
+        catalog.add_borrower(a, "Ann", "Lee", "1")
+        catalog.add_borrower(a, "Bob", "Kaya", "2")
+        self.exchange_files(a, b)
+
+        # The only copy is lent at both branches before they sync again;
+        # the earlier loan is kept everywhere.
+        circulation.borrow_book(a, "Dune", "Ann", "2026-10-05")
+        circulation.borrow_book(b, "Dune", "Bob", "2026-10-03")
+        port = self.serve(b)
+        replication.sync_with(a, "127.0.0.1", port)
+        replication.sync_with(c, "127.0.0.1", port)
+        replication.sync_with(a, "127.0.0.1", port)
+        self.assertConverged(a, b, c)
+
+        for conn in (a, b, c):
+            open_loans = conn.execute("""
+            SELECT borrowers.name FROM transactions JOIN borrowers ON borrowers.id = transactions.borrower_id
+            WHERE transactions.return_date IS NULL;
+            """).fetchall()
+            self.assertEqual(open_loans, [("Bob",)])
+            self.assertEqual(conn.execute("SELECT is_borrowed FROM books;").fetchone()[0], 1)
+        # The branch that saw both loans records the closed one; the others
+        # receive it already closed.
+        conflicts = [conn.execute("SELECT count(*) FROM sync_conflicts;").fetchone()[0] for conn in (a, b, c)]
+        self.assertEqual(sum(conflicts), 1)
+
+        # Applying the same changes again resolves nothing twice.
+        replication.sync_with(a, "127.0.0.1", port)
+        self.exchange_files(a, c)
+        self.assertConverged(a, b, c)
+        self.assertEqual(sum(conn.execute("SELECT count(*) FROM sync_conflicts;").fetchone()[0] for conn in (a, b, c)), 1)
+
+    def test_concurrent_edits_converge_by_lamport_clock(self):
+        a, b = self.branch("a"), self.branch("b")
+        catalog.add_book(a, "Dune", "Herbert", 1965)
+        self.exchange_files(a, b)
+
+        database.execute(a, "UPDATE books SET title = 'Dune (A)';")
+        database.execute(b, "UPDATE books SET title = 'Dune (B)';")
+        database.execute(b, "UPDATE books SET author = 'Frank Herbert';")
+        self.exchange_files(a, b)
+        self.assertConverged(a, b)
+        # b's row is at the higher clock, so its version wins as a whole.
+        self.assertEqual(a.execute("SELECT title, author FROM books;").fetchall(), [("Dune (B)", "Frank Herbert")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import autocomplete
+import backup
+import catalog
+import changelog
+import circulation
+import database
+import migrations
+import windows
+from borrowermanagement import BORROWER_CHANGES
+
+
+class RestoreTest(unittest.TestCase):
+    # A desk keeps its connection open while a backup is restored under
+    # it; change_log then goes back to the backup's seq.
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "library.db")
+        self.backups = os.path.join(directory.name, "backups")
+        self.conn = database.connect(self.path)
+        self.addCleanup(self.conn.close)
+        migrations.migrate(self.conn)
+        self.ann = catalog.add_borrower(self.conn, "Ann", "Lee", "1")
+        self.backup = backup.create_backup(self.conn, self.backups, pause=0)
+        database.execute(self.conn, "UPDATE borrowers SET name = 'Zed' WHERE id = ?;", (self.ann,))
+
+    def restore(self):
+        backup.restore_backup(self.backup, self.path, self.backups)
+
+    def test_lookup_cache_forgets_restored_rows(self):
+        self.assertEqual(circulation.get_borrower_id(self.conn, "Zed Lee"), self.ann)
+        self.restore()
+        self.assertIsNone(circulation.get_borrower_id(self.conn, "Zed Lee"))
+        self.assertEqual(circulation.get_borrower_id(self.conn, "Ann Lee"), self.ann)
+
+    def test_completion_index_reloads_after_restore(self):
+        index = autocomplete.load_index(self.conn, "borrowers")
+        self.restore()
+        index = autocomplete.refresh_index(self.conn, "borrowers", index)
+        self.assertEqual(index.suggest("Zed"), [])
+        self.assertEqual(index.suggest("Ann"), [("Ann Lee", [self.ann])])
+
+    def test_window_reloads_after_restore(self):
+        seen = changelog.latest_change(self.conn)
+        self.restore()
+        until, ids, touched = windows.changes_since(self.conn, seen, BORROWER_CHANGES)
+        self.assertLess(until, seen)
+        self.assertIsNone(ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import database
+import migrations
+import search
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.conn = database.connect(os.path.join(directory.name, "library.db"))
+        self.addCleanup(self.conn.close)
+        migrations.migrate(self.conn)
+        for number in range(30):
+            catalog.add_book(self.conn, f"The Long River of Time {number}", "Author", 2000)
+        self.river = catalog.add_book(self.conn, "River", "Author", 2000)
+
+    def test_capped_search_keeps_the_best_matches(self):
+        ids, truncated = search.rank_books(self.conn, "river", limit=10)
+        self.assertEqual(len(ids), 10)
+        self.assertTrue(truncated)
+        self.assertEqual(ids[0], self.river)
+
+    def test_stored_results_say_whether_they_were_cut(self):
+        search_id, truncated = search.store_results(self.conn, "river")
+        self.assertFalse(truncated)
+        stored = self.conn.execute("SELECT book_id FROM search_results WHERE search_id = ? ORDER BY position;",
+                                   (search_id,)).fetchall()
+        self.assertEqual(len(stored), 31)
+        self.assertEqual(stored[0][0], self.river)
+
+
+if __name__ == "__main__":
+    unittest.main()
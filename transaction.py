@@ -1,57 +1,111 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox as msg
-import sqlite3
-from PIL import Image, ImageTk
-from datetime import datetime
 from lang import I18N
-
-class Transaction(tk.Toplevel):
+import assets
+import instrumentation
+import database
+import circulation
+import overdue
+import exportwindow
+from autocomplete import AutocompleteEntry
+from executor import BusyIndicator, WindowJobs
+from pagedtreeview import KeysetQuery, PagedTreeview
+from windows import ManagedWindow
+
+SCAN_BATCH_SIZE = 50
+SCAN_IDLE_MS = 300
+OVERDUE_REFRESH_MS = 5000
+DUE_DATE = f"date(transactions.due_date + {circulation.ORDINAL_TO_JULIAN})"
+
+
+LOAN_COLUMNS = ("transactions.id", "books.title", "borrowers.name", "transactions.borrow_date", "transactions.return_date", DUE_DATE)
+LOAN_SOURCE = ("transactions "
+               "JOIN books ON transactions.book_id = books.id "
+               "JOIN borrowers ON transactions.borrower_id = borrowers.id")
+DUE_DATE_KEY = "ifnull(transactions.due_date, 0)"
+HISTORY_BORROW_DATE = "ifnull(transaction_history.borrow_date, '')"
+
+# The ORDER BY behind each sortable column; only indexed columns sort.
+LOAN_SORTS = {
+    "id": ("transactions.id",),
+    "borrow_date": ("ifnull(transactions.borrow_date, '')", "transactions.id"),
+    "due_date": (DUE_DATE_KEY, "transactions.id"),
+}
+HISTORY_SORTS = {
+    "id": ("transaction_history.id",),
+    "borrow_date": (HISTORY_BORROW_DATE, "transaction_history.id"),
+}
+
+# Loans changed while the window was hidden. A changed book or borrower
+# can show in any loaded row, so those refresh every row instead.
+LOAN_CHANGES = """
+SELECT row_id FROM change_log
+WHERE seq > :since AND seq <= :until AND +table_name = 'transactions' AND row_id IS NOT NULL
+LIMIT :limit;
+"""
+
+
+def open_loans_query(sort="id", descending=False):
+    return KeysetQuery(LOAN_COLUMNS, LOAN_SOURCE, order_by=LOAN_SORTS[sort],
+                       where="transactions.return_date IS NULL", descending=descending)
+
+
+def overdue_query(sort="due_date", descending=False):
+    # Served by the partial ifnull(due_date, 0) index on open loans; 0
+    # marks loans whose due date could not be worked out.
+    return KeysetQuery(LOAN_COLUMNS, LOAN_SOURCE, order_by=LOAN_SORTS[sort],
+                       where=f"transactions.return_date IS NULL AND {DUE_DATE_KEY} BETWEEN 1 AND ?",
+                       parameters=(circulation.today_ordinal() - 1,), descending=descending)
+
+
+def history_query(date_from=None, date_to=None, sort="borrow_date", descending=False):
+    # transaction_history covers returned loans in both transactions and
+    # transactions_archive. Ordered by an indexed column, SQLite merges
+    # the two tables' index scans instead of sorting the whole history.
+    conditions = []
+    parameters = []
+    if date_from:
+        conditions.append(f"{HISTORY_BORROW_DATE} >= ?")
+        parameters.append(date_from)
+    if date_to:
+        conditions.append(f"{HISTORY_BORROW_DATE} <= ?")
+        parameters.append(date_to)
+    return KeysetQuery(
+        ("transaction_history.id", "books.title", "borrowers.name", "transaction_history.borrow_date", "transaction_history.return_date",
+         f"date(transaction_history.due_date + {circulation.ORDINAL_TO_JULIAN})"),
+        "transaction_history "
+        "LEFT JOIN books ON transaction_history.book_id = books.id "
+        "LEFT JOIN borrowers ON transaction_history.borrower_id = borrowers.id",
+        order_by=HISTORY_SORTS[sort],
+        where=" AND ".join(conditions),
+        parameters=parameters,
+        descending=descending)
+
+
+class Transaction(ManagedWindow):
+    CHANGES = LOAN_CHANGES
+    REFRESH_ON = ("books", "borrowers")
+
+    @instrumentation.timed("window.Transaction")
     def __init__(self, parent, language):
         super().__init__()
         self.i18n = I18N(language)
         self.title(self.i18n.transaction_management)
-        self.geometry("1000x500+210+180")
+        self.geometry("1000x600+210+160")
         self.parent = parent
-        self.protocol("WM_DELETE_WINDOW", self.close_window)
-
-        self.conn = None
-        self.cur = None
 
-        background_image = Image.open("libsys1.gif")
-        background_photo = ImageTk.PhotoImage(background_image)
+        self.jobs = WindowJobs(self, on_error=self.show_database_error, on_busy=BusyIndicator(self))
 
-        background_label = tk.Label(self, image=background_photo)
+        background_label = tk.Label(self, image=assets.background(1000, 600))
         background_label.place(relwidth=1, relheight=1)
-        background_label.image = background_photo
 
-        self.create_table()
         self.create_widgets()
         self.populate_treeview()
+        self.refresh_overdue_count()
 
-    def create_table(self):
-        query = '''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            book_id INTEGER,
-            borrower_id INTEGER,
-            borrow_date DATE,
-            return_date DATE,
-            FOREIGN KEY (book_id) REFERENCES books (id),
-            FOREIGN KEY (borrower_id) REFERENCES borrowers (id)
-        );
-        '''
-        self.execute_query(query)
-
-    def execute_query(self, query, parameters=()):
-        try:
-            if not self.conn:
-                self.open_connection()
-
-            self.cur.execute(query, parameters)
-            self.conn.commit()
-        except Exception as e:
-            msg.showerror(self.i18n.error, f"{self.i18n.db_error}: {str(e)}")
+    def show_database_error(self, e):
+        msg.showerror(self.i18n.error, f"{self.i18n.db_error}: {str(e)}")
 
     def create_widgets(self):
         text_color = "antique white"
@@ -61,17 +115,58 @@ class Transaction(tk.Toplevel):
 
         borrow_button = ttk.Button(self, text=self.i18n.borrow_book, command=self.borrow_book_window, style="DarkGold.TButton")
         return_button = ttk.Button(self, text=self.i18n.return_book, command=self.return_book_window, style="DarkGold.TButton")
+        borrow_stack_button = ttk.Button(self, text=self.i18n.borrow_stack, command=self.borrow_stack_window, style="DarkGold.TButton")
 
         borrow_button.pack(pady=10)
         return_button.pack(pady=10)
-
-        self.tree = ttk.Treeview(self, columns=("ID", self.i18n.book_title, self.i18n.borrower_name, self.i18n.borrow_date, self.i18n.return_date), show="headings", height=10)
-        self.tree.heading("ID", text="ID")
+        scan_returns_button = ttk.Button(self, text=self.i18n.scan_returns, command=self.scan_returns_window, style="DarkGold.TButton")
+
+        borrow_stack_button.pack(pady=10)
+        scan_returns_button.pack(pady=10)
+        holds_button = ttk.Button(self, text=self.i18n.holds, command=self.holds_window, style="DarkGold.TButton")
+        holds_button.pack(pady=10)
+        export_button = ttk.Button(self, text=self.i18n.export, command=self.export_transactions_window, style="DarkGold.TButton")
+        export_button.pack(pady=10)
+
+        view_frame = ttk.Frame(self)
+        self.view_mode = tk.StringVar(value="open")
+        open_radio = ttk.Radiobutton(view_frame, text=self.i18n.open_loans, value="open", variable=self.view_mode, command=self.change_view)
+        overdue_radio = ttk.Radiobutton(view_frame, text=self.i18n.overdue, value="overdue", variable=self.view_mode, command=self.change_view)
+        history_radio = ttk.Radiobutton(view_frame, text=self.i18n.loan_history, value="history", variable=self.view_mode, command=self.change_view)
+        from_label = ttk.Label(view_frame, text=self.i18n.date_from + ":")
+        self.date_from_entry = ttk.Entry(view_frame, width=12)
+        to_label = ttk.Label(view_frame, text=self.i18n.date_to + ":")
+        self.date_to_entry = ttk.Entry(view_frame, width=12)
+        apply_button = ttk.Button(view_frame, text=self.i18n.apply_filter, command=self.show_history, style="DarkGold.TButton")
+
+        self.overdue_label = ttk.Label(view_frame)
+
+        open_radio.grid(row=0, column=0, padx=5)
+        overdue_radio.grid(row=0, column=1, padx=5)
+        history_radio.grid(row=0, column=2, padx=5)
+        from_label.grid(row=0, column=3, padx=5)
+        self.date_from_entry.grid(row=0, column=4, padx=5)
+        to_label.grid(row=0, column=5, padx=5)
+        self.date_to_entry.grid(row=0, column=6, padx=5)
+        apply_button.grid(row=0, column=7, padx=5)
+        self.overdue_label.grid(row=0, column=8, padx=10)
+        view_frame.pack(pady=5)
+
+        tree_frame = ttk.Frame(self)
+        self.tree = PagedTreeview(tree_frame, self.fetch_rows, open_loans_query(), columns=("ID", self.i18n.book_title, self.i18n.borrower_name, self.i18n.borrow_date, self.i18n.return_date, self.i18n.due_date), show="headings", height=10)
+        self.sort_keys = {"ID": "id", self.i18n.borrow_date: "borrow_date", self.i18n.due_date: "due_date"}
+        self.tree.make_sortable("ID", "ID", self.show_view)
         self.tree.heading(self.i18n.book_title, text=self.i18n.book_title)
         self.tree.heading(self.i18n.borrower_name, text=self.i18n.borrower_name)
-        self.tree.heading(self.i18n.borrow_date, text=self.i18n.borrow_date)
+        self.tree.make_sortable(self.i18n.borrow_date, self.i18n.borrow_date, self.show_view)
         self.tree.heading(self.i18n.return_date, text=self.i18n.return_date)
-        self.tree.pack(pady=10)
+        self.tree.make_sortable(self.i18n.due_date, self.i18n.due_date, self.show_view)
+        self.tree.show_sort("ID")
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical")
+        self.tree.attach_scrollbar(scrollbar)
+        self.tree.pack(side="left")
+        scrollbar.pack(side="right", fill="y")
+        tree_frame.pack(pady=10)
 
     def borrow_book_window(self):
         borrow_window = tk.Toplevel(self)
@@ -79,15 +174,15 @@ class Transaction(tk.Toplevel):
         borrow_window.geometry("400x200+480+250")
 
         title_label = ttk.Label(borrow_window, text=self.i18n.book_title + ":", foreground="black")
-        title_entry = ttk.Entry(borrow_window)
+        title_entry = AutocompleteEntry(borrow_window, "books")
 
         borrower_label = ttk.Label(borrow_window, text=self.i18n.borrower_name + ":", foreground="black")
-        borrower_entry = ttk.Entry(borrow_window)
+        borrower_entry = AutocompleteEntry(borrow_window, "borrowers", distinct=True)
 
         borrow_date_label = ttk.Label(borrow_window, text=self.i18n.borrow_date + ":", foreground="black")
         borrow_date_entry = ttk.Entry(borrow_window)
 
-        borrow_button = ttk.Button(borrow_window, text=self.i18n.borrow_book, command=lambda: self.borrow_book(title_entry.get(), borrower_entry.get(), borrow_date_entry.get(), borrow_window))
+        borrow_button = ttk.Button(borrow_window, text=self.i18n.borrow_book, command=lambda: self.borrow_book(title_entry.get(), borrower_entry.get(), borrow_date_entry.get(), borrow_window, title_entry.chosen_ids(), borrower_entry.chosen_id()))
 
         title_label.grid(row=0, column=0, padx=10, pady=10)
         title_entry.grid(row=0, column=1, padx=10, pady=10)
@@ -97,128 +192,357 @@ class Transaction(tk.Toplevel):
         borrow_date_entry.grid(row=2, column=1, padx=10, pady=10)
         borrow_button.grid(row=3, column=0, columnspan=2, pady=10)
 
+    def borrow_stack_window(self):
+        stack_window = tk.Toplevel(self)
+        stack_window.title(self.i18n.borrow_stack)
+        stack_window.geometry("420x330+470+220")
+
+        titles_label = ttk.Label(stack_window, text=self.i18n.book_titles_one_per_line + ":", foreground="black")
+        titles_text = tk.Text(stack_window, width=30, height=8)
+
+        borrower_label = ttk.Label(stack_window, text=self.i18n.borrower_name + ":", foreground="black")
+        borrower_entry = AutocompleteEntry(stack_window, "borrowers", distinct=True)
+
+        borrow_date_label = ttk.Label(stack_window, text=self.i18n.borrow_date + ":", foreground="black")
+        borrow_date_entry = ttk.Entry(stack_window)
+
+        borrow_button = ttk.Button(stack_window, text=self.i18n.borrow_stack, command=lambda: self.borrow_stack(titles_text.get("1.0", "end"), borrower_entry.get(), borrow_date_entry.get(), stack_window, borrower_entry.chosen_id()))
+
+        titles_label.grid(row=0, column=0, padx=10, pady=10, sticky="n")
+        titles_text.grid(row=0, column=1, padx=10, pady=10)
+        borrower_label.grid(row=1, column=0, padx=10, pady=10)
+        borrower_entry.grid(row=1, column=1, padx=10, pady=10)
+        borrow_date_label.grid(row=2, column=0, padx=10, pady=10)
+        borrow_date_entry.grid(row=2, column=1, padx=10, pady=10)
+        borrow_button.grid(row=3, column=0, columnspan=2, pady=10)
+
+    def scan_returns_window(self):
+        ScanReturnsWindow(self)
+
+    def holds_window(self):
+        HoldsWindow(self)
+
+    def export_transactions_window(self):
+        exportwindow.ExportWindow(self, "transactions")
+
     def return_book_window(self):
         return_window = tk.Toplevel(self)
         return_window.title(self.i18n.return_book)
-        return_window.geometry("320x130+550+250")
+        return_window.geometry("320x220+550+250")
 
         title_label = ttk.Label(return_window, text=self.i18n.book_title + ":", foreground="black")
-        title_entry = ttk.Entry(return_window)
+        title_entry = AutocompleteEntry(return_window, "books")
 
-        return_button = ttk.Button(return_window, text=self.i18n.return_book, command=lambda: self.return_book(title_entry.get(), return_window))
+        return_button = ttk.Button(return_window, text=self.i18n.return_book, command=lambda: self.return_book(title_entry.get(), return_window, title_entry.chosen_ids()))
 
         title_label.grid(row=0, column=0, padx=10, pady=10)
         title_entry.grid(row=0, column=1, padx=10, pady=10)
         return_button.grid(row=1, column=0, columnspan=2, pady=10)
 
-    def borrow_book(self, title, borrower, borrow_date, borrow_window):
+    def borrow_book(self, title, borrower, borrow_date, borrow_window, book_ids=None, borrower_id=None):
         if not all((title, borrower, borrow_date)):
             msg.showerror(self.i18n.error, self.i18n.fill_all_fields)
             return
 
-        book_id = self.get_book_id(title)
-        if not book_id:
-            msg.showerror(self.i18n.error, self.i18n.book_not_found)
+        def borrowed(outcome):
+            status, transaction_ids = outcome
+            if status == "book_already_borrowed":
+                # Every copy is out or set aside: offer a place in the queue.
+                if msg.askyesno(self.i18n.place_hold, self.i18n.offer_hold):
+                    self.jobs.submit(circulation.place_hold, title, borrower, book_ids, borrower_id, callback=self.hold_placed)
+                return
+            if status != "book_borrowed":
+                msg.showerror(self.i18n.error, getattr(self.i18n, status))
+                return
+
+            msg.showinfo(self.i18n.success, self.i18n.book_borrowed)
+            borrow_window.destroy()
+            self.tree.insert_ids(transaction_ids)
+
+        self.jobs.submit(circulation.borrow_book, title, borrower, borrow_date, book_ids, borrower_id, callback=borrowed)
+
+    def hold_placed(self, outcome):
+        status, hold_ids = outcome
+        if status != "hold_placed":
+            msg.showerror(self.i18n.error, getattr(self.i18n, status))
             return
+        msg.showinfo(self.i18n.success, self.i18n.hold_placed)
 
-        if self.is_book_borrowed(book_id):
-            msg.showerror(self.i18n.error, self.i18n.book_already_borrowed)
-            return
-
-        borrower_id = self.get_borrower_id(borrower)
-        if not borrower_id:
-            msg.showerror(self.i18n.error, self.i18n.borrower_not_found)
+    def borrow_stack(self, titles_text, borrower, borrow_date, stack_window, borrower_id=None):
+        titles = [title.strip() for title in titles_text.splitlines() if title.strip()]
+        if not all((titles, borrower, borrow_date)):
+            msg.showerror(self.i18n.error, self.i18n.fill_all_fields)
             return
 
-        borrow_date_obj = self.convert_to_date(borrow_date)
-        if not borrow_date_obj:
-            msg.showerror(self.i18n.error, self.i18n.invalid_date_format)
+        def borrowed(outcome):
+            status, results = outcome
+            if status != "book_borrowed":
+                msg.showerror(self.i18n.error, getattr(self.i18n, status))
+                return
+
+            transaction_ids = [transaction_id for title, title_status, transaction_id in results if transaction_id]
+            failures = [f"{title}: {getattr(self.i18n, title_status)}" for title, title_status, transaction_id in results if not transaction_id]
+            summary = self.i18n.stack_borrowed.format(borrowed=len(transaction_ids), total=len(results))
+            if failures:
+                msg.showwarning(self.i18n.borrow_stack, summary + "\n" + "\n".join(failures))
+            else:
+                msg.showinfo(self.i18n.success, summary)
+                stack_window.destroy()
+            self.tree.insert_ids(transaction_ids)
+
+        self.jobs.submit(circulation.borrow_books, titles, borrower, borrow_date, borrower_id, callback=borrowed)
+
+    def return_book(self, title, return_window, book_ids=None):
+        if not title:
+            msg.showerror(self.i18n.error, self.i18n.enter_book_title)
             return
 
-        query_update_book = "UPDATE books SET is_borrowed = 1 WHERE id = ?;"
-        self.execute_query(query_update_book, (book_id,))
-
-        query_insert_transaction = "INSERT INTO transactions (book_id, borrower_id, borrow_date) VALUES (?, ?, ?);"
-        self.execute_query(query_insert_transaction, (book_id, borrower_id, borrow_date))
+        def returned(outcome):
+            status, transaction_ids = outcome
+            if status not in ("book_returned", "book_held"):
+                msg.showerror(self.i18n.error, getattr(self.i18n, status))
+                return
+
+            msg.showinfo(self.i18n.success, getattr(self.i18n, status))
+            return_window.destroy()
+            self.tree.update_ids(transaction_ids)
+
+        self.jobs.submit(circulation.return_book, title, book_ids, callback=returned)
+
+    def change_view(self):
+        self.tree.show_sort(None)
+        self.show_view()
+
+    def show_view(self):
+        if self.view_mode.get() == "history":
+            self.show_history()
+        elif self.view_mode.get() == "overdue":
+            self.tree.set_query(overdue_query(*self.sort_order(LOAN_SORTS, "due_date")))
+        else:
+            self.tree.set_query(open_loans_query(*self.sort_order(LOAN_SORTS, "id")))
+
+    def sort_order(self, sorts, default):
+        # Falls back to the view's default when the clicked column has no
+        # index in this view.
+        sort = self.sort_keys.get(self.tree.sort_column)
+        if sort not in sorts:
+            column = next(column for column, key in self.sort_keys.items() if key == default)
+            self.tree.show_sort(column)
+            sort = default
+        return sort, self.tree.sort_descending
+
+    def reopen(self):
+        super().reopen()
+        if self.overdue_timer is None:
+            self.refresh_overdue_count()
+        # Loans fall overdue as the days pass, which logs no change.
+        if self.view_mode.get() == "overdue" and self.tree.query.parameters != overdue_query().parameters:
+            self.show_view()
+
+    def refresh_overdue_count(self):
+        report = overdue.get_scanner().report
+        if report is not None:
+            self.overdue_label.config(text=self.i18n.overdue_count.format(count=report.count))
+        self.overdue_timer = self.after(OVERDUE_REFRESH_MS, self.refresh_overdue_count)
+
+    def show_history(self):
+        date_from = self.date_from_entry.get().strip()
+        date_to = self.date_to_entry.get().strip()
+        for value in (date_from, date_to):
+            if value and not circulation.convert_to_date(value):
+                msg.showerror(self.i18n.error, self.i18n.invalid_date_format)
+                return
+
+        self.view_mode.set("history")
+        self.tree.set_query(history_query(date_from, date_to, *self.sort_order(HISTORY_SORTS, "borrow_date")))
+
+    def fetch_rows(self, query, parameters, callback, error):
+        self.jobs.submit(database.fetch_all, query, parameters, callback=callback, error=error)
 
-        msg.showinfo(self.i18n.success, self.i18n.book_borrowed)
-        borrow_window.destroy()
-        self.populate_treeview()
+    def close_window(self):
+        if self.overdue_timer is not None:
+            self.after_cancel(self.overdue_timer)
+            self.overdue_timer = None
+        super().close_window()
+
+
+
+class ScanReturnsWindow:
+    def __init__(self, transaction):
+        self.transaction = transaction
+        self.i18n = transaction.i18n
+        self.queue = []
+        self.in_flight = False
+        self.flush_timer = None
+        self.returned = 0
+
+        self.top = tk.Toplevel(transaction)
+        self.top.title(self.i18n.scan_returns)
+        self.top.geometry("620x360+400+220")
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        self.create_widgets()
 
-    def return_book(self, title, return_window):
-        if not title:
-            msg.showerror(self.i18n.error, self.i18n.enter_book_title)
+    def create_widgets(self):
+        prompt_label = ttk.Label(self.top, text=self.i18n.scan_prompt + ":", foreground="black")
+        self.scan_entry = ttk.Entry(self.top, width=30)
+        self.scan_entry.bind("<Return>", self.scan)
+        self.status_label = ttk.Label(self.top, foreground="black")
+
+        errors_label = ttk.Label(self.top, text=self.i18n.scan_errors, foreground="black")
+        self.errors_list = tk.Listbox(self.top, width=40, height=16)
+
+        prompt_label.grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        self.scan_entry.grid(row=1, column=0, padx=10, sticky="we")
+        self.status_label.grid(row=2, column=0, padx=10, pady=10, sticky="nw")
+        errors_label.grid(row=0, column=1, padx=10, pady=10, sticky="w")
+        self.errors_list.grid(row=1, column=1, rowspan=2, padx=10, sticky="ns")
+
+        self.update_status()
+        self.scan_entry.focus_set()
+
+    def scan(self, event=None):
+        item = self.scan_entry.get().strip()
+        self.scan_entry.delete(0, "end")
+        if not item:
             return
 
-        book_id = self.get_book_id(title)
-        if not book_id:
-            msg.showerror(self.i18n.error, self.i18n.book_not_found)
+        self.queue.append(item)
+        self.update_status()
+        if len(self.queue) >= SCAN_BATCH_SIZE:
+            self.flush()
+        elif self.flush_timer is None:
+            self.flush_timer = self.top.after(SCAN_IDLE_MS, self.flush)
+
+    def flush(self):
+        if self.flush_timer is not None:
+            self.top.after_cancel(self.flush_timer)
+            self.flush_timer = None
+        if self.in_flight or not self.queue:
             return
 
-        if not self.is_book_borrowed(book_id):
-            msg.showerror(self.i18n.error, self.i18n.book_not_borrowed)
+        batch, self.queue = self.queue[:SCAN_BATCH_SIZE], self.queue[SCAN_BATCH_SIZE:]
+        self.in_flight = True
+        self.submit(batch)
+
+    def submit(self, batch):
+        self.transaction.jobs.submit(circulation.return_books, batch, callback=self.processed,
+                                     error=lambda exception: self.failed(batch, exception))
+
+    def processed(self, results):
+        self.in_flight = False
+        transaction_ids = []
+        errors = []
+        for item, status, ids in results:
+            if status in ("book_returned", "book_held"):
+                self.returned += 1
+                transaction_ids.extend(ids)
+            if status != "book_returned":
+                # Copies to put on the hold shelf are listed with the errors.
+                errors.append(f"{item}: {getattr(self.i18n, status)}")
+        self.transaction.tree.update_ids(transaction_ids)
+        self.report(errors)
+
+    def failed(self, batch, exception):
+        # The batch ran in one transaction, so none of it was returned:
+        # every scan in it is listed with the error, and the queue goes on.
+        self.in_flight = False
+        self.report([f"{item}: {exception}" for item in batch])
+        return True
+
+    def report(self, errors):
+        if not self.top.winfo_exists():
+            # Items still queued when the window closed are reported here.
+            if errors:
+                msg.showwarning(self.i18n.scan_returns, "\n".join(errors))
             return
 
-        query_update_book = "UPDATE books SET is_borrowed = 0 WHERE id = ?;"
-        self.execute_query(query_update_book, (book_id,))
+        self.errors_list.insert("end", *errors)
+        self.errors_list.see("end")
+        self.update_status()
+        if self.queue:
+            self.flush()
+
+    def update_status(self):
+        if self.top.winfo_exists():
+            self.status_label.config(text=self.i18n.scan_status.format(returned=self.returned, queued=len(self.queue)))
+
+    def close(self):
+        if self.flush_timer is not None:
+            self.top.after_cancel(self.flush_timer)
+            self.flush_timer = None
+        if self.queue:
+            self.submit(self.queue)
+            self.queue = []
+        self.top.destroy()
+
+
+class HoldsWindow:
+    def __init__(self, transaction):
+        self.transaction = transaction
+        self.i18n = transaction.i18n
+
+        self.top = tk.Toplevel(transaction)
+        self.top.title(self.i18n.holds)
+        self.top.geometry("720x420+350+200")
+        self.create_widgets()
+        self.reload()
 
-        query_update_transaction = "UPDATE transactions SET return_date = ? WHERE book_id = ? AND return_date IS NULL;"
-        self.execute_query(query_update_transaction, (datetime.now().strftime("%Y-%m-%d"), book_id))
+    def create_widgets(self):
+        form = ttk.Frame(self.top)
+        title_label = ttk.Label(form, text=self.i18n.book_title + ":", foreground="black")
+        self.title_entry = AutocompleteEntry(form, "books")
+        borrower_label = ttk.Label(form, text=self.i18n.borrower_name + ":", foreground="black")
+        self.borrower_entry = AutocompleteEntry(form, "borrowers", distinct=True)
+        place_button = ttk.Button(form, text=self.i18n.place_hold, command=self.place_hold, style="DarkGold.TButton")
+
+        title_label.grid(row=0, column=0, padx=5, pady=10)
+        self.title_entry.grid(row=0, column=1, padx=5, pady=10)
+        borrower_label.grid(row=0, column=2, padx=5, pady=10)
+        self.borrower_entry.grid(row=0, column=3, padx=5, pady=10)
+        place_button.grid(row=0, column=4, padx=5, pady=10)
+        form.pack()
+
+        self.tree = ttk.Treeview(self.top, columns=("ID", self.i18n.book_title, self.i18n.borrower_name, self.i18n.placed_at, self.i18n.status),
+                                 show="headings", height=12)
+        for column in self.tree["columns"]:
+            self.tree.heading(column, text=column)
+        self.tree.column("ID", width=60)
+        self.tree.pack(padx=10, fill="both", expand=True)
+
+        cancel_button = ttk.Button(self.top, text=self.i18n.cancel_hold, command=self.cancel_holds, style="DarkGold.TButton")
+        cancel_button.pack(pady=10)
+
+    def reload(self):
+        self.transaction.jobs.submit(circulation.list_holds, callback=self.show_holds)
+
+    def show_holds(self, rows):
+        if not self.top.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        positions = {}
+        for hold_id, title, borrower, placed_at, book_id in rows:
+            if book_id is not None:
+                status = self.i18n.hold_ready.format(book_id=book_id)
+            else:
+                positions[title] = positions.get(title, 0) + 1
+                status = self.i18n.hold_waiting.format(position=positions[title])
+            self.tree.insert("", "end", iid=str(hold_id), values=(hold_id, title, borrower, placed_at, status))
+
+    def place_hold(self):
+        title = self.title_entry.get()
+        borrower = self.borrower_entry.get()
+        if not all((title, borrower)):
+            msg.showerror(self.i18n.error, self.i18n.fill_all_fields, parent=self.top)
+            return
 
-        msg.showinfo(self.i18n.success, self.i18n.book_returned)
-        return_window.destroy()
-        self.populate_treeview()
+        def placed(outcome):
+            self.transaction.hold_placed(outcome)
+            self.reload()
 
-    def get_book_id(self, title):
-        query = "SELECT id FROM books WHERE title = ?;"
-        self.execute_query(query, (title,))
-        result = self.cur.fetchone()
-        return result[0] if result else None
-
-    def is_book_borrowed(self, book_id):
-        query = "SELECT is_borrowed FROM books WHERE id = ?;"
-        self.execute_query(query, (book_id,))
-        result = self.cur.fetchone()
-        return result[0] if result else None
-
-    def get_borrower_id(self, name):
-        query = "SELECT id FROM borrowers WHERE name = ?;"
-        self.execute_query(query, (name,))
-        result = self.cur.fetchone()
-        return result[0] if result else None
-
-    def convert_to_date(self, date_str):
-        try:
-            return datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
-            return None
-
-    def populate_treeview(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        query = '''
-        SELECT transactions.id, books.title, borrowers.name, transactions.borrow_date, transactions.return_date
-        FROM transactions
-        JOIN books ON transactions.book_id = books.id
-        JOIN borrowers ON transactions.borrower_id = borrowers.id;
-        '''
-        self.execute_query(query)
-        transactions_data = self.cur.fetchall()
-
-        for transaction in transactions_data:
-            self.tree.insert("", "end", values=transaction)
-
-    def open_connection(self):
-        self.conn = sqlite3.connect("library.db")
-        self.cur = self.conn.cursor()
-
-    def close_connection(self):
-        if self.conn:
-            self.conn.close()
-            self.cur = None
-            self.conn = None
+        self.transaction.jobs.submit(circulation.place_hold, title, borrower, self.title_entry.chosen_ids(), self.borrower_entry.chosen_id(),
+                                     callback=placed)
 
-    def close_window(self):
-        self.close_connection()
-        self.destroy()
+    def cancel_holds(self):
+        hold_ids = [int(iid) for iid in self.tree.selection()]
+        if hold_ids:
+            self.transaction.jobs.submit(circulation.cancel_holds, hold_ids, callback=lambda ids: self.reload())
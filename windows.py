@@ -0,0 +1,110 @@
+import tkinter as tk
+import instrumentation
+from changelog import latest_change, table_changed
+
+# Past this many changed rows a window reloads its first page rather than
+# fetching every changed row again.
+RELOAD_AFTER = 500
+
+
+def changes_since(conn, since, query, tables=(), limit=RELOAD_AFTER):
+    # Returns (seq, ids, touched): the log position now, the tree ids the
+    # entries after since changed (None past limit) and whether any of
+    # tables changed meanwhile. A log that went back was restored from a
+    # backup, which leaves nothing to apply: the window reloads.
+    until = latest_change(conn)
+    if until == since:
+        return until, [], False
+    if until < since:
+        return until, None, True
+    ids = [row[0] for row in conn.execute(query, {"since": since, "until": until, "limit": limit + 1})]
+    if len(ids) > limit:
+        return until, None, True
+    touched = any(table_changed(conn, since, until, table) for table in tables)
+    return until, ids, touched
+
+
+class ManagedWindow(tk.Toplevel):
+    # A window kept for the whole session: closing hides it, and showing it
+    # again applies what change_log recorded since its rows were read.
+    # Subclasses set jobs and tree, CHANGES (the tree ids changed between
+    # :since and :until, at most :limit of them) and REFRESH_ON, tables
+    # whose changes may show in any loaded row.
+    CHANGES = None
+    REFRESH_ON = ()
+
+    def __init__(self):
+        super().__init__()
+        self.seen = None
+        self.protocol("WM_DELETE_WINDOW", self.close_window)
+
+    def populate_treeview(self):
+        # The log position is read before the rows, so a change made while
+        # they are read is applied again on the next reopen.
+        self.jobs.submit(latest_change, callback=self.mark_seen)
+        self.tree.reload()
+
+    def mark_seen(self, seq):
+        self.seen = seq
+
+    @instrumentation.timed("window.reopen")
+    def reopen(self):
+        self.deiconify()
+        self.lift()
+        self.focus_set()
+        if self.seen is None:
+            self.populate_treeview()
+        else:
+            self.jobs.submit(changes_since, self.seen, self.CHANGES, self.REFRESH_ON, callback=self.apply_changes)
+
+    def apply_changes(self, changes):
+        seq, ids, touched = changes
+        if ids is None:
+            self.populate_treeview()
+            return
+        self.seen = seq
+        if touched:
+            ids = set(ids).union(int(iid) for iid in self.tree.get_children())
+        self.tree.refresh_ids(list(ids))
+
+    def close_window(self):
+        # Only the window itself is kept for reuse. Its dialogs are closed
+        # for good, through their own close handler where they have one,
+        # so a queued scan batch winds up and an export is cancelled (its
+        # dialog destroys itself). Jobs already submitted finish into the
+        # hidden window.
+        for child in self.winfo_children():
+            if isinstance(child, tk.Toplevel):
+                handler = child.protocol("WM_DELETE_WINDOW")
+                if handler:
+                    child.tk.call(handler)
+                else:
+                    child.destroy()
+        self.withdraw()
+
+    def destroy_window(self):
+        self.close_window()
+        self.jobs.cancel_all()
+        self.destroy()
+
+
+class WindowManager:
+    # Builds each window on first use and shows the same one afterwards, so
+    # a session holds at most one of each, every tree capped at max_pages.
+    def __init__(self, parent, language):
+        self.parent = parent
+        self.language = language
+        self.windows = {}
+
+    def show(self, window_class):
+        window = self.windows.get(window_class)
+        if window is None or not window.winfo_exists():
+            self.windows[window_class] = window_class(self.parent, language=self.language)
+        else:
+            window.reopen()
+
+    def close_all(self):
+        for window in self.windows.values():
+            if window.winfo_exists():
+                window.destroy_window()
+        self.windows.clear()